@@ -1,7 +1,37 @@
 from allauth.account.adapter import DefaultAccountAdapter
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
 from django.conf import settings
 
+from core.tasks import send_email
+
 
 class CustomAccountAdapter(DefaultAccountAdapter):
     def get_login_redirect_url(self, request):
         return getattr(settings, 'LOGIN_REDIRECT_URL', 'http://localhost:3000/')
+
+    def login(self, request, user):
+        # Clients authenticate with tokens, so signup and social login do not
+        # open a Django session unless REST_AUTH['SESSION_LOGIN'] asks for it.
+        if rest_auth_settings.SESSION_LOGIN:
+            super().login(request, user)
+
+    def unstash_verified_email(self, request):
+        # Clearing an absent value would still mark the session as modified and
+        # make every API signup write a session row.
+        if request.session.get('account_verified_email') is None:
+            return None
+        return super().unstash_verified_email(request)
+
+    def send_mail(self, template_prefix, email, context):
+        # Verification and password reset mails are rendered here, where the
+        # request is available, and delivered by a background worker.
+        message = self.render_mail(template_prefix, email, context)
+        send_email.enqueue(
+            message.subject,
+            message.body,
+            message.from_email,
+            message.to,
+            headers=message.extra_headers or None,
+            alternatives=[list(alternative) for alternative in getattr(message, 'alternatives', [])],
+            content_subtype=message.content_subtype,
+        )
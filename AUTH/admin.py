@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Exists, OuterRef, Prefetch
+from django.utils import timezone
 from django.utils.html import format_html
+from core.paginator import EstimatedCountPaginator
 from .models import UserCustom
 from allauth.socialaccount.models import SocialAccount
 
@@ -18,10 +21,11 @@ class SocialProviderFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         value = self.value()
+        accounts = SocialAccount.objects.filter(user=OuterRef('pk'))
         if value == 'local':
-            return queryset.filter(socialaccount__isnull=True)
+            return queryset.filter(~Exists(accounts))
         if value in ('google', 'github'):
-            return queryset.filter(socialaccount__provider=value)
+            return queryset.filter(Exists(accounts.filter(provider=value)))
         return queryset
 
 
@@ -41,6 +45,8 @@ class UserCustomAdmin(UserAdmin):
     ordering = ('-created_at',)
     list_editable = ('is_active', 'role')
     list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ('created_at', 'updated_at', 'last_login', 'date_joined', 'profile_image_preview')
     
     fieldsets = (
@@ -94,7 +100,7 @@ class UserCustomAdmin(UserAdmin):
     profile_image_preview.short_description = 'Preview'
 
     def login_origin(self, obj):
-        providers = list(obj.socialaccount_set.values_list('provider', flat=True))
+        providers = [account.provider for account in obj.social_accounts]
         if not providers:
             return 'Local'
         return ', '.join(p.capitalize() for p in providers)
@@ -103,28 +109,34 @@ class UserCustomAdmin(UserAdmin):
     actions = ['activate_users', 'deactivate_users', 'make_admin', 'make_client']
     
     def activate_users(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
         self.message_user(request, f'{updated} user(s) activated')
     activate_users.short_description = "Activate users"
     
     def deactivate_users(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
         self.message_user(request, f'{updated} user(s) deactivated')
     deactivate_users.short_description = "Deactivate users"
     
     def make_admin(self, request, queryset):
-        updated = queryset.update(role='admin')
+        updated = queryset.update(role='admin', updated_at=timezone.now())
         self.message_user(request, f'{updated} user(s) converted to admin')
     make_admin.short_description = "Make administrators"
     
     def make_client(self, request, queryset):
-        updated = queryset.update(role='client')
+        updated = queryset.update(role='client', updated_at=timezone.now())
         self.message_user(request, f'{updated} user(s) converted to client')
     make_client.short_description = "Make clients"
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related().prefetch_related('groups', 'user_permissions', 'socialaccount_set')
+        return qs.prefetch_related(
+            Prefetch(
+                'socialaccount_set',
+                queryset=SocialAccount.objects.only('user', 'provider'),
+                to_attr='social_accounts',
+            )
+        )
     
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
@@ -7,6 +7,7 @@ class AuthConfig(AppConfig):
     verbose_name = 'Authentication'
     
     def ready(self):
+        import AUTH.signals  # noqa: F401
         import os
         from django.conf import settings
         try:
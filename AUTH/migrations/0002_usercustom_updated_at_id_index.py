@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AUTH', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usercustom',
+            index=models.Index(fields=['updated_at', 'id'], name='AUTH_usercu_updated_fe5ae2_idx'),
+        ),
+    ]
@@ -110,17 +110,8 @@ class UserCustom(AbstractUser, BaseModel):
         db_index=True,
     )
     
-    def delete(self, hard_delete=False, **kwargs):
-        super().delete(hard_delete=hard_delete, **kwargs)
-        
-        if not hard_delete:
-            self.is_active = False
-            self.save(update_fields=['is_active'])
-
-    def restore(self):
-        super().restore()
-        self.is_active = True
-        self.save(update_fields=['is_active'])
+    SOFT_DELETE_VALUES = {'is_active': False}
+    RESTORE_VALUES = {'is_active': True}
     
     def save(self, *args, **kwargs):
         if not hasattr(self, '_skip_role_permissions'):
@@ -143,3 +134,6 @@ class UserCustom(AbstractUser, BaseModel):
         verbose_name = "User"
         verbose_name_plural = "Users"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
@@ -1,4 +1,11 @@
+from allauth.account import app_settings as allauth_account_settings
+from allauth.account.adapter import get_adapter
+from allauth.account.models import EmailAddress
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from .models import UserCustom
 
@@ -73,11 +80,57 @@ class CustomRegisterSerializer(RegisterSerializer):
         })
         return data
     
-    def custom_signup(self, request, user):
-        user.first_name = self.cleaned_data.get('first_name')
-        user.last_name = self.cleaned_data.get('last_name')
-        user.phone = self.cleaned_data.get('phone')
+    def populate_profile(self, user):
+        # A blank phone is stored as NULL: the column is unique.
+        user.phone = self.cleaned_data.get('phone') or None
         user.birthday = self.cleaned_data.get('birthday')
         user.gender = self.cleaned_data.get('gender')
         user.role = self.cleaned_data.get('role')
-        user.save()
\ No newline at end of file
+
+    def save(self, request):
+        """Create the user, its email address and its token with one INSERT each.
+
+        dj-rest-auth saves the user and then calls ``custom_signup``, which saved
+        it again; here every field is set before the single INSERT.
+        """
+        adapter = get_adapter()
+        user = adapter.new_user(request)
+        self.cleaned_data = self.get_cleaned_data()
+        user = adapter.save_user(request, user, self, commit=False)
+        self.populate_profile(user)
+        try:
+            adapter.clean_password(self.cleaned_data['password1'], user=user)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(detail=serializers.as_serializer_error(exc))
+
+        stashed_email = adapter.unstash_verified_email(request) or ''
+        with transaction.atomic():
+            user.save()
+            address = EmailAddress.objects.create(
+                user=user,
+                email=user.email,
+                primary=True,
+                verified=stashed_email.lower() == user.email.lower(),
+            )
+            if issues_token_on_signup():
+                user.signup_token = Token.objects.create(user=user)
+        EmailAddress.objects.fill_cache_for_user(user, [address])
+        return user
+
+
+def issues_token_on_signup():
+    # Mirrors RegisterView.perform_create, which only logs new users in
+    # with a token when their email does not have to be verified first.
+    return (
+        allauth_account_settings.EMAIL_VERIFICATION != allauth_account_settings.EmailVerificationMethod.MANDATORY
+        and not rest_auth_settings.USE_JWT
+        and not rest_auth_settings.SESSION_LOGIN
+    )
+
+
+def create_token(token_model, user, serializer):
+    """``REST_AUTH['TOKEN_CREATOR']`` reusing the token created at signup."""
+    token = getattr(user, 'signup_token', None)
+    if token is None:
+        token, _ = token_model.objects.get_or_create(user=user)
+    return token
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import realtime
+from .models import UserCustom
+
+
+@receiver(post_save, sender=UserCustom)
+def user_post_save(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login; they are not changes worth pushing.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    realtime.publish('users', 'created' if created else 'updated', {
+        'id': instance.pk,
+        'role': instance.role,
+        'is_active': instance.is_active,
+        'updated_at': instance.updated_at,
+        'deleted_at': instance.deleted_at,
+    })
+
+
+@receiver(post_delete, sender=UserCustom)
+def user_post_delete(sender, instance, **kwargs):
+    realtime.publish('users', 'deleted', {'id': instance.pk})
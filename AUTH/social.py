@@ -0,0 +1,117 @@
+from urllib.parse import parse_qsl
+
+import jwt
+from allauth.socialaccount import app_settings as socialaccount_settings
+from allauth.socialaccount.internal.jwtkit import lookup_kid_pem_x509_certificate
+from allauth.socialaccount.providers.github.views import GitHubOAuth2Adapter
+from allauth.socialaccount.providers.google.views import CERTS_URL, GoogleOAuth2Adapter
+from allauth.socialaccount.providers.oauth2.client import OAuth2Client, OAuth2Error
+from requests.auth import HTTPBasicAuth
+
+from core import http
+
+# The allauth clients and adapters below call ``requests`` directly, opening a
+# new TLS connection per call; these variants go through the pooled session.
+
+
+class PooledOAuth2Client(OAuth2Client):
+    def get_access_token(self, code, pkce_code_verifier=None):
+        data = {
+            'redirect_uri': self.callback_url,
+            'grant_type': 'authorization_code',
+            'code': code,
+        }
+        auth = None
+        if self.basic_auth:
+            auth = HTTPBasicAuth(self.consumer_key, self.consumer_secret)
+        else:
+            data.update({'client_id': self.consumer_key, 'client_secret': self.consumer_secret})
+        self._strip_empty_keys(data)
+        params = None
+        if self.access_token_method == 'GET':
+            params, data = data, None
+        if data and pkce_code_verifier:
+            data['code_verifier'] = pkce_code_verifier
+
+        response = http.session().request(
+            self.access_token_method, self.access_token_url,
+            params=params, data=data, headers=self.headers, auth=auth,
+        )
+        access_token = None
+        if response.status_code in (200, 201):
+            if response.headers.get('content-type', '').split(';')[0] == 'application/json':
+                access_token = response.json()
+            else:
+                access_token = dict(parse_qsl(response.text))
+        if not access_token or 'access_token' not in access_token:
+            raise OAuth2Error(f'Error retrieving access token: {response.content!r}')
+        return access_token
+
+
+class PooledGoogleOAuth2Adapter(GoogleOAuth2Adapter):
+    certs_url = CERTS_URL
+
+    def _signing_key(self, id_token):
+        kid = jwt.get_unverified_header(id_token).get('kid')
+        key = lookup_kid_pem_x509_certificate(http.cached_json(self.certs_url), kid)
+        if key is None:
+            # Google rotates its keys; a new kid means the cached set is stale.
+            key = lookup_kid_pem_x509_certificate(http.cached_json(self.certs_url, refresh=True), kid)
+        if key is None:
+            raise OAuth2Error(f"Invalid 'kid': '{kid}'")
+        return key
+
+    def _decode_id_token(self, app, id_token):
+        # Tokens received straight from Google's token endpoint over TLS need
+        # no signature check, as in allauth.
+        verify_signature = not self.did_fetch_access_token
+        try:
+            if verify_signature:
+                key = self._signing_key(id_token)
+                algorithms = [jwt.get_unverified_header(id_token)['alg']]
+            else:
+                key, algorithms = '', None
+            return jwt.decode(
+                id_token,
+                key=key,
+                options={
+                    'verify_signature': verify_signature,
+                    'verify_iss': True,
+                    'verify_aud': True,
+                    'verify_exp': True,
+                },
+                issuer=self.id_token_issuer,
+                audience=app.client_id,
+                algorithms=algorithms,
+            )
+        except jwt.PyJWTError as exc:
+            raise OAuth2Error('Invalid id_token') from exc
+
+    def _fetch_user_info(self, access_token):
+        response = http.session().get(
+            self.identity_url, headers={'Authorization': f'Bearer {access_token}'}
+        )
+        if not response.ok:
+            raise OAuth2Error('Request to user info failed')
+        return response.json()
+
+
+class PooledGitHubOAuth2Adapter(GitHubOAuth2Adapter):
+    def complete_login(self, request, app, token, **kwargs):
+        headers = {'Authorization': f'token {token.token}'}
+        response = http.session().get(self.profile_url, headers=headers)
+        response.raise_for_status()
+        extra_data = response.json()
+        if socialaccount_settings.QUERY_EMAIL and not extra_data.get('email'):
+            extra_data['email'] = self.get_email(headers)
+        return self.get_provider().sociallogin_from_response(request, extra_data)
+
+    def get_email(self, headers):
+        response = http.session().get(self.emails_url, headers=headers)
+        response.raise_for_status()
+        emails = response.json()
+        primary = [email for email in emails if not isinstance(email, dict) or email.get('primary')]
+        email = (primary or emails or [None])[0]
+        if isinstance(email, dict):
+            email = email.get('email', '')
+        return email
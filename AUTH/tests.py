@@ -0,0 +1,460 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+from allauth.socialaccount.models import SocialAccount, SocialApp
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.cache import caches
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import audit, http
+from core.sync import encode_cursor
+from core.models import AuditLog, SyncTombstone
+from core.throttling import AuthIPThrottle, AuthUsernameThrottle, BucketRateThrottle
+from .models import UserCustom
+from .social import PooledGitHubOAuth2Adapter, PooledGoogleOAuth2Adapter
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+    'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle'},
+}
+
+
+class UserCustomAdminQueryTests(TestCase):
+    changelist_url = reverse('admin:AUTH_usercustom_changelist')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = UserCustom.objects.create_superuser(
+            username='root', email='root@example.com', password='root-pass-123'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.root)
+
+    def _create_users(self, count, start=0):
+        providers = ['google', 'github', None]
+        for index in range(start, start + count):
+            user = UserCustom.objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com', password='x'
+            )
+            provider = providers[index % len(providers)]
+            if provider:
+                SocialAccount.objects.create(user=user, provider=provider, uid=str(index))
+
+    def _changelist_queries(self, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.changelist_url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_changelist_query_count_is_constant(self):
+        self._create_users(2)
+        small_page_queries, _ = self._changelist_queries()
+
+        self._create_users(22, start=2)
+        full_page_queries, response = self._changelist_queries()
+
+        self.assertEqual(len(response.context['cl'].result_list), 25)
+        self.assertEqual(full_page_queries, small_page_queries)
+
+    def test_login_origin_filter_does_not_duplicate_users(self):
+        self._create_users(6)
+        user = UserCustom.objects.get(username='user0')
+        SocialAccount.objects.create(user=user, provider='google', uid='extra')
+
+        _, response = self._changelist_queries({'origin': 'google'})
+        usernames = [obj.username for obj in response.context['cl'].result_list]
+        self.assertEqual(sorted(usernames), ['user0', 'user3'])
+
+        _, response = self._changelist_queries({'origin': 'local'})
+        usernames = [obj.username for obj in response.context['cl'].result_list]
+        self.assertEqual(sorted(usernames), ['root', 'user2', 'user5'])
+
+
+class UserCustomSoftDeleteTests(TestCase):
+    def setUp(self):
+        for index in range(3):
+            UserCustom.objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com', password='x'
+            )
+
+    def test_queryset_soft_delete_is_a_single_update(self):
+        with self.assertNumQueries(1):
+            count = UserCustom.objects.all().soft_delete()
+
+        self.assertEqual(count, 3)
+        self.assertFalse(UserCustom.objects.exists())
+        self.assertFalse(UserCustom.objects.deleted().filter(is_active=True).exists())
+
+    def test_queryset_delete_is_soft(self):
+        UserCustom.objects.filter(username='user0').delete()
+
+        user = UserCustom.objects.deleted().get(username='user0')
+        self.assertFalse(user.is_active)
+
+    def test_queryset_restore_reactivates_users(self):
+        UserCustom.objects.all().soft_delete()
+
+        with self.assertNumQueries(1):
+            count = UserCustom.objects.deleted().restore()
+
+        self.assertEqual(count, 3)
+        self.assertEqual(UserCustom.objects.filter(is_active=True).count(), 3)
+
+    def test_instance_soft_delete_saves_once(self):
+        user = UserCustom.objects.get(username='user1')
+
+        with self.assertNumQueries(1):
+            user.delete()
+
+        user.refresh_from_db()
+        self.assertTrue(user.is_deleted)
+        self.assertFalse(user.is_active)
+
+    def test_queryset_hard_delete_removes_rows(self):
+        UserCustom.objects.all_objects().filter(username='user2').hard_delete()
+
+        self.assertFalse(UserCustom.objects.all_objects().filter(username='user2').exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ACCOUNT_EMAIL_VERIFICATION='none')
+class RegistrationQueryTests(TestCase):
+    payload = {
+        'username': 'newcomer', 'email': 'newcomer@example.com',
+        'password1': 'Signup-pass-123', 'password2': 'Signup-pass-123',
+        'first_name': 'New', 'last_name': 'Comer', 'phone': '', 'role': 'admin',
+    }
+
+    def test_registration_inserts_each_row_once(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('rest_register'), self.payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        statements = [
+            query['sql'] for query in context.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'BEGIN', 'COMMIT'))
+        ]
+        writes = [sql for sql in statements if not sql.startswith('SELECT')]
+        # Two uniqueness checks while validating, then user, email address and token.
+        self.assertEqual(len(statements), 5, statements)
+        self.assertEqual([sql.split('"')[1] for sql in writes], [
+            'AUTH_usercustom', 'account_emailaddress', 'authtoken_token',
+        ])
+
+        user = UserCustom.objects.get(username='newcomer')
+        self.assertEqual((user.role, user.is_staff, user.phone), ('admin', True, None))
+        self.assertEqual(response.json()['key'], user.auth_token.key)
+        self.assertTrue(user.emailaddress_set.filter(email='newcomer@example.com', primary=True).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ALLOWED_HOSTS=['testserver'])
+class AuthThrottlingTests(TestCase):
+    login_url = reverse('rest_login')
+    rates = {'auth_ip': '100/min', 'auth_username': '2/min'}
+
+    def setUp(self):
+        # A fixed clock keeps every request in the same rate period.
+        patcher = mock.patch.object(BucketRateThrottle, 'timer', lambda self: 1_000_000.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for throttle in (AuthIPThrottle, AuthUsernameThrottle):
+            patcher = mock.patch.object(throttle, 'THROTTLE_RATES', self.rates)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+        self.cache.clear()
+
+    def _login(self, username, **extra):
+        return self.client.post(
+            self.login_url, {'username': username, 'password': 'wrong'},
+            content_type='application/json', **extra
+        )
+
+    def test_username_bucket_is_throttled_with_retry_after(self):
+        self.assertEqual(self._login('victim').status_code, 400)
+        self.assertEqual(self._login('Victim').status_code, 400)
+
+        response = self._login('victim')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self._login('someone-else').status_code, 400)
+
+    def test_spoofed_forwarded_for_shares_the_client_ip_bucket(self):
+        with mock.patch.object(AuthIPThrottle, 'THROTTLE_RATES', {**self.rates, 'auth_ip': '2/min'}):
+            for index in range(2):
+                self._login(f'user{index}', HTTP_X_FORWARDED_FOR=f'10.0.0.{index}')
+            response = self._login('user2', HTTP_X_FORWARDED_FOR='10.0.0.2')
+
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(AUTH_CONCURRENCY_LIMIT=1)
+    def test_excess_concurrent_logins_are_shed_without_queries(self):
+        self.cache.set('auth_slot_0', 'held', 30)
+
+        with self.assertNumQueries(0):
+            response = self._login('victim')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+        self.cache.delete('auth_slot_0')
+        self.assertEqual(self._login('victim').status_code, 400)
+        self.assertIsNone(self.cache.get('auth_slot_0'))
+
+
+class AuditWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.users = [
+            UserCustom.objects.create_user(username=f'audited{index}', email=f'audited{index}@example.com')
+            for index in range(3)
+        ]
+
+    def _writer(self, **options):
+        options = {
+            'batch_size': 2, 'flush_interval': 0.05, 'max_queue_size': 10, 'enqueue_timeout': 0,
+            'write_attempts': 3, 'retry_delay': 0, **options,
+        }
+        return audit.AuditWriter(**options)
+
+    def _entries(self, action='role_changed'):
+        return [
+            AuditLog(model_label=UserCustom._meta.label, object_pk=str(user.pk), action=action)
+            for user in self.users
+        ]
+
+    def _logged(self):
+        return sorted(AuditLog.objects.filter(model_label=UserCustom._meta.label).values_list('object_pk', flat=True))
+
+    def test_queued_entries_are_flushed(self):
+        writer = self._writer()
+        with mock.patch.object(writer, '_ensure_started'):
+            for entry in self._entries():
+                writer.put(entry)
+            self.assertEqual(self._logged(), [])
+            writer.flush()
+        self.assertEqual(self._logged(), sorted(str(user.pk) for user in self.users))
+
+    def test_full_queue_writes_synchronously(self):
+        writer = self._writer(max_queue_size=1)
+        with mock.patch.object(writer, '_ensure_started'), self.assertLogs('core.audit', 'WARNING'):
+            for entry in self._entries():
+                writer.put(entry)
+        self.assertEqual(len(self._logged()), 2)
+        self.assertEqual(writer._queue.qsize(), 1)
+
+    def test_stop_writes_pending_entries(self):
+        # What atexit runs: the writer thread drains the queue and exits, the rest is flushed.
+        writer = self._writer()
+        for entry in self._entries():
+            writer.put(entry)
+        writer.stop()
+        self.assertFalse(writer._thread.is_alive())
+        self.assertEqual(len(self._logged()), 3)
+
+    def test_failed_batch_is_retried_then_dropped(self):
+        writer = self._writer()
+        create = AuditLog.objects.bulk_create
+        failures = [OperationalError('database is locked')]
+
+        def flaky(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return create(*args, **kwargs)
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=flaky):
+            with self.assertLogs('core.audit', 'WARNING'):
+                self.assertTrue(writer.write(self._entries()))
+        self.assertEqual(len(self._logged()), 3)
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=OperationalError('gone')) as failing:
+            with self.assertLogs('core.audit', 'ERROR'):
+                self.assertFalse(writer.write(self._entries('updated')))
+        self.assertEqual(failing.call_count, 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SYNC_SETTLE_SECONDS=5, RETENTION_DAYS=90)
+class DeltaSyncTests(TestCase):
+    url = '/api/auth/users/sync/'
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.client = APIClient()
+        self.client.force_authenticate(UserCustom.objects.create_user(username='syncer', email='syncer@example.com'))
+        self._stamp('syncer', hours=2)
+
+    def _user(self, username, **age):
+        UserCustom.objects.create_user(username=username, email=f'{username}@example.com')
+        return self._stamp(username, **age)
+
+    def _stamp(self, username, **age):
+        users = UserCustom.objects.all_objects().filter(username=username)
+        users.update(updated_at=self.now - timedelta(**age))
+        return users.get()
+
+    def _sync(self, cursor=None, **params):
+        if cursor:
+            params['changed_since'] = cursor
+        return self.client.get(self.url, params)
+
+    def _usernames(self, response):
+        return [row['username'] for row in response.data['results']]
+
+    def test_cursor_stops_before_unsettled_rows(self):
+        settled = self._user('settled', minutes=10)
+        self._user('fresh', seconds=1)
+
+        first = self._sync()
+        self.assertEqual(self._usernames(first), ['syncer', 'settled', 'fresh'])
+        self.assertEqual(first.data['next_cursor'], encode_cursor(settled.updated_at, settled.pk))
+
+        # Stamped before 'fresh' but committed after the first sync.
+        self._user('late', seconds=2)
+        second = self._sync(first.data['next_cursor'])
+        self.assertEqual(self._usernames(second), ['late', 'fresh'])
+
+    def test_tombstones_are_returned(self):
+        gone = self._user('gone', minutes=10)
+        gone.delete()
+        self._stamp('gone', minutes=9)
+
+        response = self._sync()
+        self.assertEqual(self._usernames(response), ['syncer'])
+        self.assertEqual([row['id'] for row in response.data['deleted']], [gone.pk])
+
+    def test_hard_deleted_rows_leave_tombstones(self):
+        gone = self._user('gone', minutes=10)
+        first = self._sync()
+
+        gone_pk = gone.pk
+        gone.hard_delete()
+        SyncTombstone.objects.update(deleted_at=self.now - timedelta(minutes=5))
+
+        second = self._sync(first.data['next_cursor'])
+        self.assertEqual(self._usernames(second), [])
+        self.assertEqual([row['id'] for row in second.data['deleted']], [gone_pk])
+        self.assertEqual(second.data['next_cursor'], encode_cursor(self.now - timedelta(minutes=5), gone_pk))
+
+    def test_page_of_unsettled_rows_still_advances(self):
+        for index in range(3):
+            self._user(f'busy{index}', seconds=1)
+
+        response = self._sync(encode_cursor(self.now - timedelta(hours=1), 0), limit=2)
+        self.assertTrue(response.data['has_more'])
+        rest = self._sync(response.data['next_cursor'], limit=2)
+        self.assertEqual(self._usernames(response) + self._usernames(rest), ['busy0', 'busy1', 'busy2'])
+
+    def test_cursor_older_than_retention_requires_a_full_sync(self):
+        response = self._sync(encode_cursor(self.now - timedelta(days=91), 1))
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['detail'].code, 'sync_cursor_expired')
+
+        self.assertEqual(self._sync(encode_cursor(self.now - timedelta(days=89), 1)).status_code, 200)
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    routes = {
+        '/user': (200, {}, {'id': 42, 'login': 'octocat', 'name': 'Octo Cat', 'email': None}),
+        '/user/emails': (200, {}, [
+            {'email': 'other@example.com', 'primary': False, 'verified': True},
+            {'email': 'octocat@example.com', 'primary': True, 'verified': True},
+        ]),
+        '/certs': (200, {'Cache-Control': 'public, max-age=60'}, {'kid-1': 'certificate'}),
+    }
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path == '/slow':
+            time.sleep(0.5)
+        status, headers, body = self.routes.get(self.path, (404, {}, {}))
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ACCOUNT_EMAIL_VERIFICATION='none')
+class SocialLoginHTTPTests(TestCase):
+    """Social login against a local fake provider instead of GitHub and Google."""
+
+    def setUp(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProviderHandler)
+        server.connections, server.paths = 0, []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.base_url = f'http://127.0.0.1:{server.server_port}'
+
+        for target, name, value in (
+            (http, '_session', None),
+            (PooledGitHubOAuth2Adapter, 'profile_url', f'{self.base_url}/user'),
+            (PooledGitHubOAuth2Adapter, 'emails_url', f'{self.base_url}/user/emails'),
+            (PooledGoogleOAuth2Adapter, 'certs_url', f'{self.base_url}/certs'),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: http._session and http._session.close())
+        caches['default'].clear()
+
+    def test_github_logins_reuse_one_connection(self):
+        app = SocialApp.objects.create(provider='github', name='GitHub', client_id='id', secret='secret')
+        app.sites.add(Site.objects.get_current())
+
+        for _ in range(2):
+            response = self.client.post(
+                reverse('github-login'), {'access_token': 'gh-token'}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+
+        user = UserCustom.objects.get(email='octocat@example.com')
+        self.assertEqual(response.json()['key'], user.auth_token.key)
+        self.assertEqual(self.server.paths, ['/user', '/user/emails'] * 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_provider_json_is_cached_for_its_max_age(self):
+        url = f'{self.base_url}/certs'
+
+        self.assertEqual(http.cached_json(url), {'kid-1': 'certificate'})
+        http.cached_json(url)
+        self.assertEqual(self.server.paths, ['/certs'])
+
+        http.cached_json(url, refresh=True)
+        self.assertEqual(self.server.paths, ['/certs', '/certs'])
+
+    @override_settings(OUTBOUND_HTTP_READ_TIMEOUT=0.1)
+    def test_slow_provider_times_out(self):
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            http.session().get(f'{self.base_url}/slow')
+
+    def test_blocking_call_is_refused_on_the_event_loop(self):
+        async def fetch():
+            http.session().get(f'{self.base_url}/user')
+
+        with self.assertRaises(SynchronousOnlyOperation):
+            asyncio.run(fetch())
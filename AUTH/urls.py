@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserCustomViewSet, GoogleLogin, GitHubLogin
+from .views import UserCustomViewSet, GoogleLogin, GitHubLogin, ThrottledLoginView, ThrottledRegisterView
 
 urlpatterns = [
     # D J - R E S T - A U T H
+    path('auth/login/', ThrottledLoginView.as_view(), name='rest_login'),
+    path('auth/registration/', ThrottledRegisterView.as_view(), name='rest_register'),
     path('auth/', include('dj_rest_auth.urls')),
     path('auth/registration/', include('dj_rest_auth.registration.urls')),
     
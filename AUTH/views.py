@@ -4,17 +4,31 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
-from dj_rest_auth.registration.views import SocialLoginView
-from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
-from allauth.socialaccount.providers.github.views import GitHubOAuth2Adapter
-from allauth.socialaccount.providers.oauth2.client import OAuth2Client
+from dj_rest_auth.views import LoginView
+from dj_rest_auth.registration.views import RegisterView, SocialLoginView
 from rest_framework.exceptions import ValidationError, PermissionDenied
 
+from core import audit
+from core.sync import DeltaSyncMixin
+from core.throttling import AuthIPThrottle, AuthUsernameThrottle
 from .models import UserCustom
 from .serializers import UserCustomSerializer
+from .social import PooledGitHubOAuth2Adapter, PooledGoogleOAuth2Adapter, PooledOAuth2Client
 from .permissions import IsRoot, IsAdminOrRoot
 
 
+AUTH_THROTTLE_CLASSES = [AuthIPThrottle, AuthUsernameThrottle]
+
+
+# A U T H E N T I C A T I O N
+class ThrottledLoginView(LoginView):
+    throttle_classes = AUTH_THROTTLE_CLASSES
+
+
+class ThrottledRegisterView(RegisterView):
+    throttle_classes = AUTH_THROTTLE_CLASSES
+
+
 # S O C I A L   A U T H E N T I C A T I O N
 @extend_schema(
     summary="Google social login",
@@ -22,8 +36,9 @@ from .permissions import IsRoot, IsAdminOrRoot
     responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
 )
 class GoogleLogin(SocialLoginView):
-    adapter_class = GoogleOAuth2Adapter
-    client_class = OAuth2Client
+    adapter_class = PooledGoogleOAuth2Adapter
+    client_class = PooledOAuth2Client
+    throttle_classes = [AuthIPThrottle]
 
 
 @extend_schema(
@@ -32,8 +47,9 @@ class GoogleLogin(SocialLoginView):
     responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
 )
 class GitHubLogin(SocialLoginView):
-    adapter_class = GitHubOAuth2Adapter
-    client_class = OAuth2Client
+    adapter_class = PooledGitHubOAuth2Adapter
+    client_class = PooledOAuth2Client
+    throttle_classes = [AuthIPThrottle]
 
 
 # U S E R   M A N A G E M E N T
@@ -44,7 +60,7 @@ class GitHubLogin(SocialLoginView):
     partial_update=extend_schema(summary="Partial update", tags=["Users"]),
     destroy=extend_schema(summary="Deactivate user", tags=["Users"]),
 )
-class UserCustomViewSet(viewsets.ModelViewSet):
+class UserCustomViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     queryset = UserCustom.objects.all()
     serializer_class = UserCustomSerializer
     permission_classes = [IsAuthenticated]
@@ -97,8 +113,10 @@ class UserCustomViewSet(viewsets.ModelViewSet):
         if user == request.user:
              raise PermissionDenied(detail='Root cannot change own role')
         
+        old_role = user.role
         user.role = new_role
         user.save()
+        audit.record(user, 'role_changed', changes={'role': [old_role, new_role]}, actor=request.user)
         
         return Response({
             'user': UserCustomSerializer(user).data,
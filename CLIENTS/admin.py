@@ -1,8 +1,12 @@
 # CLIENTS/admin.py
 from django.contrib import admin
 from django.contrib import messages
+from django.utils import timezone
 from django.utils.html import format_html
+from core import audit
+from core.paginator import EstimatedCountPaginator
 from .models import Customer
+from .signals import invalidate_customer_cache, publish_customer_event
 
 
 @admin.register(Customer)
@@ -44,9 +48,11 @@ class CustomerAdmin(admin.ModelAdmin):
     actions = ['activate_customers', 'deactivate_customers', 'make_frequent']
 
     list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+        return Customer.objects.all_objects().select_related()
 
     def frecuency_badge(self, obj):
         colors = {
@@ -70,13 +76,31 @@ class CustomerAdmin(admin.ModelAdmin):
     has_preferences.boolean = True
     has_preferences.short_description = 'Has Preferences'
 
+    def _bulk_update(self, queryset, **values):
+        rows = list(queryset.values('pk', *values))
+        if not rows:
+            return 0
+        pks = [row['pk'] for row in rows]
+        count = Customer.objects.all_objects().filter(pk__in=pks).update(
+            updated_at=timezone.now(), **values
+        )
+        # One audit batch per distinct set of old values.
+        changed = {}
+        for row in rows:
+            old = tuple((field, row[field]) for field, value in values.items() if row[field] != value)
+            if old:
+                changed.setdefault(old, []).append(row['pk'])
+        for old, changed_pks in changed.items():
+            audit.record_many(Customer, changed_pks, 'updated', changes={
+                field: [old_value, values[field]] for field, old_value in old
+            })
+        invalidate_customer_cache(*pks)
+        publish_customer_event('updated', *pks)
+        return count
+
     def activate_customers(self, request, queryset):
-        count = 0
-        for customer in queryset:
-            if customer.is_deleted:
-                customer.restore()
-                count += 1
-        
+        count = queryset.restore()
+
         self.message_user(
             request,
             f'{count} customer(s) were successfully activated.',
@@ -86,12 +110,8 @@ class CustomerAdmin(admin.ModelAdmin):
     activate_customers.short_description = "Activate selected customers"
 
     def deactivate_customers(self, request, queryset):
-        count = 0
-        for customer in queryset:
-            if not customer.is_deleted:
-                customer.delete()
-                count += 1
-        
+        count = queryset.soft_delete()
+
         self.message_user(
             request,
             f'{count} customer(s) were successfully deactivated.',
@@ -101,7 +121,7 @@ class CustomerAdmin(admin.ModelAdmin):
     deactivate_customers.short_description = "Deactivate selected customers"
 
     def make_frequent(self, request, queryset):
-        count = queryset.update(frecuency='FREQUENT')
+        count = self._bulk_update(queryset, frecuency='FREQUENT')
         self.message_user(
             request,
             f'{count} customer(s) were marked as frequent.',
@@ -0,0 +1,230 @@
+# CLIENTS/autocomplete.py
+import bisect
+import heapq
+import re
+import sys
+import threading
+import unicodedata
+from array import array
+from itertools import islice, takewhile
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import counters
+from .models import Customer
+
+VERSION_KEY = 'customer_autocomplete_version'
+CHANGE_KEY = 'customer_autocomplete_change_%d'
+
+_WORD = re.compile(r'\w+')
+
+
+def words(text):
+    """Accent-free, case-folded words of ``text``."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text.casefold())
+
+
+class DescriptionIndex:
+    """Prefix index over the descriptions of active customers.
+
+    Every word of every description is stored once in a sorted list, with the
+    customer id at the same position in a parallel ``array``; words are interned
+    so common names share one string. A query finds its rarest-looking word's
+    range with ``bisect`` and checks the remaining words against the candidates.
+
+    Changes do not touch the big arrays: new entries go to a small sorted
+    ``pending`` list and the ids whose old entries are outdated to ``stale``.
+    Both are merged into the arrays once they reach a fraction of the index,
+    so a change costs amortized constant time instead of an O(n) insert.
+    """
+
+    COMPACT_MIN = 256
+    COMPACT_FRACTION = 64
+
+    def __init__(self):
+        self.version = None
+        self._words = []
+        self._ids = array('q')
+        self._pending = []
+        self._stale = set()
+        self._descriptions = {}
+        self._lock = threading.RLock()
+
+    def build(self, rows, version):
+        entries = []
+        descriptions = {}
+        for pk, description in rows:
+            descriptions[pk] = description
+            entries.extend((sys.intern(word), pk) for word in set(words(description)))
+        entries.sort()
+        with self._lock:
+            self._words = [word for word, _ in entries]
+            self._ids = array('q', (pk for _, pk in entries))
+            self._pending = []
+            self._stale = set()
+            self._descriptions = descriptions
+            self.version = version
+
+    def apply(self, pk, description):
+        """Insert, update or (with ``description=None``) remove one customer."""
+        with self._lock:
+            self._remove(pk)
+            if description is not None:
+                self._descriptions[pk] = description
+                for word in set(words(description)):
+                    bisect.insort(self._pending, (sys.intern(word), pk))
+            if len(self._pending) + len(self._stale) > max(self.COMPACT_MIN, len(self._words) // self.COMPACT_FRACTION):
+                self._compact()
+
+    def _remove(self, pk):
+        description = self._descriptions.pop(pk, None)
+        if description is None:
+            return
+        # Entries in the arrays are skipped from now on; pending ones are dropped.
+        self._stale.add(pk)
+        for word in set(words(description)):
+            position = bisect.bisect_left(self._pending, (word, pk))
+            if position < len(self._pending) and self._pending[position] == (word, pk):
+                del self._pending[position]
+
+    def _compact(self):
+        stale = self._stale
+        current = (
+            (word, pk) for word, pk in zip(self._words, self._ids) if pk not in stale
+        )
+        entries = list(heapq.merge(current, self._pending))
+        self._words = [word for word, _ in entries]
+        self._ids = array('q', (pk for _, pk in entries))
+        self._pending = []
+        self._stale = set()
+
+    def _entries(self, prefix):
+        """``(word, pk)`` entries whose word starts with ``prefix``, in order."""
+        start = bisect.bisect_left(self._words, prefix)
+        current = (
+            (self._words[position], self._ids[position])
+            for position in range(start, len(self._words))
+            if self._ids[position] not in self._stale
+        )
+        pending = (
+            self._pending[position]
+            for position in range(bisect.bisect_left(self._pending, (prefix,)), len(self._pending))
+        )
+        return takewhile(lambda entry: entry[0].startswith(prefix), heapq.merge(current, pending))
+
+    def search(self, query, limit):
+        tokens = words(query)
+        if not tokens:
+            return []
+        anchor_position = max(range(len(tokens)), key=lambda position: len(tokens[position]))
+        anchor = tokens[anchor_position]
+        others = tokens[:anchor_position] + tokens[anchor_position + 1:]
+
+        results = []
+        seen = set()
+        with self._lock:
+            entries = islice(self._entries(anchor), settings.CUSTOMER_AUTOCOMPLETE_MAX_SCAN)
+            for _, pk in entries:
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                description = self._descriptions[pk]
+                if others:
+                    candidate_words = words(description)
+                    if not all(any(word.startswith(token) for word in candidate_words) for token in others):
+                        continue
+                results.append({'id': pk, 'description': description})
+                if len(results) >= limit:
+                    break
+        return results
+
+
+index = DescriptionIndex()
+_sync_lock = threading.Lock()
+
+
+def shared_version(refresh=False):
+    """The number of changes published so far.
+
+    The count is a database counter, so it never expires or goes back; the
+    cache only saves reading it on every search, for at most
+    ``CUSTOMER_AUTOCOMPLETE_VERSION_TIMEOUT`` seconds after a change.
+    """
+    version = None if refresh else cache.get(VERSION_KEY)
+    if version is None:
+        version = counters.value(VERSION_KEY)
+        cache.set(VERSION_KEY, version, settings.CUSTOMER_AUTOCOMPLETE_VERSION_TIMEOUT)
+    return version
+
+
+def rebuild(version):
+    rows = Customer.objects.values_list('pk', 'description').iterator(chunk_size=5000)
+    index.build(rows, version)
+
+
+def ensure_current():
+    """Bring this worker's index up to the shared version.
+
+    A worker that is a few versions behind replays the changed ids from the
+    cache and reloads just those rows; one that has never built, is too far
+    behind or finds a change missing rebuilds from the database.
+    """
+    version = shared_version()
+    if index.version == version:
+        return
+    with _sync_lock:
+        if index.version == version:
+            return
+        if index.version is not None and version < index.version:
+            # A cached count older than this index; only the counter is authoritative.
+            version = shared_version(refresh=True)
+            if index.version == version:
+                return
+        behind = None if index.version is None else version - index.version
+        if behind is None or behind < 0 or behind > settings.CUSTOMER_AUTOCOMPLETE_MAX_REPLAY:
+            rebuild(version)
+            return
+
+        keys = [CHANGE_KEY % number for number in range(index.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            rebuild(version)
+            return
+
+        pks = set(changes.values())
+        rows = dict(Customer.objects.filter(pk__in=pks).values_list('pk', 'description'))
+        for pk in pks:
+            index.apply(pk, rows.get(pk))
+        index.version = version
+
+
+def record_change(pk, description=None, known=False):
+    """Publish a change of customer ``pk`` to every worker's index.
+
+    With ``known=True`` the caller passes the new ``description`` (None when the
+    customer left the active set) and this worker applies it directly if its
+    index was current.
+    """
+    version = counters.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY % version, pk, settings.CUSTOMER_AUTOCOMPLETE_CHANGE_TIMEOUT)
+    cache.delete(VERSION_KEY)
+
+    if known:
+        with _sync_lock:
+            if index.version == version - 1:
+                index.apply(pk, description)
+                index.version = version
+
+
+def invalidate():
+    """Make every worker rebuild, after rows were written without signals (bulk loads)."""
+    counters.incr(VERSION_KEY, settings.CUSTOMER_AUTOCOMPLETE_MAX_REPLAY + 1)
+    cache.delete(VERSION_KEY)
+
+
+def search(query, limit=10):
+    ensure_current()
+    return index.search(query, limit)
@@ -0,0 +1,240 @@
+# CLIENTS/duplicates.py
+import hashlib
+import operator
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+from .autocomplete import words
+from .models import Customer
+
+REPORT_KEY = 'customer_duplicates_report'
+
+# Candidates whose estimated similarity is this far below the threshold are
+# dropped before the exact comparison; the estimate of 64 hashes is within it
+# for the vast majority of pairs.
+ESTIMATE_MARGIN = 0.15
+
+
+def normalize(description):
+    """Accent-free, case-folded description with single spaces between words."""
+    return ' '.join(words(description))
+
+
+def trigrams(normalized):
+    padded = f'  {normalized} '
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+def similarity(left, right):
+    """Jaccard similarity of the trigram sets of two normalized descriptions."""
+    if left == right:
+        return 1.0
+    left, right = trigrams(left), trigrams(right)
+    return len(left & right) / len(left | right)
+
+
+class Signer:
+    """MinHash signatures of trigram sets.
+
+    Each trigram is hashed once with SHAKE-128 into ``hashes`` 32-bit values, one
+    per hash function, and the signature is their element-wise minimum. Trigram
+    hashes are memoized: names reuse a small alphabet of trigrams.
+    """
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+        self._trigrams = {}
+
+    def _hash(self, trigram):
+        values = self._trigrams.get(trigram)
+        if values is None:
+            values = self._trigrams[trigram] = array('I', hashlib.shake_128(trigram.encode()).digest(self.hashes * 4))
+        return values
+
+    def __call__(self, normalized):
+        return tuple(map(min, *(self._hash(trigram) for trigram in trigrams(normalized))))
+
+
+def estimate(left, right):
+    """Jaccard similarity estimated from two signatures."""
+    return sum(map(operator.eq, left, right)) / len(left)
+
+
+def signature_range(first, last, hashes):
+    """``(pk, normalized, signature)`` for the active customers with ``first <= pk <= last``."""
+    signer = Signer(hashes)
+    rows = Customer.objects.filter(pk__gte=first, pk__lte=last).values_list('pk', 'description')
+    result = []
+    for pk, description in rows.iterator(chunk_size=2000):
+        normalized = normalize(description)
+        if normalized:
+            result.append((pk, normalized, signer(normalized)))
+    return result
+
+
+def signature_chunk(bounds):
+    # Runs in a forked worker, which must not reuse the parent's connections.
+    try:
+        return signature_range(*bounds)
+    finally:
+        connections.close_all()
+
+
+class _Clusters:
+    """Union-find over customer ids."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, pk):
+        root = pk
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while pk != root:
+            self.parent[pk], pk = root, self.parent[pk]
+        return root
+
+    def union(self, left, right):
+        # Both ends get an entry, so groups() also sees the roots.
+        self.parent.setdefault(left, left)
+        self.parent.setdefault(right, right)
+        left, right = self.find(left), self.find(right)
+        if left != right:
+            self.parent[max(left, right)] = min(left, right)
+
+    def groups(self):
+        groups = defaultdict(list)
+        for pk in list(self.parent):
+            groups[self.find(pk)].append(pk)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+
+
+def candidate_pairs(signatures, bands, max_bucket):
+    """Pairs of ids whose signatures agree on every row of at least one band.
+
+    Buckets larger than ``max_bucket`` (a very common name) are not compared
+    all-pairs: their members are sorted by description and each is compared
+    with its next ``max_bucket`` neighbours.
+    """
+    rows = len(next(iter(signatures.values()))[1]) // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for pk, (_, values) in signatures.items():
+            buckets[values[band * rows:(band + 1) * rows]].append(pk)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            if len(members) > max_bucket:
+                members.sort(key=lambda pk: signatures[pk][0])
+                pairs.update(
+                    (members[position], other)
+                    for position in range(len(members))
+                    for other in members[position + 1:position + 1 + max_bucket]
+                )
+            else:
+                pairs.update(
+                    (members[position], other)
+                    for position in range(len(members))
+                    for other in members[position + 1:]
+                )
+    return pairs
+
+
+# Set before forking verification workers, which inherit it instead of
+# receiving the signatures and pairs through pickling.
+_shared = None
+
+
+def verify_pairs(signatures, pairs, threshold):
+    """``(left, right, similarity)`` for the candidate pairs at or above ``threshold``."""
+    edges = []
+    for left, right in pairs:
+        if estimate(signatures[left][1], signatures[right][1]) < threshold - ESTIMATE_MARGIN:
+            continue
+        score = similarity(signatures[left][0], signatures[right][0])
+        if score >= threshold:
+            edges.append((left, right, score))
+    return edges
+
+
+def _verify_slice(bounds):
+    signatures, pairs, threshold = _shared
+    return verify_pairs(signatures, pairs[bounds[0]:bounds[1]], threshold)
+
+
+def find_clusters(rows, threshold, bands, max_bucket, workers=1):
+    """Group ``(pk, normalized, signature)`` rows into clusters of likely duplicates.
+
+    Returns the clusters and the number of candidate pairs compared; with
+    ``workers > 1`` the comparisons run in forked processes.
+    """
+    global _shared
+
+    signatures = {pk: (normalized, values) for pk, normalized, values in rows}
+    if not signatures:
+        return [], 0
+
+    pairs = list(candidate_pairs(signatures, bands, max_bucket))
+    if workers > 1 and len(pairs) > workers:
+        step = -(-len(pairs) // workers)
+        _shared = (signatures, pairs, threshold)
+        try:
+            with ProcessPoolExecutor(workers, mp_context=get_context('fork')) as executor:
+                slices = [(start, start + step) for start in range(0, len(pairs), step)]
+                edges = [edge for part in executor.map(_verify_slice, slices) for edge in part]
+        finally:
+            _shared = None
+    else:
+        edges = verify_pairs(signatures, pairs, threshold)
+
+    clusters = _Clusters()
+    scores = {}
+    for left, right, score in edges:
+        clusters.union(left, right)
+        scores[left] = min(scores.get(left, 1.0), score)
+        scores[right] = min(scores.get(right, 1.0), score)
+
+    groups = clusters.groups()
+    groups.sort(key=len, reverse=True)
+    return [
+        {'ids': members, 'similarity': round(min(scores[pk] for pk in members), 3)}
+        for members in groups
+    ], len(pairs)
+
+
+def save_report(clusters, customers, candidates):
+    report = {
+        'generated_at': timezone.now().isoformat(),
+        'customers': customers,
+        'candidate_pairs': candidates,
+        'clusters': clusters,
+    }
+    cache.set(REPORT_KEY, report, settings.CUSTOMER_DUPLICATE_REPORT_TIMEOUT)
+    return report
+
+
+def load_report():
+    """The last saved report, without customers deleted since it was built."""
+    report = cache.get(REPORT_KEY)
+    if report is None:
+        return None
+
+    ids = {pk for cluster in report['clusters'] for pk in cluster['ids']}
+    descriptions = dict(Customer.objects.filter(pk__in=ids).values_list('pk', 'description'))
+    clusters = []
+    for cluster in report['clusters']:
+        members = [pk for pk in cluster['ids'] if pk in descriptions]
+        if len(members) > 1:
+            clusters.append({
+                'similarity': cluster['similarity'],
+                'customers': [{'id': pk, 'description': descriptions[pk]} for pk in members],
+            })
+    return dict(report, clusters=clusters)
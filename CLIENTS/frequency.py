@@ -0,0 +1,205 @@
+# CLIENTS/frequency.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.utils import timezone
+
+from core import audit, realtime
+from .models import Customer, CustomerVisit, CustomerVisitStats
+from .signals import invalidate_customer_cache, publish_customer_event
+
+SHORT_WINDOW = timedelta(days=30)
+LONG_WINDOW = timedelta(days=90)
+
+
+def classify(visits_30d, visits_90d):
+    if visits_30d >= settings.CUSTOMER_FREQUENT_MIN_VISITS_30D:
+        return 'FREQUENT'
+    if visits_90d >= settings.CUSTOMER_REGULAR_MIN_VISITS_90D:
+        return 'REGULAR'
+    return 'OCCASIONAL'
+
+
+def _count_between(customer_id, start, end, exclude_pk=None):
+    """Visits with start < visited_at <= end, other than ``exclude_pk``."""
+    if end <= start:
+        return 0
+    return CustomerVisit.objects.filter(
+        customer_id=customer_id, visited_at__gt=start, visited_at__lte=end
+    ).exclude(pk=exclude_pk).count()
+
+
+def roll_forward(stats, now, exclude_pk=None):
+    """Move the windows of ``stats`` from ``stats.as_of`` to ``now``.
+
+    Only visits that left a window since the last update are counted, so the
+    cost is proportional to those visits, not to the customer's history.
+    ``exclude_pk`` names a visit stored since ``stats.as_of`` and not counted
+    yet, which therefore cannot leave a window.
+    """
+    if now <= stats.as_of:
+        return
+    stats.visits_30d -= _count_between(
+        stats.customer_id, stats.as_of - SHORT_WINDOW, now - SHORT_WINDOW, exclude_pk
+    )
+    stats.visits_90d -= _count_between(
+        stats.customer_id, stats.as_of - LONG_WINDOW, now - LONG_WINDOW, exclude_pk
+    )
+    stats.as_of = now
+
+
+def expired_customers(now):
+    """Ids of customers with a visit that left a window since their stats were counted.
+
+    Only these can drop to a lower class without a new visit. The oldest
+    ``as_of`` bounds the range with a constant, so the ``visited_at`` index
+    limits the scan to visits that can have left a window.
+    """
+    oldest = CustomerVisitStats.objects.aggregate(oldest=Min('as_of'))['oldest']
+    if oldest is None:
+        return CustomerVisit.objects.none().values_list('customer_id', flat=True)
+    stats_as_of = F('customer__visit_stats__as_of')
+    left_window = (
+        Q(visited_at__gt=stats_as_of - SHORT_WINDOW, visited_at__lte=now - SHORT_WINDOW)
+        | Q(visited_at__gt=stats_as_of - LONG_WINDOW, visited_at__lte=now - LONG_WINDOW)
+    )
+    return CustomerVisit.objects.filter(
+        left_window, visited_at__gt=oldest - LONG_WINDOW, visited_at__lte=now - SHORT_WINDOW
+    ).order_by().values_list('customer_id', flat=True).distinct()
+
+
+def expire_windows(now=None):
+    """Roll the stats of customers whose windows expired forward to ``now``.
+
+    ``apply_visit`` only moves a customer's windows when a visit arrives, so a
+    customer who stops coming would keep their class; run this periodically
+    (``manage.py expire_customer_frequency``) to let classes decay. Returns the
+    number of customers rolled forward.
+    """
+    now = now or timezone.now()
+    customer_ids = sorted(expired_customers(now))
+    for customer_id in customer_ids:
+        # Locked like apply_visit, one customer per transaction.
+        with transaction.atomic():
+            old = Customer.objects.all_objects().select_for_update().filter(
+                pk=customer_id
+            ).values_list('frecuency', flat=True).first()
+            stats = CustomerVisitStats.objects.filter(customer_id=customer_id).first()
+            if old is None or stats is None:
+                continue
+            roll_forward(stats, now)
+            stats.save()
+            update_frequency(customer_id, old, classify(stats.visits_30d, stats.visits_90d))
+    return len(customer_ids)
+
+
+def apply_visit(visit):
+    """Update the rolling counters and the frequency class for a new visit."""
+    now = timezone.now()
+    visited_at = min(visit.visited_at, now)
+
+    with transaction.atomic():
+        # Locking the customer row serializes concurrent visits of one customer.
+        old = Customer.objects.all_objects().select_for_update().filter(
+            pk=visit.customer_id
+        ).values_list('frecuency', flat=True).first()
+        if old is None:
+            return
+        stats = CustomerVisitStats.objects.filter(customer_id=visit.customer_id).first()
+        if stats is None:
+            # The visit is already stored, so a fresh count includes it.
+            stats = build_stats(visit.customer_id, now)
+            stats.save()
+        else:
+            # The new visit is already stored; it is added below, never subtracted.
+            roll_forward(stats, now, exclude_pk=visit.pk)
+            if visited_at > now - SHORT_WINDOW:
+                stats.visits_30d += 1
+            if visited_at > now - LONG_WINDOW:
+                stats.visits_90d += 1
+            if stats.last_visit_at is None or visited_at > stats.last_visit_at:
+                stats.last_visit_at = visited_at
+            stats.save()
+
+        update_frequency(visit.customer_id, old, classify(stats.visits_30d, stats.visits_90d))
+
+
+def build_stats(customer_id, now):
+    counts = CustomerVisit.objects.filter(customer_id=customer_id, visited_at__lte=now).aggregate(
+        visits_30d=Count('id', filter=Q(visited_at__gt=now - SHORT_WINDOW)),
+        visits_90d=Count('id', filter=Q(visited_at__gt=now - LONG_WINDOW)),
+        last_visit_at=Max('visited_at'),
+    )
+    return CustomerVisitStats(customer_id=customer_id, as_of=now, **counts)
+
+
+def update_frequency(customer_id, old, frecuency):
+    if old == frecuency:
+        return
+    Customer.objects.all_objects().filter(pk=customer_id).update(
+        frecuency=frecuency, updated_at=timezone.now()
+    )
+    invalidate_customer_cache(customer_id)
+    publish_customer_event('updated', customer_id)
+    audit.record_many(Customer, [customer_id], 'updated', changes={'frecuency': [old, frecuency]})
+
+
+def recompute_range(first_id, last_id, now=None):
+    """Rebuild stats and frequency for customers with first_id <= pk <= last_id.
+
+    Counts come from one grouped query over the long window; the resulting
+    classes are written with one UPDATE per class. Returns the number of
+    customers processed.
+    """
+    now = now or timezone.now()
+    customers = Customer.objects.all_objects().filter(pk__gte=first_id, pk__lte=last_id)
+    current = dict(customers.values_list('pk', 'frecuency'))
+    if not current:
+        return 0
+
+    counts = {
+        row['customer_id']: row
+        for row in CustomerVisit.objects.filter(
+            customer_id__gte=first_id, customer_id__lte=last_id,
+            visited_at__gt=now - LONG_WINDOW, visited_at__lte=now,
+        ).values('customer_id').annotate(
+            visits_30d=Count('id', filter=Q(visited_at__gt=now - SHORT_WINDOW)),
+            visits_90d=Count('id'),
+            last_visit_at=Max('visited_at'),
+        )
+    }
+
+    stats = []
+    changed = {}
+    for pk, old in current.items():
+        row = counts.get(pk, {})
+        visits_30d = row.get('visits_30d', 0)
+        visits_90d = row.get('visits_90d', 0)
+        stats.append(CustomerVisitStats(
+            customer_id=pk, visits_30d=visits_30d, visits_90d=visits_90d,
+            last_visit_at=row.get('last_visit_at'), as_of=now,
+        ))
+        frecuency = classify(visits_30d, visits_90d)
+        if frecuency != old:
+            changed.setdefault(frecuency, []).append(pk)
+
+    with transaction.atomic():
+        CustomerVisitStats.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=['visits_30d', 'visits_90d', 'last_visit_at', 'as_of'],
+        )
+        for frecuency, pks in changed.items():
+            Customer.objects.all_objects().filter(pk__in=pks).update(
+                frecuency=frecuency, updated_at=now
+            )
+
+    changed_pks = [pk for pks in changed.values() for pk in pks]
+    if changed_pks:
+        invalidate_customer_cache(*changed_pks)
+        # One event for the whole chunk; clients reload through the sync feed.
+        realtime.publish('customers', 'recomputed', {'count': len(changed_pks)})
+    return len(current)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from CLIENTS.frequency import expire_windows
+
+
+class Command(BaseCommand):
+    help = (
+        'Roll the visit counters of customers with visits older than the 30 and '
+        '90 day windows forward, so their frequency class decays without a new '
+        'visit. Schedule it at least daily.'
+    )
+
+    def handle(self, *args, **options):
+        rolled = expire_windows()
+        self.stdout.write(f'Customers rolled forward: {rolled}')
+        self.stdout.write(self.style.SUCCESS('Frequency windows expired.'))
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from CLIENTS.duplicates import find_clusters, save_report, signature_chunk, signature_range
+from CLIENTS.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        'Cluster customers whose normalized descriptions are near duplicates, using '
+        'MinHash signatures of character trigrams and banded candidate generation, '
+        'and store the report served by /customers/duplicates/.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float, default=settings.CUSTOMER_DUPLICATE_THRESHOLD,
+            help='Minimum trigram Jaccard similarity of a duplicate pair.'
+        )
+        parser.add_argument(
+            '--hashes', type=int, default=settings.CUSTOMER_DUPLICATE_HASHES,
+            help='MinHash values per customer.'
+        )
+        parser.add_argument(
+            '--bands', type=int, default=settings.CUSTOMER_DUPLICATE_BANDS,
+            help='Signature bands; more bands find less similar pairs.'
+        )
+        parser.add_argument(
+            '--max-bucket', type=int, default=settings.CUSTOMER_DUPLICATE_MAX_BUCKET,
+            help='Bucket size above which only neighbouring descriptions are compared.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20000,
+            help='Customer primary keys per chunk.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes computing signatures and comparing pairs (1 runs in this process).'
+        )
+
+    def handle(self, *args, **options):
+        if options['hashes'] % options['bands']:
+            raise CommandError('--hashes must be a multiple of --bands.')
+
+        bounds = Customer.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            save_report([], 0, 0)
+            self.stdout.write('No customers to compare.')
+            return
+
+        chunk_size = options['chunk_size']
+        chunks = [
+            (start, min(start + chunk_size - 1, bounds['last']), options['hashes'])
+            for start in range(bounds['first'], bounds['last'] + 1, chunk_size)
+        ]
+
+        started = time.monotonic()
+        if options['workers'] > 1:
+            # Connections must not be shared with forked children.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'], mp_context=get_context('fork')) as executor:
+                rows = [row for chunk in executor.map(signature_chunk, chunks) for row in chunk]
+        else:
+            rows = [row for chunk in chunks for row in signature_range(*chunk)]
+        signed = time.monotonic() - started
+
+        clusters, candidates = find_clusters(
+            rows, options['threshold'], options['bands'], options['max_bucket'], options['workers']
+        )
+        save_report(clusters, len(rows), candidates)
+        seconds = time.monotonic() - started
+
+        duplicates = sum(len(cluster['ids']) for cluster in clusters)
+        self.stdout.write(
+            f'Customers: {len(rows)} signed in {signed:.2f}s; {candidates} candidate pair(s), '
+            f'{len(clusters)} cluster(s) covering {duplicates} customer(s), {seconds:.2f}s total'
+        )
+        self.stdout.write(self.style.SUCCESS('Duplicate detection completed.'))
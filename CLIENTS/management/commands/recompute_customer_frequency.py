@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from CLIENTS.frequency import recompute_range
+from CLIENTS.models import Customer
+
+
+def _recompute_chunk(bounds):
+    # Each worker opens its own connections; the forked parent ones are closed.
+    try:
+        return recompute_range(*bounds)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the rolling visit counters and the frequency class of every '
+        'customer, in primary key chunks processed by parallel workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Customer primary keys per chunk.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes (1 runs in this process).'
+        )
+
+    def handle(self, *args, **options):
+        bounds = Customer.objects.all_objects().aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write('No customers to recompute.')
+            return
+
+        chunk_size = options['chunk_size']
+        chunks = [
+            (start, min(start + chunk_size - 1, bounds['last']))
+            for start in range(bounds['first'], bounds['last'] + 1, chunk_size)
+        ]
+
+        started = time.monotonic()
+        if options['workers'] > 1:
+            # Connections must not be shared with forked children.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'], mp_context=get_context('fork')) as executor:
+                processed = sum(executor.map(_recompute_chunk, chunks))
+        else:
+            processed = sum(recompute_range(*chunk) for chunk in chunks)
+        seconds = time.monotonic() - started
+
+        rate = processed / seconds if seconds else 0.0
+        self.stdout.write(
+            f'Customers: {processed} in {len(chunks)} chunk(s), {seconds:.2f}s ({rate:.1f} rows/s)'
+        )
+        self.stdout.write(self.style.SUCCESS('Frequency recompute completed.'))
@@ -1,5 +1,6 @@
 # CLIENTS/models.py
 from django.db import models
+from django.utils import timezone
 from core.models import BaseModel, BaseManager
 
 class CustomerCustomManager(BaseManager):
@@ -45,4 +46,50 @@ class Customer(BaseModel):
             models.Index(fields=['description']),
             models.Index(fields=['frecuency']),
             models.Index(fields=['deleted_at']),
-        ]
\ No newline at end of file
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
+class CustomerVisit(models.Model):
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name='visits',
+        verbose_name="Customer"
+    )
+    visited_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Visited At"
+    )
+
+    def __str__(self):
+        return f"{self.customer_id} @ {self.visited_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = "Customer Visit"
+        verbose_name_plural = "Customer Visits"
+        ordering = ['-visited_at']
+        indexes = [
+            models.Index(fields=['customer', 'visited_at']),
+            models.Index(fields=['visited_at']),
+        ]
+
+
+class CustomerVisitStats(models.Model):
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='visit_stats',
+        verbose_name="Customer"
+    )
+    visits_30d = models.PositiveIntegerField(default=0, verbose_name="Visits (30 days)")
+    visits_90d = models.PositiveIntegerField(default=0, verbose_name="Visits (90 days)")
+    last_visit_at = models.DateTimeField(null=True, blank=True, verbose_name="Last Visit")
+    as_of = models.DateTimeField(verbose_name="Counted As Of")
+
+    def __str__(self):
+        return f"{self.customer_id}: {self.visits_30d}/30d, {self.visits_90d}/90d"
+
+    class Meta:
+        verbose_name = "Customer Visit Stats"
+        verbose_name_plural = "Customer Visit Stats"
@@ -1,34 +1,77 @@
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
 import logging
 
-from .models import Customer
+from core import audit, realtime
+from core.signals import bulk_hard_deleted, bulk_restored, bulk_soft_deleted
+from . import autocomplete
+from .models import Customer, CustomerVisit
 
 logger = logging.getLogger(__name__)
 
 
+def invalidate_customer_cache(*pks):
+    cache_keys = [
+        'customer_list',
+        'customer_statistics',
+        'frequent_customers'
+    ] + [f'customer_{pk}' for pk in pks]
+    cache.delete_many(cache_keys)
+
+
+def customer_statistics(queryset=None):
+    queryset = Customer.objects.all() if queryset is None else queryset
+    return queryset.aggregate(
+        total_customers=Count('id'),
+        frequent_customers=Count('id', filter=Q(frecuency='FREQUENT')),
+        regular_customers=Count('id', filter=Q(frecuency='REGULAR')),
+        occasional_customers=Count('id', filter=Q(frecuency='OCCASIONAL')),
+        customers_with_preferences=Count(
+            'id', filter=Q(preferences__isnull=False) & ~Q(preferences='')
+        ),
+    )
+
+
+realtime.hub.register_snapshot('statistics', customer_statistics, sources=['customers'])
+
+
+def record_autocomplete_changes(*pks, removed=False):
+    def record():
+        for pk in pks:
+            autocomplete.record_change(pk, None, known=removed)
+
+    transaction.on_commit(record)
+
+
+def publish_customer_event(event, *pks):
+    for pk in pks:
+        realtime.publish('customers', event, {'id': pk})
+
+
 @receiver(pre_save, sender=Customer)
 def customer_pre_save(sender, instance, **kwargs):
     if instance.description:
         instance.description = instance.description.strip().title()
 
+    # Reset on every save so a stale diff from an earlier save is never reused.
+    instance._audit_changes = None
     if instance.pk:
         try:
-            old_instance = Customer.objects.get(pk=instance.pk)
-            changes = []
+            # Soft-deleted rows too, so restoring one records the deleted_at change.
+            old_instance = Customer.objects.all_objects().get(pk=instance.pk)
+            changes = {}
 
             fields_to_track = ['description', 'frecuency', 'deleted_at']
             for field in fields_to_track:
                 old_value = getattr(old_instance, field)
                 new_value = getattr(instance, field)
                 if old_value != new_value:
-                    changes.append(f'{field}: {old_value} → {new_value}')
+                    changes[field] = [old_value, new_value]
 
-            if changes:
-                logger.info(
-                    f'Customer {instance.pk} changes: {", ".join(changes)}'
-                )
+            instance._audit_changes = changes
 
         except Customer.DoesNotExist:
             pass
@@ -36,15 +79,21 @@ def customer_pre_save(sender, instance, **kwargs):
 
 @receiver(post_save, sender=Customer)
 def customer_post_save(sender, instance, created, **kwargs):
-    cache_keys = [
-        'customer_list',
-        f'customer_{instance.pk}',
-        'customer_statistics',
-        'frequent_customers'
-    ]
-    cache.delete_many(cache_keys)
+    invalidate_customer_cache(instance.pk)
 
     action = 'created' if created else 'updated'
+    audit.record(instance, action, changes=getattr(instance, '_audit_changes', None))
+    if created or {'description', 'deleted_at'} & set(getattr(instance, '_audit_changes', None) or {}):
+        description = instance.description if instance.deleted_at is None else None
+        transaction.on_commit(
+            lambda: autocomplete.record_change(instance.pk, description, known=True)
+        )
+    realtime.publish('customers', action, {
+        'id': instance.pk,
+        'frecuency': instance.frecuency,
+        'updated_at': instance.updated_at,
+        'deleted_at': instance.deleted_at,
+    })
     logger.info(f'Customer {instance.pk} ({instance.description}) {action}')
 
     if created:
@@ -53,12 +102,39 @@ def customer_post_save(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=Customer)
 def customer_post_delete(sender, instance, **kwargs):
-    cache_keys = [
-        'customer_list',
-        f'customer_{instance.pk}',
-        'customer_statistics',
-        'frequent_customers'
-    ]
-    cache.delete_many(cache_keys)
+    invalidate_customer_cache(instance.pk)
+    audit.record(instance, 'deleted')
+    record_autocomplete_changes(instance.pk, removed=True)
+    publish_customer_event('deleted', instance.pk)
+
+    logger.info(f'Customer {instance.pk} ({instance.description}) deleted')
 
-    logger.info(f'Customer {instance.pk} ({instance.description}) deleted')
\ No newline at end of file
+
+@receiver(bulk_soft_deleted, sender=Customer)
+def customers_bulk_soft_deleted(sender, pks, **kwargs):
+    invalidate_customer_cache(*pks)
+    audit.record_many(sender, pks, 'deleted')
+    record_autocomplete_changes(*pks, removed=True)
+    publish_customer_event('deleted', *pks)
+
+
+@receiver(bulk_restored, sender=Customer)
+def customers_bulk_restored(sender, pks, **kwargs):
+    invalidate_customer_cache(*pks)
+    audit.record_many(sender, pks, 'restored')
+    record_autocomplete_changes(*pks)
+    publish_customer_event('restored', *pks)
+
+
+@receiver(bulk_hard_deleted, sender=Customer)
+def customers_bulk_hard_deleted(sender, pks, **kwargs):
+    invalidate_customer_cache(*pks)
+    record_autocomplete_changes(*pks, removed=True)
+    publish_customer_event('deleted', *pks)
+
+
+@receiver(post_save, sender=CustomerVisit)
+def customer_visit_post_save(sender, instance, created, **kwargs):
+    if created:
+        from .frequency import apply_visit
+        apply_visit(instance)
@@ -1,3 +1,302 @@
-from django.test import TestCase
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, modify_settings, override_settings
+
+from core import realtime
+
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'clients-tests'},
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES, AUDIT_LOG_ASYNC=False)
+class ClientsTestCase(TransactionTestCase):
+    """Runs with the CLIENTS app and its tables, installing them when the project does not.
+
+    CLIENTS modules import its models, so tests import them inside the test
+    methods, once the app is registered.
+    """
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        if apps.is_installed('CLIENTS'):
+            return
+        installed = modify_settings(INSTALLED_APPS={'append': 'CLIENTS'})
+        installed.enable()
+        self.addCleanup(installed.disable)
+        # Importing CLIENTS.signals registers a realtime snapshot for the rest of the run.
+        snapshots = mock.patch.dict(realtime.hub._snapshots)
+        snapshots.start()
+        self.addCleanup(snapshots.stop)
+
+        models = list(apps.get_app_config('CLIENTS').get_models())
+        with connection.schema_editor() as editor:
+            for model in models:
+                editor.create_model(model)
+
+        def drop_tables():
+            with connection.schema_editor() as editor:
+                for model in reversed(models):
+                    editor.delete_model(model)
+
+        self.addCleanup(drop_tables)
+
+
+class DuplicateDetectionTests(ClientsTestCase):
+    def _rows(self, descriptions):
+        from CLIENTS.duplicates import Signer, normalize
+
+        signer = Signer(64)
+        return [
+            (pk, normalize(description), signer(normalize(description)))
+            for pk, description in descriptions.items()
+        ]
+
+    def test_clusters_keep_every_member(self):
+        from CLIENTS.duplicates import _Clusters
+
+        pair = _Clusters()
+        pair.union(1, 2)
+        self.assertEqual(pair.groups(), [[1, 2]])
+
+        chain = _Clusters()
+        chain.union(1, 2)
+        chain.union(2, 3)
+        self.assertEqual(chain.groups(), [[1, 2, 3]])
+
+        merged = _Clusters()
+        merged.union(5, 9)
+        merged.union(2, 7)
+        merged.union(9, 7)
+        self.assertEqual(merged.groups(), [[2, 5, 7, 9]])
+
+    def test_accent_variants_form_a_cluster(self):
+        from CLIENTS.duplicates import find_clusters
+
+        rows = self._rows({1: 'Juan Perez', 2: 'Juan Pérez', 3: 'Maria Lopez'})
+
+        clusters, candidates = find_clusters(rows, threshold=0.7, bands=16, max_bucket=50)
+
+        self.assertEqual(clusters, [{'ids': [1, 2], 'similarity': 1.0}])
+        self.assertGreaterEqual(candidates, 1)
+
+    def test_command_reports_every_duplicate(self):
+        from CLIENTS.duplicates import load_report
+        from CLIENTS.models import Customer
+
+        first = Customer.objects.create(description='Juan Perez')
+        second = Customer.objects.create(description='Juan Pérez')
+        third = Customer.objects.create(description='Juan  Perez')
+        Customer.objects.create(description='Maria Lopez')
+
+        out = io.StringIO()
+        call_command('find_duplicate_customers', stdout=out)
+
+        self.assertIn('1 cluster(s) covering 3 customer(s)', out.getvalue())
+        report = load_report()
+        self.assertEqual(
+            [customer['id'] for customer in report['clusters'][0]['customers']],
+            [first.pk, second.pk, third.pk],
+        )
+
+
+class AutocompleteTests(ClientsTestCase):
+    def setUp(self):
+        super().setUp()
+        from CLIENTS import autocomplete
+
+        fresh = mock.patch.object(autocomplete, 'index', autocomplete.DescriptionIndex())
+        fresh.start()
+        self.addCleanup(fresh.stop)
+
+    def test_changes_match_a_rebuild(self):
+        from CLIENTS.autocomplete import DescriptionIndex
+
+        rows = {pk: f'Customer {pk} Mesa {pk % 7}' for pk in range(1, 400)}
+        updated = DescriptionIndex()
+        updated.COMPACT_MIN = 16
+        updated.build(rows.items(), 0)
+        for pk in range(1, 400, 3):
+            rows[pk] = f'Renamed {pk}'
+            updated.apply(pk, rows[pk])
+        for pk in range(2, 400, 5):
+            del rows[pk]
+            updated.apply(pk, None)
+        updated.apply(500, 'Renamed newcomer')
+        rows[500] = 'Renamed newcomer'
+
+        rebuilt = DescriptionIndex()
+        rebuilt.build(rows.items(), 0)
+        for query in ('renamed', 'customer', 'mesa 3', 'renamed 10', 'newc'):
+            self.assertEqual(updated.search(query, 1000), rebuilt.search(query, 1000), query)
+
+    def test_pending_changes_are_searchable_before_compaction(self):
+        from CLIENTS.autocomplete import DescriptionIndex
+
+        index = DescriptionIndex()
+        index.build([(1, 'Juan Pérez'), (2, 'María López')], 0)
+        index.apply(3, 'Juana Gómez')
+        index.apply(1, 'Juan Ortiz')
+        index.apply(2, None)
+
+        self.assertEqual([row['id'] for row in index.search('juan', 10)], [1, 3])
+        self.assertEqual(index.search('perez', 10), [])
+        self.assertEqual(index.search('lopez', 10), [])
+        self.assertTrue(index._pending)
+
+    def test_search_follows_customer_changes(self):
+        from CLIENTS import autocomplete
+        from CLIENTS.models import Customer
+
+        Customer.objects.create(description='Juan Pérez')
+        self.assertEqual([row['description'] for row in autocomplete.search('per')], ['Juan Pérez'])
+
+        customer = Customer.objects.create(description='Pedro Páramo')
+        self.assertEqual([row['id'] for row in autocomplete.search('pedro')], [customer.pk])
+
+    def test_restore_is_audited_and_searchable(self):
+        from CLIENTS import autocomplete
+        from CLIENTS.models import Customer
+        from core.models import AuditLog
+
+        customer = Customer.objects.create(description='Juan Pérez')
+        customer.delete()
+        self.assertEqual(autocomplete.search('juan'), [])
+
+        restored = Customer.objects.all_objects().get(pk=customer.pk)
+        restored.restore()
+
+        self.assertEqual([row['id'] for row in autocomplete.search('juan')], [customer.pk])
+        entry = AuditLog.objects.for_object(customer).latest('created_at')
+        self.assertEqual(entry.action, 'updated')
+        self.assertEqual(entry.changes['deleted_at'][1], None)
+        self.assertIsNotNone(entry.changes['deleted_at'][0])
+
+    def test_version_survives_a_cache_flush(self):
+        from django.core.cache import cache
+
+        from CLIENTS import autocomplete
+        from CLIENTS.models import Customer
+
+        Customer.objects.create(description='Juan Pérez')
+        autocomplete.search('juan')
+        version = autocomplete.shared_version()
+        self.assertGreater(version, 0)
+
+        cache.clear()
+        self.assertEqual(autocomplete.shared_version(), version)
+
+        # Another worker publishes a change; this one's cached version is gone with the flush.
+        with mock.patch.object(autocomplete, 'index', autocomplete.DescriptionIndex()):
+            Customer.objects.create(description='Juana Gómez')
+        cache.clear()
+        self.assertEqual(autocomplete.shared_version(), version + 1)
+        self.assertEqual([row['description'] for row in autocomplete.search('juana')], ['Juana Gómez'])
+
+
+class FrequencyDecayTests(ClientsTestCase):
+    def test_classes_decay_without_new_visits(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from CLIENTS.frequency import expire_windows
+        from CLIENTS.models import Customer, CustomerVisit
+
+        now = timezone.now()
+        customer = Customer.objects.create(description='Juan Pérez')
+        for day in range(8):
+            CustomerVisit.objects.create(customer=customer, visited_at=now - timedelta(days=day + 1))
+        customer.refresh_from_db()
+        self.assertEqual(customer.frecuency, 'FREQUENT')
+
+        self.assertEqual(expire_windows(now), 0)
+
+        self.assertEqual(expire_windows(now + timedelta(days=31)), 1)
+        customer.refresh_from_db()
+        self.assertEqual(customer.frecuency, 'REGULAR')
+        self.assertEqual((customer.visit_stats.visits_30d, customer.visit_stats.visits_90d), (0, 8))
+
+        # Nothing else left a window since the last run.
+        self.assertEqual(expire_windows(now + timedelta(days=32)), 0)
+
+        expire_windows(now + timedelta(days=91))
+        customer.refresh_from_db()
+        self.assertEqual(customer.frecuency, 'OCCASIONAL')
+        self.assertEqual((customer.visit_stats.visits_30d, customer.visit_stats.visits_90d), (0, 0))
+
+    def test_backdated_visit_is_counted_once(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from CLIENTS.frequency import build_stats
+        from CLIENTS.models import Customer, CustomerVisit, CustomerVisitStats
+
+        now = timezone.now()
+        customer = Customer.objects.create(description='Juan Pérez')
+        CustomerVisit.objects.create(customer=customer, visited_at=now - timedelta(days=10))
+        # The stats were last rolled forward when that visit arrived.
+        CustomerVisitStats.objects.filter(customer=customer).update(as_of=now - timedelta(days=10))
+
+        # Between the last update's 30-day cutoff and today's.
+        CustomerVisit.objects.create(customer=customer, visited_at=now - timedelta(days=35))
+
+        stats = CustomerVisitStats.objects.get(customer=customer)
+        rebuilt = build_stats(customer.pk, stats.as_of)
+        self.assertEqual((stats.visits_30d, stats.visits_90d), (1, 2))
+        self.assertEqual((stats.visits_30d, stats.visits_90d), (rebuilt.visits_30d, rebuilt.visits_90d))
+
+    def test_command_expires_windows(self):
+        out = io.StringIO()
+        call_command('expire_customer_frequency', stdout=out)
+        self.assertIn('Customers rolled forward: 0', out.getvalue())
+
+
+class CustomerAdminTests(ClientsTestCase):
+    def _admin(self):
+        from django.contrib import admin
+
+        from CLIENTS.admin import CustomerAdmin
+        from CLIENTS.models import Customer
+
+        model_admin = CustomerAdmin(Customer, admin.site)
+        model_admin.message_user = mock.Mock()
+        return model_admin
+
+    def test_make_frequent_is_one_update_with_audit_entries(self):
+        from django.test import RequestFactory
+        from django.test.utils import CaptureQueriesContext
+
+        from CLIENTS.models import Customer
+        from core.models import AuditLog
+
+        customers = [
+            Customer.objects.create(description=f'Customer {index}', frecuency=frecuency)
+            for index, frecuency in enumerate(['OCCASIONAL', 'REGULAR', 'FREQUENT'])
+        ]
+        AuditLog.objects.all().delete()
+        queryset = Customer.objects.all_objects().filter(pk__in=[customer.pk for customer in customers])
+
+        with mock.patch('CLIENTS.admin.invalidate_customer_cache') as invalidate, \
+                CaptureQueriesContext(connection) as context:
+            self._admin().make_frequent(RequestFactory().post('/'), queryset)
+
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1, updates)
+        invalidate.assert_called_once_with(*[customer.pk for customer in customers])
+        self.assertEqual(set(queryset.values_list('frecuency', flat=True)), {'FREQUENT'})
+        changes = {
+            int(entry.object_pk): entry.changes
+            for entry in AuditLog.objects.filter(model_label='CLIENTS.Customer', action='updated')
+        }
+        self.assertEqual(changes, {
+            customers[0].pk: {'frecuency': ['OCCASIONAL', 'FREQUENT']},
+            customers[1].pk: {'frecuency': ['REGULAR', 'FREQUENT']},
+        })
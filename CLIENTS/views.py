@@ -4,12 +4,15 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
 from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.core.cache import cache
 
-from .models import Customer
+from core.sync import DeltaSyncMixin
+from . import autocomplete, duplicates
+from .models import Customer, CustomerVisit
 from .serializers import (
     CustomerListSerializer,
     CustomerDetailSerializer,
@@ -17,9 +20,10 @@ from .serializers import (
     CustomerUpdateSerializer
 )
 from .filters import CustomerFilter
+from .signals import customer_statistics
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     permission_classes = [IsAuthenticated]
     filter_backends = [
@@ -47,6 +51,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
             'update': CustomerUpdateSerializer,
             'partial_update': CustomerUpdateSerializer,
             'retrieve': CustomerDetailSerializer,
+            'sync': CustomerListSerializer,
         }
         return serializer_map.get(self.action, CustomerDetailSerializer)
 
@@ -95,6 +100,36 @@ class CustomerViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(customer)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'])
+    def visit(self, request, pk=None):
+        customer = self.get_object()
+        CustomerVisit.objects.create(customer=customer)  # Frequency is updated by the post_save signal
+
+        customer.refresh_from_db(fields=['frecuency', 'updated_at'])
+        serializer = self.get_serializer(customer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'limit': 'Must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.CUSTOMER_AUTOCOMPLETE_MAX_LIMIT))
+
+        return Response(autocomplete.search(request.query_params.get('q', ''), limit))
+
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        report = duplicates.load_report()
+        if report is None:
+            return Response(
+                {'detail': 'No duplicate report yet; run the find_duplicate_customers command.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(report)
+
     @action(detail=False, methods=['get'])
     def frequent_customers(self, request):
         frequent_customers = self.get_queryset().filter(
@@ -111,22 +146,6 @@ class CustomerViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        queryset = self.get_queryset()
-
-        stats = {
-            'total_customers': queryset.count(),
-            'frequent_customers': queryset.filter(
-                frecuency='FREQUENT'
-            ).count(),
-            'regular_customers': queryset.filter(
-                frecuency='REGULAR'
-            ).count(),
-            'occasional_customers': queryset.filter(
-                frecuency='OCCASIONAL'
-            ).count(),
-            'customers_with_preferences': queryset.exclude(
-                preferences__isnull=True
-            ).exclude(preferences__exact='').count(),
-        }
+        stats = customer_statistics(self.get_queryset())
 
         return Response(stats)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 from decouple import config
@@ -41,16 +42,22 @@ INSTALLED_APPS = [
 
 # M I D D L E W A R E
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.throttling.AuthLoadSheddingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'core.db_routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.slow_queries.SlowQueryMiddleware',
+    'core.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -90,6 +97,74 @@ else:
         }
     }
 
+# Read replicas: comma separated URLs, exposed as the aliases replica_0, replica_1, ...
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(config(
+    'DATABASE_REPLICA_URLS',
+    default='',
+    cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(replica_url)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=2, cast=float)
+REPLICA_CHECK_INTERVAL = config('REPLICA_CHECK_INTERVAL', default=5, cast=int)
+
+# C A C H E
+# Two tiers: a per-worker LRU in front of a shared cache. Writes are broadcast
+# through the invalidation channel so every worker evicts its local copy.
+# The default shared tier is a FileBasedCache: add() and incr() on it are a
+# read followed by a write, not atomic, and incr() resets the key's timeout.
+# Durable counters live in the database (core.counters) and rate-limit
+# counters in the 'throttle' cache; point CACHE_SHARED_BACKEND at Redis or
+# Memcached when running several hosts.
+# Past MAX_ENTRIES the file backend culls a third of its entries at random.
+CACHE_DIR = Path(config('CACHE_DIR', default=str(BASE_DIR / '.cache')))
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'LOCAL_MAX_ENTRIES': config('CACHE_LOCAL_MAX_ENTRIES', default=1000, cast=int),
+            'LOCAL_TIMEOUT': config('CACHE_LOCAL_TIMEOUT', default=30, cast=int),
+            'CHANNEL': 'core.cache.SQLiteInvalidationChannel',
+            'CHANNEL_OPTIONS': {
+                'path': str(CACHE_DIR / 'invalidation.sqlite3'),
+                'poll_interval': 0.1,
+            },
+            'NAMESPACES': {
+                'customer_list': 'customer_list',
+                'customer_statistics': 'customer_statistics',
+                'frequent_customers': 'frequent_customers',
+                'customer_autocomplete': 'customer_autocomplete',
+                'customer_duplicates': 'customer_duplicates',
+                'customer_': 'customer_detail',
+                'views.decorators.cache': 'page',
+            },
+        },
+    },
+    'shared': {
+        'BACKEND': config('CACHE_SHARED_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_SHARED_LOCATION', default=str(CACHE_DIR / 'shared')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_SHARED_MAX_ENTRIES', default=20000, cast=int),
+        },
+    },
+    # Auth throttle buckets and concurrency slots. The backend must make add()
+    # and incr() atomic: LocMemCache does within one process (limits are then
+    # per worker); Redis or Memcached share them across workers and hosts.
+    # FileBasedCache and DatabaseCache do not qualify.
+    'throttle': {
+        'BACKEND': config('CACHE_THROTTLE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_THROTTLE_LOCATION', default='throttle'),
+    },
+}
+
 # A U T H E N T I C A T I O N
 AUTH_USER_MODEL = 'AUTH.UserCustom'
 
@@ -132,15 +207,154 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
-WHITENOISE_USE_FINDERS = True
-WHITENOISE_AUTOREFRESH = True
+# Production serves manifest-hashed files pre-compressed (gzip and Brotli) at
+# collectstatic time; WhiteNoise marks hashed names as immutable and caches them
+# for ten years. Finders and autorefresh rescan on every request: DEBUG only.
+if DEBUG:
+    STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+else:
+    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+WHITENOISE_USE_FINDERS = DEBUG
+WHITENOISE_AUTOREFRESH = DEBUG
+WHITENOISE_MAX_AGE = 0 if DEBUG else 60 * 60
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# A D M I N
+# Changelists on tables larger than this use planner row estimates instead of COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=10000, cast=int)
+
+# R E T E N T I O N
+# Used by `manage.py purge_deleted` to archive soft-deleted rows and prune sessions/tokens
+RETENTION_DAYS = config('RETENTION_DAYS', default=90, cast=int)
+RETENTION_BATCH_SIZE = config('RETENTION_BATCH_SIZE', default=1000, cast=int)
+RETENTION_TOKEN_DAYS = config('RETENTION_TOKEN_DAYS', default=0, cast=int)
+
+# D E L T A   S Y N C
+# Sync cursors stop short of rows updated in the last SETTLE seconds, which must exceed
+# the longest write transaction (and clock skew between app servers); cursors older
+# than RETENTION_DAYS get 410 Gone because the tombstones they need were purged
+SYNC_SETTLE_SECONDS = config('SYNC_SETTLE_SECONDS', default=5, cast=int)
+
+# A U D I T   L O G
+# Entries are queued in-process and written by a background thread in batches; a batch
+# the database rejects is retried WRITE_ATTEMPTS times, then dropped and logged
+AUDIT_LOG_ASYNC = config('AUDIT_LOG_ASYNC', default=True, cast=bool)
+AUDIT_LOG_BATCH_SIZE = config('AUDIT_LOG_BATCH_SIZE', default=200, cast=int)
+AUDIT_LOG_FLUSH_INTERVAL_MS = config('AUDIT_LOG_FLUSH_INTERVAL_MS', default=500, cast=int)
+AUDIT_LOG_QUEUE_SIZE = config('AUDIT_LOG_QUEUE_SIZE', default=10000, cast=int)
+AUDIT_LOG_ENQUEUE_TIMEOUT = config('AUDIT_LOG_ENQUEUE_TIMEOUT', default=0.05, cast=float)
+AUDIT_LOG_WRITE_ATTEMPTS = config('AUDIT_LOG_WRITE_ATTEMPTS', default=3, cast=int)
+AUDIT_LOG_RETRY_DELAY_MS = 100
+
+# R E A L T I M E
+# WebSocket push on the ASGI app. LocalBroker fans out within one process;
+# SQLiteBroker shares events between the workers of one host.
+REALTIME_PATH = '/ws/events/'
+REALTIME_BROKER = config('REALTIME_BROKER', default='core.realtime.LocalBroker')
+REALTIME_BROKER_OPTIONS = (
+    {'path': str(CACHE_DIR / 'realtime.sqlite3')}
+    if REALTIME_BROKER == 'core.realtime.SQLiteBroker' else {}
+)
+REALTIME_TOPICS = {
+    'customers': (),
+    'statistics': (),
+    'users': ('admin', 'root'),
+}
+REALTIME_SNAPSHOT_INTERVAL = config('REALTIME_SNAPSHOT_INTERVAL', default=1.0, cast=float)
+REALTIME_QUEUE_SIZE = config('REALTIME_QUEUE_SIZE', default=100, cast=int)
+
+# P R O F I L I N G
+# Admins profile a request with the X-Profile: 1 header or ?profile=1. Sample
+# rates map URL names (or '*') to a fraction of traffic, e.g. {"users-list": 0.01}
+PROFILING_DIR = Path(config('PROFILING_DIR', default=str(BASE_DIR / '.profiles')))
+PROFILING_INTERVAL = config('PROFILING_INTERVAL', default=0.005, cast=float)
+PROFILING_SAMPLE_RATES = config('PROFILING_SAMPLE_RATES', default='{}', cast=json.loads)
+# Profiles and their .folded files older than this are removed by purge_deleted
+PROFILING_RETENTION_DAYS = config('PROFILING_RETENTION_DAYS', default=14, cast=int)
+
+# S L O W   Q U E R I E S
+# Statements slower than the threshold are kept in a per-process ring buffer and
+# aggregated by fingerprint in core.SlowQuery, with an EXPLAIN plan refreshed at
+# most once per SLOW_QUERY_EXPLAIN_INTERVAL seconds
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_ASYNC = config('SLOW_QUERY_ASYNC', default=True, cast=bool)
+SLOW_QUERY_BUFFER_SIZE = config('SLOW_QUERY_BUFFER_SIZE', default=500, cast=int)
+SLOW_QUERY_QUEUE_SIZE = config('SLOW_QUERY_QUEUE_SIZE', default=1000, cast=int)
+SLOW_QUERY_SAMPLE_SIZE = config('SLOW_QUERY_SAMPLE_SIZE', default=200, cast=int)
+SLOW_QUERY_STACK_DEPTH = config('SLOW_QUERY_STACK_DEPTH', default=15, cast=int)
+SLOW_QUERY_EXPLAIN = config('SLOW_QUERY_EXPLAIN', default=True, cast=bool)
+SLOW_QUERY_EXPLAIN_INTERVAL = config('SLOW_QUERY_EXPLAIN_INTERVAL', default=3600, cast=int)
+
+# M E T R I C S
+# Prometheus text format on /metrics. Each worker writes its counters to
+# METRICS_DIR (exited workers are folded into one file), which should be emptied
+# on deploy. Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a
+# token the endpoint only answers when DEBUG is on
+METRICS_DIR = Path(config('METRICS_DIR', default=str(CACHE_DIR / 'metrics')))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1.0, cast=float)
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_WORKER_THREADS = config('METRICS_WORKER_THREADS', default=1, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_OVERHEAD_BUDGET_US = config('METRICS_OVERHEAD_BUDGET_US', default=50, cast=float)
+
+# T A S K S
+# Background tasks are rows in core.Task run by `manage.py run_tasks`; failed tasks are
+# retried with exponential backoff from TASKS_BACKOFF_BASE up to TASKS_BACKOFF_MAX seconds.
+# Workers refresh the locks of running tasks; a lock older than TASKS_LOCK_TIMEOUT means
+# the worker died and the task is run again, so tasks must be safe to repeat
+TASKS_ALWAYS_EAGER = config('TASKS_ALWAYS_EAGER', default=False, cast=bool)
+TASKS_CONCURRENCY = config('TASKS_CONCURRENCY', default=8, cast=int)
+TASKS_POLL_INTERVAL = config('TASKS_POLL_INTERVAL', default=1.0, cast=float)
+TASKS_MAX_ATTEMPTS = config('TASKS_MAX_ATTEMPTS', default=5, cast=int)
+TASKS_BACKOFF_BASE = 10
+TASKS_BACKOFF_MAX = 3600
+TASKS_LOCK_TIMEOUT = config('TASKS_LOCK_TIMEOUT', default=600, cast=int)
+TASKS_RETENTION_DAYS = config('TASKS_RETENTION_DAYS', default=7, cast=int)
+
+# O U T B O U N D   H T T P
+# Social login talks to Google and GitHub through one keep-alive pool per process;
+# JSON such as Google's signing certificates is cached for its Cache-Control max-age
+OUTBOUND_HTTP_CONNECT_TIMEOUT = config('OUTBOUND_HTTP_CONNECT_TIMEOUT', default=3.05, cast=float)
+OUTBOUND_HTTP_READ_TIMEOUT = config('OUTBOUND_HTTP_READ_TIMEOUT', default=10.0, cast=float)
+OUTBOUND_HTTP_POOL_SIZE = config('OUTBOUND_HTTP_POOL_SIZE', default=10, cast=int)
+OUTBOUND_HTTP_CACHE_TIMEOUT = 3600
+
+# B A T C H
+# /api/batch/ runs up to BATCH_MAX_REQUESTS API calls under one authentication;
+# consecutive GETs are dispatched on BATCH_CONCURRENCY threads per process
+BATCH_MAX_REQUESTS = config('BATCH_MAX_REQUESTS', default=20, cast=int)
+BATCH_CONCURRENCY = config('BATCH_CONCURRENCY', default=4, cast=int)
+BATCH_ALLOWED_PREFIXES = ['/api/']
+# Besides AUTH_SHED_PATHS: credential and session endpoints stay unbatched
+BATCH_EXCLUDED_PATHS = ['/api/auth/logout/', '/api/auth/password/']
+
+# C U S T O M E R   F R E Q U E N C Y
+# Thresholds used to classify customers from their rolling visit counts
+CUSTOMER_FREQUENT_MIN_VISITS_30D = config('CUSTOMER_FREQUENT_MIN_VISITS_30D', default=8, cast=int)
+CUSTOMER_REGULAR_MIN_VISITS_90D = config('CUSTOMER_REGULAR_MIN_VISITS_90D', default=4, cast=int)
+
+# C U S T O M E R   A U T O C O M P L E T E
+# Each worker keeps an in-memory prefix index of active customer descriptions and
+# replays up to MAX_REPLAY changes from the cache before falling back to a rebuild
+CUSTOMER_AUTOCOMPLETE_MAX_REPLAY = config('CUSTOMER_AUTOCOMPLETE_MAX_REPLAY', default=500, cast=int)
+CUSTOMER_AUTOCOMPLETE_CHANGE_TIMEOUT = config('CUSTOMER_AUTOCOMPLETE_CHANGE_TIMEOUT', default=3600, cast=int)
+CUSTOMER_AUTOCOMPLETE_VERSION_TIMEOUT = 5
+CUSTOMER_AUTOCOMPLETE_MAX_SCAN = 2000
+CUSTOMER_AUTOCOMPLETE_MAX_LIMIT = 50
+
+# C U S T O M E R   D U P L I C A T E S
+# find_duplicate_customers compares customers whose MinHash signatures share a band;
+# with 64 hashes in 16 bands, a pair at 0.7 trigram similarity is found 99% of the time
+CUSTOMER_DUPLICATE_THRESHOLD = config('CUSTOMER_DUPLICATE_THRESHOLD', default=0.7, cast=float)
+CUSTOMER_DUPLICATE_HASHES = 64
+CUSTOMER_DUPLICATE_BANDS = 16
+CUSTOMER_DUPLICATE_MAX_BUCKET = 50
+CUSTOMER_DUPLICATE_REPORT_TIMEOUT = None
+
 # C O R S
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
@@ -149,6 +363,21 @@ CORS_ALLOWED_ORIGINS = config(
 )
 CORS_ALLOW_CREDENTIALS = True
 
+# C O M P R E S S I O N
+# Responses that carry auth tokens are excluded to avoid BREACH length oracles: the auth
+# endpoints, /api/batch/ (which can wrap them) and any response that sets a cookie
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=5, cast=int)
+COMPRESSION_MAX_RANDOM_BYTES = 100
+COMPRESSION_CONTENT_TYPES = [
+    'application/json', 'text/', 'application/javascript', 'application/vnd.oai.openapi',
+]
+COMPRESSION_EXCLUDE_PATHS = [
+    '/api/auth/login/', '/api/auth/registration/', '/api/auth/social/',
+    '/api/auth/password/', '/api/auth/user/', '/api/batch/',
+]
+
 # R E S T   F R A M E W O R K
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -158,14 +387,40 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
         #'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Proxies in front of the app that append to X-Forwarded-For; with 0 the
+    # throttles key on REMOTE_ADDR, which a client cannot spoof.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': config('THROTTLE_AUTH_IP_RATE', default='30/min'),
+        'auth_username': config('THROTTLE_AUTH_USERNAME_RATE', default='5/min'),
+    },
 }
 
+# T H R O T T L I N G
+# Auth throttles and the auth concurrency limiter keep their counters and slot
+# leases in the cache below, never in the primary database
+THROTTLE_CACHE_ALIAS = 'throttle'
+AUTH_SHED_PATHS = ['/api/auth/login/', '/api/auth/registration/', '/api/auth/social/']
+AUTH_CONCURRENCY_LIMIT = config('AUTH_CONCURRENCY_LIMIT', default=4, cast=int)
+AUTH_CONCURRENCY_LEASE = config('AUTH_CONCURRENCY_LEASE', default=30, cast=int)
+AUTH_SHED_RETRY_AFTER = config('AUTH_SHED_RETRY_AFTER', default=1, cast=int)
+
 # D J - R E S T - A U T H
 REST_AUTH = {
     'REGISTER_SERIALIZER': 'AUTH.serializers.CustomRegisterSerializer',
     'USER_DETAILS_SERIALIZER': 'AUTH.serializers.UserCustomSerializer',
     'TOKEN_MODEL': 'rest_framework.authtoken.models.Token',
+    'TOKEN_CREATOR': 'AUTH.serializers.create_token',
     'SESSION_LOGIN': False,
     'USE_JWT': False,
 }
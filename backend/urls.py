@@ -4,11 +4,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import HttpResponse
+from core.batch import BatchView
+from core.metrics import metrics_view
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
     path('api/', include('AUTH.urls')),
     #path('api/', include('CLIENTS.urls')),
     # Rutas de callback de allauth (proveedores sociales)
@@ -0,0 +1,144 @@
+import os
+
+from django.conf import settings
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from .models import ArchivedRecord, AuditLog, RequestProfile, SlowQuery, Task
+
+
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'model_label', 'object_pk', 'action', 'actor')
+    list_filter = ('action', 'model_label', 'created_at')
+    search_fields = ('object_pk',)
+    date_hierarchy = 'created_at'
+    list_select_related = ('actor',)
+    readonly_fields = ('model_label', 'object_pk', 'action', 'changes', 'actor', 'created_at')
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedRecord)
+class ArchivedRecordAdmin(admin.ModelAdmin):
+    list_display = ('model_label', 'object_pk', 'deleted_at', 'archived_at')
+    list_filter = ('model_label', 'archived_at')
+    search_fields = ('object_pk',)
+    readonly_fields = ('model_label', 'object_pk', 'payload', 'deleted_at', 'archived_at')
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'view_name', 'method', 'status_code', 'duration_ms',
+        'query_count', 'sample_count', 'trigger', 'user', 'download',
+    )
+    list_filter = ('trigger', 'method', 'created_at')
+    search_fields = ('view_name', 'path')
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    readonly_fields = (
+        'view_name', 'method', 'path', 'status_code', 'duration_ms', 'query_count',
+        'sample_count', 'trigger', 'file_name', 'user', 'created_at',
+    )
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download(self, obj):
+        url = reverse('admin:core_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">Folded stacks</a>', url)
+    download.short_description = 'Flamegraph'
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise Http404
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        file_path = os.path.join(settings.PROFILING_DIR, os.path.basename(profile.file_name))
+        if not os.path.exists(file_path):
+            raise Http404('Profile file no longer exists.')
+        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=profile.file_name)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'short_statement', 'origin', 'count', 'p50_ms', 'p95_ms', 'p99_ms',
+        'max_ms', 'total_ms', 'last_seen',
+    )
+    list_filter = ('origin', 'last_seen')
+    search_fields = ('statement', 'origin')
+    ordering = ('-total_ms',)
+    readonly_fields = (
+        'fingerprint', 'statement', 'example_params', 'origin', 'origins', 'stack',
+        'plan', 'plan_at', 'count', 'total_ms', 'max_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+        'first_seen', 'last_seen',
+    )
+    exclude = ('durations',)
+    list_per_page = 50
+
+    def short_statement(self, obj):
+        return obj.statement[:120]
+    short_statement.short_description = 'Statement'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', 'name', 'created_at')
+    search_fields = ('name', 'last_error')
+    date_hierarchy = 'created_at'
+    readonly_fields = (
+        'name', 'args', 'kwargs', 'status', 'attempts', 'max_attempts', 'run_at',
+        'locked_at', 'locked_by', 'last_error', 'created_at', 'finished_at',
+    )
+    actions = ('retry',)
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Retry selected failed tasks now')
+    def retry(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='pending', attempts=0, run_at=timezone.now(), locked_at=None, locked_by='', finished_at=None,
+        )
+        self.message_user(request, f'{count} task(s) queued again.')
@@ -0,0 +1,154 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    """Collects audit entries on an in-process queue and writes them in batches.
+
+    Requests only pay for building an ``AuditLog`` instance and a queue put. A
+    daemon thread flushes with ``bulk_create`` every ``flush_interval`` seconds or
+    ``batch_size`` entries, whichever comes first. When the queue is full the
+    producer blocks for up to ``enqueue_timeout`` seconds and then writes the
+    entry itself rather than dropping it. A batch the database rejects is retried
+    ``write_attempts`` times with a doubling delay from ``retry_delay`` seconds
+    and only then dropped, with an error logged. Pending entries are flushed at
+    interpreter shutdown.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_queue_size, enqueue_timeout,
+                 write_attempts=1, retry_delay=0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.write_attempts = write_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def put(self, entry):
+        self._ensure_started()
+        try:
+            self._queue.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.warning('Audit queue full, writing entry synchronously')
+            self.write([entry])
+
+    def flush(self):
+        entries = []
+        while True:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if entries:
+            self.write(entries)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_started(self):
+        # gunicorn forks workers after import, so each process needs its own thread.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='audit-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            entries = self._collect()
+            if entries:
+                self.write(entries)
+        close_old_connections()
+
+    def _collect(self):
+        entries = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(entries) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entries.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return entries
+
+    def write(self, entries):
+        """Insert ``entries``, all or none; returns False if they were dropped."""
+        from .models import AuditLog
+
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                with transaction.atomic():
+                    AuditLog.objects.bulk_create(entries, batch_size=self.batch_size)
+                return True
+            except DatabaseError:
+                close_old_connections()
+                if attempt == self.write_attempts:
+                    logger.exception('Dropped %d audit entries after %d attempt(s)', len(entries), attempt)
+                    return False
+                logger.warning('Could not write %d audit entries, retrying', len(entries), exc_info=True)
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+
+writer = AuditWriter(
+    batch_size=settings.AUDIT_LOG_BATCH_SIZE,
+    flush_interval=settings.AUDIT_LOG_FLUSH_INTERVAL_MS / 1000,
+    max_queue_size=settings.AUDIT_LOG_QUEUE_SIZE,
+    enqueue_timeout=settings.AUDIT_LOG_ENQUEUE_TIMEOUT,
+    write_attempts=settings.AUDIT_LOG_WRITE_ATTEMPTS,
+    retry_delay=settings.AUDIT_LOG_RETRY_DELAY_MS / 1000,
+)
+atexit.register(writer.stop)
+
+
+def record(instance, action, changes=None, actor=None):
+    """Queue an audit entry for ``instance`` once the current transaction commits."""
+    record_many(type(instance), [instance.pk], action, changes=changes, actor=actor)
+
+
+def record_many(model, pks, action, changes=None, actor=None):
+    """Queue one audit entry per primary key, e.g. for a bulk queryset operation."""
+    from .models import AuditLog
+
+    entries = [
+        AuditLog(
+            model_label=model._meta.label,
+            object_pk=str(pk),
+            action=action,
+            changes=changes or {},
+            actor_id=getattr(actor, 'pk', None),
+        )
+        for pk in pks
+    ]
+
+    def enqueue():
+        if not settings.AUDIT_LOG_ASYNC:
+            writer.write(entries)
+            return
+        for entry in entries:
+            writer.put(entry)
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,178 @@
+import contextvars
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+
+# Request metadata that describes the batch body, not the sub-requests.
+_BODY_META = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_CONTENT_ENCODING', 'QUERY_STRING', 'wsgi.input')
+
+
+class SubRequestSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False, max_length=100)
+    method = serializers.ChoiceField(choices=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False)
+
+    def validate_path(self, value):
+        if not value.startswith(tuple(settings.BATCH_ALLOWED_PREFIXES)):
+            raise serializers.ValidationError('Path is not available in a batch.')
+        # Credential checks must pass through the auth throttles and load shedding.
+        if value.startswith((*settings.AUTH_SHED_PATHS, *settings.BATCH_EXCLUDED_PATHS)):
+            raise serializers.ValidationError('Authentication endpoints cannot be batched.')
+        try:
+            nested = resolve(value.partition('?')[0]).url_name == 'batch'
+        except Resolver404:
+            nested = False
+        if nested:
+            raise serializers.ValidationError('Batches cannot be nested.')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'At most {settings.BATCH_MAX_REQUESTS} requests per batch.')
+        return value
+
+
+def build_request(parent, item):
+    """A request for ``item`` carrying the headers and the identity of ``parent``."""
+    path, _, query = item['path'].partition('?')
+    body = json.dumps(item['body']).encode() if 'body' in item else b''
+    environ = {key: value for key, value in parent.META.items() if key not in _BODY_META}
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': parent.scheme,
+    })
+    request = WSGIRequest(environ)
+    # DRF authenticates sub-requests with these instead of looking the token up again.
+    request._force_auth_user = parent.user
+    request._force_auth_token = parent.auth
+    return request
+
+
+def dispatch(request):
+    """Run ``request`` through the URL resolver and its view, without middleware."""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return {'status': 404, 'body': {'detail': 'Not found.'}}
+    request.resolver_match = match
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        body = None
+        if content:
+            if response.get('Content-Type', '').startswith('application/json'):
+                body = json.loads(content)
+            else:
+                body = content.decode(response.charset, errors='replace')
+    except Exception:
+        logger.exception('Batched %s %s failed', request.method, request.get_full_path())
+        return {'status': 500, 'body': {'detail': 'Internal server error.'}}
+    return {'status': response.status_code, 'body': body}
+
+
+def _dispatch_in_thread(context, request):
+    # Pool threads open their own connections, recycled like a request's.
+    close_old_connections()
+    try:
+        return context.run(dispatch, request)
+    finally:
+        close_old_connections()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(settings.BATCH_CONCURRENCY, thread_name_prefix='batch')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def run_batch(requests):
+    """Dispatch ``requests`` in order; consecutive reads run concurrently.
+
+    A write waits for everything before it and runs alone, so a later read
+    sees its effect.
+    """
+    results = [None] * len(requests)
+    position = 0
+    while position < len(requests):
+        end = position + 1
+        if requests[position].method in READ_METHODS:
+            while end < len(requests) and requests[end].method in READ_METHODS:
+                end += 1
+        futures = [
+            (index, executor().submit(_dispatch_in_thread, contextvars.copy_context(), requests[index]))
+            for index in range(position + 1, end)
+        ] if settings.BATCH_CONCURRENCY > 1 else []
+        # The first request of a run, or all of them without a pool, uses this thread.
+        for index in range(position, end if not futures else position + 1):
+            results[index] = dispatch(requests[index])
+        for index, future in futures:
+            results[index] = future.result()
+        position = end
+    return results
+
+
+class BatchView(APIView):
+    """Dispatch several API requests in one round trip.
+
+    The batch is authenticated once and every sub-request runs as the same
+    user, through the URL resolver but without the middleware stack.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Batch API requests",
+        tags=["Batch"],
+        request=BatchSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+
+        results = run_batch([build_request(request, item) for item in items])
+        for item, result in zip(items, results):
+            if 'id' in item:
+                result['id'] = item['id']
+        return Response({'responses': results})
@@ -0,0 +1,40 @@
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+FRECUENCIES = ['OCCASIONAL', 'REGULAR', 'FREQUENT']
+
+
+def customer_page(rows):
+    """Build a paginated page shaped like CustomerListSerializer output."""
+    now = timezone.now()
+    results = []
+    for index in range(rows):
+        frecuency = FRECUENCIES[index % len(FRECUENCIES)]
+        results.append({
+            'id': index + 1,
+            'uuid': uuid.UUID(int=index),
+            'is_deleted': index % 10 == 0,
+            'created_at': now - timedelta(minutes=index),
+            'updated_at': (now - timedelta(seconds=index)).isoformat(),
+            'deleted_at': None,
+            'description': f'Cliente Número {index} — Mesa {index % 12}',
+            'frecuency': frecuency,
+            'frecuency_display': gettext_lazy(frecuency.title()),
+            'balance': Decimal(index) / 100,
+        })
+    return {'count': rows, 'next': None, 'previous': None, 'results': results}
+
+
+def best_of(function, payload, repeat):
+    """Return the fastest of ``repeat`` calls of ``function(payload)`` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(payload)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
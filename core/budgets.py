@@ -0,0 +1,164 @@
+"""Query-count and response-time budgets for API routes.
+
+``discover`` walks the root URLconf and yields the list, retrieve and extra
+action routes of every viewset mounted from the given URL modules. Each route is
+measured with ``measure`` and compared with its entry in ``query_budgets.json``:
+the query count, the best-of-N response time and, on failure, a diff between
+the recorded and the executed SQL.
+
+Set ``UPDATE_QUERY_BUDGETS=1`` when running the tests to rewrite the recorded
+SQL and query counts after an intended change; time budgets are kept.
+"""
+import difflib
+import json
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+
+BUDGET_FILE = Path(__file__).with_name('query_budgets.json')
+FORMAT_VERSION = 1
+DEFAULT_MAX_MS = 250
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(\.\d+)?\b'), '?'),
+    (re.compile(r'\(\?(, \?)+\)'), '(?, ...)'),
+]
+
+
+@dataclass
+class Endpoint:
+    key: str
+    url_name: str
+    method: str
+    action: str
+    detail: bool
+    model: type
+
+
+@dataclass
+class Measurement:
+    status: int
+    queries: list
+    ms: float
+
+
+class BudgetFormatError(Exception):
+    pass
+
+
+def normalize_sql(sql):
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _walk(patterns, module=None, namespaces=()):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            urlconf = pattern.urlconf_name
+            name = urlconf if isinstance(urlconf, str) else getattr(urlconf, '__name__', None)
+            inner = namespaces + ((pattern.namespace,) if pattern.namespace else ())
+            yield from _walk(pattern.url_patterns, module or name, inner)
+        else:
+            yield module, namespaces, pattern
+
+
+def discover(modules):
+    """Yield an ``Endpoint`` per viewset route mounted from ``modules``."""
+    seen = set()
+    for module, namespaces, pattern in _walk(get_resolver().url_patterns):
+        actions = getattr(pattern.callback, 'actions', None)
+        if module not in modules or not actions or not pattern.name:
+            continue
+        if 'format' in pattern.pattern.regex.groupindex:
+            continue
+        view_class = pattern.callback.cls
+        for method, action in actions.items():
+            if method == 'head':
+                # DRF maps HEAD onto GET once the view has been called.
+                continue
+            extra = getattr(getattr(view_class, action, None), 'mapping', None)
+            if action not in ('list', 'retrieve') and extra is None:
+                continue
+            key = f'{pattern.name} {method.upper()}'
+            if key in seen:
+                continue
+            seen.add(key)
+            yield Endpoint(
+                key=key,
+                url_name=':'.join(namespaces + (pattern.name,)),
+                method=method,
+                action=action,
+                detail='pk' in pattern.pattern.regex.groupindex,
+                model=view_class.queryset.model,
+            )
+
+
+def measure(client, endpoint, budget, repeat=3):
+    """Request ``endpoint`` ``repeat`` times, each inside a rolled back transaction.
+
+    Queries are captured on the first, cold-cache run; the time is the best run.
+    """
+    kwargs = {}
+    if endpoint.detail:
+        kwargs['pk'] = endpoint.model._base_manager.order_by('-pk').values_list('pk', flat=True)[0]
+    path = reverse(endpoint.url_name, kwargs=kwargs)
+    request = getattr(client, endpoint.method)
+    data = budget.get('data')
+
+    queries, timings, status = None, [], None
+    for _ in range(repeat):
+        for alias in caches:
+            caches[alias].clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request(path, data, format='json') if data is not None else request(path)
+                timings.append((time.perf_counter() - started) * 1000)
+            transaction.set_rollback(True)
+        if queries is None:
+            queries = [normalize_sql(query['sql']) for query in context.captured_queries]
+            status = response.status_code
+    return Measurement(status=status, queries=queries, ms=min(timings))
+
+
+def load_budgets(path=BUDGET_FILE):
+    with open(path) as budget_file:
+        budgets = json.load(budget_file)
+    if budgets.get('version') != FORMAT_VERSION:
+        raise BudgetFormatError(
+            f'{path} has format version {budgets.get("version")}, expected {FORMAT_VERSION}'
+        )
+    return budgets
+
+
+def save_budgets(budgets, path=BUDGET_FILE):
+    with open(path, 'w') as budget_file:
+        json.dump(budgets, budget_file, indent=2, sort_keys=True)
+        budget_file.write('\n')
+
+
+def check(endpoint, budget, size, measurement):
+    """Return a failure message for ``measurement``, or None if within budget."""
+    problems = []
+    if measurement.status >= 400:
+        problems.append(f'returned HTTP {measurement.status}')
+    if len(measurement.queries) > budget['max_queries']:
+        problems.append(f'ran {len(measurement.queries)} queries, budget is {budget["max_queries"]}')
+    max_ms = budget.get('max_ms', DEFAULT_MAX_MS)
+    if measurement.ms > max_ms:
+        problems.append(f'took {measurement.ms:.1f}ms, budget is {max_ms}ms')
+    if not problems:
+        return None
+
+    diff = difflib.unified_diff(
+        budget.get('sql', []), measurement.queries, 'recorded', f'executed ({size} rows)', lineterm=''
+    )
+    return f'{endpoint.key} at {size} rows ' + ', '.join(problems) + '\n' + '\n'.join(diff)
@@ -0,0 +1,341 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+CLEAR_ALL = '*'
+
+
+class LocalLRU:
+    """Thread-safe in-process LRU holding pickled values with an expiry time."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class NullInvalidationChannel:
+    """Channel for a single process: there is nobody else to notify."""
+
+    def publish(self, keys):
+        pass
+
+    def poll(self):
+        return []
+
+
+class SQLiteInvalidationChannel:
+    """Broadcasts invalidated keys to every process sharing one SQLite file.
+
+    Writers append keys to a table; readers fetch rows newer than the last one
+    they saw, at most once per ``poll_interval`` seconds. Local entries can
+    therefore outlive a remote write by up to that interval. Rows older than
+    ``retention`` seconds are pruned by each process at most once per
+    ``prune_interval`` seconds.
+    """
+
+    def __init__(self, path=None, poll_interval=0.1, retention=300, prune_interval=60):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'cache_invalidation.sqlite3')
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        self._state_lock = threading.Lock()
+        self._pid = None
+        self._origin = None
+        self._last_id = 0
+        self._next_poll = 0.0
+        self._next_prune = 0.0
+
+    def _connection(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS invalidations ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, key TEXT, created REAL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS invalidations_created ON invalidations (created)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        self._ensure_process_state()
+        return self._local.connection
+
+    def _ensure_process_state(self):
+        # Forked workers start reading from the current end of the log.
+        if self._pid == os.getpid():
+            return
+        with self._state_lock:
+            if self._pid == os.getpid():
+                return
+            row = self._local.connection.execute('SELECT MAX(id) FROM invalidations').fetchone()
+            self._last_id = row[0] or 0
+            self._origin = uuid.uuid4().hex
+            self._pid = os.getpid()
+
+    def publish(self, keys):
+        connection = self._connection()
+        now = time.time()
+        connection.executemany(
+            'INSERT INTO invalidations (origin, key, created) VALUES (?, ?, ?)',
+            [(self._origin, key, now) for key in keys]
+        )
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + self.prune_interval
+            connection.execute('DELETE FROM invalidations WHERE created < ?', (now - self.retention,))
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self._next_poll:
+            return []
+        connection = self._connection()
+        with self._state_lock:
+            if now < self._next_poll:
+                return []
+            self._next_poll = now + self.poll_interval
+            rows = connection.execute(
+                'SELECT id, origin, key FROM invalidations WHERE id > ? ORDER BY id',
+                (self._last_id,)
+            ).fetchall()
+            if rows:
+                self._last_id = rows[-1][0]
+        return [key for _, origin, key in rows if origin != self._origin]
+
+
+class CacheStats:
+    """Per-process hit/miss counters grouped by key namespace.
+
+    ``namespaces`` maps key prefixes to namespace names; the longest matching
+    prefix wins and unmatched keys are counted under ``other``.
+    """
+
+    def __init__(self, namespaces):
+        self._prefixes = sorted(namespaces.items(), key=lambda item: len(item[0]), reverse=True)
+        self._counters = defaultdict(lambda: {'local_hits': 0, 'shared_hits': 0, 'misses': 0})
+        self._lock = threading.Lock()
+
+    def namespace(self, key):
+        for prefix, name in self._prefixes:
+            if key.startswith(prefix):
+                return name
+        return 'other'
+
+    def incr(self, key, counter):
+        with self._lock:
+            self._counters[self.namespace(key)][counter] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(values) for name, values in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class _Expiring:
+    """A shared-tier value stored with the time (``time.time()``) it expires at."""
+
+    __slots__ = ('value', 'expires')
+
+    def __init__(self, value, expires):
+        self.value = value
+        self.expires = expires
+
+    def __getstate__(self):
+        return self.value, self.expires
+
+    def __setstate__(self, state):
+        self.value, self.expires = state
+
+
+class TieredCache(BaseCache):
+    """Cache backend with an in-process LRU tier in front of a shared cache alias.
+
+    Reads try the local tier first, then the shared tier (``SHARED_ALIAS``), and
+    copy shared hits into the local tier for at most ``LOCAL_TIMEOUT`` seconds,
+    and never past the key's own expiry: values written with a timeout are
+    stored in the shared tier together with their expiry time.
+    Every write or delete is broadcast through ``CHANNEL`` so other workers evict
+    their local copy of the key. ``add`` is only as atomic as the shared
+    backend's; on the file-based backend it is not. ``incr`` and ``touch`` on a
+    key written with a timeout read and rewrite it, so they are never atomic.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED_ALIAS', 'shared')
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 30)
+        self._local = LocalLRU(options.get('LOCAL_MAX_ENTRIES', 1000))
+        channel_class = import_string(options.get('CHANNEL', 'core.cache.NullInvalidationChannel'))
+        self._channel = channel_class(**options.get('CHANNEL_OPTIONS', {}))
+        self._stats = CacheStats(options.get('NAMESPACES', {}))
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def stats(self):
+        return self._stats.snapshot()
+
+    def _sync(self):
+        keys = self._channel.poll()
+        if not keys:
+            return
+        if CLEAR_ALL in keys:
+            self._local.clear()
+        else:
+            self._local.delete_many(keys)
+
+    def _store_local(self, local_key, value, expires):
+        local_timeout = self._local_timeout
+        if expires is not None:
+            local_timeout = min(expires - time.time(), local_timeout)
+        if local_timeout > 0:
+            self._local.set(local_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), local_timeout)
+
+    def _timeout(self, timeout):
+        # Resolved here so the shared tier and the stored expiry agree.
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    @staticmethod
+    def _wrap(value, expires):
+        return value if expires is None else _Expiring(value, expires)
+
+    def _invalidate(self, local_keys):
+        self._local.delete_many(local_keys)
+        self._channel.publish(local_keys)
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        local_key = self.make_and_validate_key(key, version=version)
+        pickled = self._local.get(local_key)
+        if pickled is not None:
+            self._stats.incr(key, 'local_hits')
+            return pickle.loads(pickled)
+
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._stats.incr(key, 'misses')
+            return default
+        self._stats.incr(key, 'shared_hits')
+        expires = None
+        if isinstance(value, _Expiring):
+            value, expires = value.value, value.expires
+        self._store_local(local_key, value, expires)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        expires = self.get_backend_timeout(timeout)
+        self.shared.set(key, self._wrap(value, expires), timeout=timeout, version=version)
+        self._invalidate([local_key])
+        self._store_local(local_key, value, expires)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        expires = self.get_backend_timeout(timeout)
+        added = self.shared.add(key, self._wrap(value, expires), timeout=timeout, version=version)
+        if added:
+            self._invalidate([local_key])
+            self._store_local(local_key, value, expires)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # The stored expiry changes with the shared one.
+        local_key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return False
+        if isinstance(value, _Expiring):
+            value = value.value
+        self.shared.set(key, self._wrap(value, self.get_backend_timeout(timeout)), timeout=timeout, version=version)
+        self._invalidate([local_key])
+        return True
+
+    def delete(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        deleted = self.shared.delete(key, version=version)
+        self._invalidate([local_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return
+        local_keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        self.shared.delete_many(keys, version=version)
+        self._invalidate(local_keys)
+
+    def has_key(self, key, version=None):
+        self._sync()
+        local_key = self.make_and_validate_key(key, version=version)
+        if self._local.get(local_key) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        current = self.shared.get(key, version=version)
+        if isinstance(current, _Expiring):
+            remaining = current.expires - time.time()
+            if remaining <= 0:
+                raise ValueError("Key '%s' not found" % key)
+            value = current.value + delta
+            self.shared.set(key, _Expiring(value, current.expires), timeout=remaining, version=version)
+        else:
+            value = self.shared.incr(key, delta, version=version)
+        self._invalidate([local_key])
+        return value
+
+    def clear(self):
+        self.shared.clear()
+        self._local.clear()
+        self._channel.publish([CLEAR_ALL])
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
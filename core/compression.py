@@ -0,0 +1,179 @@
+import gzip
+import secrets
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def parse_accept_encoding(header):
+    codings = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def negotiate_encoding(header):
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get('*', 0.0)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = codings.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class GzipStream:
+    """Incremental gzip writer. A random-length file name is written into the
+    header (Heal The BREACH) so the compressed length does not leak the
+    compressibility of the body exactly."""
+
+    def __init__(self, level, max_random_bytes):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._size = 0
+        self._header = self._build_header(max_random_bytes)
+
+    def _build_header(self, max_random_bytes):
+        flags = 0
+        filename = b''
+        if max_random_bytes:
+            flags = gzip.FNAME
+            filename = b'a' * secrets.randbelow(max_random_bytes) + b'\x00'
+        # Magic, deflate, flags, mtime 0, no extra flags, unknown OS.
+        return b'\x1f\x8b\x08' + bytes([flags]) + b'\x00\x00\x00\x00\x00\xff' + filename
+
+    def compress(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        header, self._header = self._header, b''
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        header, self._header = self._header, b''
+        trailer = (self._crc & 0xFFFFFFFF).to_bytes(4, 'little') + (self._size & 0xFFFFFFFF).to_bytes(4, 'little')
+        return header + self._compressor.flush(zlib.Z_FINISH) + trailer
+
+
+class BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def open_stream(encoding):
+    if encoding == 'br':
+        return BrotliStream(settings.COMPRESSION_BROTLI_QUALITY)
+    return GzipStream(settings.COMPRESSION_GZIP_LEVEL, settings.COMPRESSION_MAX_RANDOM_BYTES)
+
+
+def compress(encoding, data):
+    stream = open_stream(encoding)
+    return stream.compress(data) + stream.finish()
+
+
+def compress_sequence(encoding, sequence):
+    stream = open_stream(encoding)
+    for chunk in sequence:
+        data = stream.compress(chunk) + stream.flush()
+        if data:
+            yield data
+    yield stream.finish()
+
+
+async def compress_async_sequence(encoding, sequence):
+    stream = open_stream(encoding)
+    async for chunk in sequence:
+        data = stream.compress(chunk) + stream.flush()
+        if data:
+            yield data
+    yield stream.finish()
+
+
+class CompressionMiddleware:
+    """Compresses responses with Brotli or gzip, following Accept-Encoding.
+
+    Only ``COMPRESSION_CONTENT_TYPES`` are compressed, buffered bodies must be at
+    least ``COMPRESSION_MIN_SIZE`` bytes, and streaming responses are compressed
+    chunk by chunk. Responses from ``COMPRESSION_EXCLUDE_PATHS`` (the endpoints
+    that return auth tokens, and the batch endpoint that can wrap them) and
+    responses that set cookies are never compressed, which keeps those secrets
+    out of reach of BREACH-style length oracles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.has_header('Content-Encoding') or not self._is_compressible(request, response):
+            return response
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_sequence(encoding, response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(encoding, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            compressed = compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _is_compressible(self, request, response):
+        if request.path.startswith(tuple(settings.COMPRESSION_EXCLUDE_PATHS)):
+            return False
+        if response.cookies:
+            return False
+        if getattr(response, 'file_to_stream', None) is not None:
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return content_type.startswith(tuple(settings.COMPRESSION_CONTENT_TYPES))
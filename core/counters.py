@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Counter
+
+# Durable counters shared by every worker and host, kept in the database:
+# unlike add()/incr() on the file-based shared cache, these updates are atomic
+# and never evicted. Per-request counters such as rate limits belong in the
+# 'throttle' cache instead, since each update here is a write transaction.
+
+
+def _using():
+    return router.db_for_write(Counter)
+
+
+def _expires_at(now, timeout):
+    return None if timeout is None else now + timedelta(seconds=timeout)
+
+
+def incr(key, delta=1, timeout=None):
+    """Add ``delta`` to counter ``key`` and return the new value.
+
+    The row is updated with ``F()`` under its row lock, so concurrent callers
+    never lose an increment. A counter created with ``timeout`` starts again
+    from zero once that many seconds have passed; without one it never expires.
+    """
+    using = _using()
+    now = timezone.now()
+    counters = Counter.objects.using(using)
+    with transaction.atomic(using=using):
+        live = Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+        if not counters.filter(live, key=key).update(value=F('value') + delta):
+            try:
+                with transaction.atomic(using=using):
+                    counters.create(key=key, value=delta, expires_at=_expires_at(now, timeout))
+            except IntegrityError:
+                # The row exists: it expired, or a concurrent caller just created it.
+                restarted = counters.filter(key=key, expires_at__lte=now).update(
+                    value=delta, expires_at=_expires_at(now, timeout)
+                )
+                if not restarted:
+                    counters.filter(key=key).update(value=F('value') + delta)
+        return counters.filter(key=key).values_list('value', flat=True).get()
+
+
+def value(key, default=0):
+    """Current value of counter ``key``, or ``default`` when it is missing or expired."""
+    now = timezone.now()
+    live = Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+    found = Counter.objects.using(_using()).filter(live, key=key).values_list('value', flat=True).first()
+    return default if found is None else found
+
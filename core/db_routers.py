@@ -0,0 +1,138 @@
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.connection import ConnectionDoesNotExist
+
+logger = logging.getLogger(__name__)
+
+_use_primary = contextvars.ContextVar('use_primary', default=False)
+
+
+class use_primary:
+    """Context manager forcing reads in the current context to the primary."""
+
+    def __enter__(self):
+        self._token = _use_primary.set(True)
+
+    def __exit__(self, *exc_info):
+        _use_primary.reset(self._token)
+
+
+class ReplicaHealth:
+    """Caches per-process replica lag checks for ``REPLICA_CHECK_INTERVAL`` seconds."""
+
+    def __init__(self):
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def is_usable(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+            if checked and checked[0] > now:
+                return checked[1]
+        usable = self._check(alias)
+        with self._lock:
+            self._checked[alias] = (now + settings.REPLICA_CHECK_INTERVAL, usable)
+        return usable
+
+    def _check(self, alias):
+        try:
+            lag = replica_lag(alias)
+        except (ConnectionDoesNotExist, DatabaseError):
+            logger.warning('Replica %s is unavailable, reading from primary', alias)
+            return False
+        if lag > settings.REPLICA_MAX_LAG_SECONDS:
+            logger.warning('Replica %s is %.1fs behind, reading from primary', alias, lag)
+            return False
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+def replica_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        connection.ensure_connection()
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+        )
+        return float(cursor.fetchone()[0])
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    """Sends reads to ``DATABASE_REPLICAS`` and everything else to the primary.
+
+    Reads stay on the primary while ``_use_primary`` is set for the current
+    request (see ``ReplicaRoutingMiddleware``), inside a transaction on the
+    primary, or when no replica passes the lag check.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if health.is_usable(alias)]
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Pins a client to the primary for ``REPLICA_STICKY_SECONDS`` after it writes.
+
+    Unsafe methods always read from the primary. The client is identified by its
+    Authorization header, falling back to the session cookie, and the pin is
+    kept in the shared cache so it holds across workers.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        client_key = self._client_key(request)
+        is_write = request.method not in self.SAFE_METHODS
+        pinned = is_write or (client_key is not None and cache.get(client_key) is not None)
+
+        token = _use_primary.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+
+        if is_write and client_key is not None and response.status_code < 400:
+            cache.set(client_key, 1, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def _client_key(self, request):
+        identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not identity:
+            return None
+        return 'replica_pin_' + hashlib.sha256(identity.encode()).hexdigest()
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import re
+import threading
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.asyncio import async_unsafe
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class PooledSession(requests.Session):
+    """``requests.Session`` with a default timeout and a bounded keep-alive pool.
+
+    Connection errors on idempotent requests are retried once, which covers
+    pooled connections the server closed while idle.
+    """
+
+    def __init__(self, timeout, pool_size):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=1, connect=1, read=False, status=0, allowed_methods=Retry.DEFAULT_ALLOWED_METHODS),
+        )
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    # Outbound calls block; under ASGI they belong in a sync view's thread,
+    # never on the event loop.
+    @async_unsafe
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_session = None
+_session_pid = None
+_lock = threading.Lock()
+
+
+def session():
+    """The process-wide pooled session, recreated after a fork."""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = PooledSession(
+                    (settings.OUTBOUND_HTTP_CONNECT_TIMEOUT, settings.OUTBOUND_HTTP_READ_TIMEOUT),
+                    settings.OUTBOUND_HTTP_POOL_SIZE,
+                )
+                _session_pid = os.getpid()
+    return _session
+
+
+def cached_json(url, refresh=False):
+    """GET ``url`` as JSON through the default cache.
+
+    The entry lives as long as the response's ``Cache-Control: max-age``, or
+    ``OUTBOUND_HTTP_CACHE_TIMEOUT`` seconds without one. ``refresh`` skips the
+    cached copy, e.g. when a signing key is not found in it.
+    """
+    key = f'outbound_json_{hashlib.sha1(url.encode()).hexdigest()}'
+    if not refresh:
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    response = session().get(url)
+    response.raise_for_status()
+    data = response.json()
+    match = _MAX_AGE.search(response.headers.get('Cache-Control', ''))
+    timeout = int(match.group(1)) if match else settings.OUTBOUND_HTTP_CACHE_TIMEOUT
+    if timeout:
+        cache.set(key, data, timeout)
+    return data
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmarks import best_of, customer_page
+from core.compression import BrotliStream, GzipStream, brotli
+
+
+class Command(BaseCommand):
+    help = 'Report bytes saved against CPU time added by each compression level on a customer page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        payload = JSONRenderer().render(customer_page(options['rows']))
+        repeat = options['repeat']
+
+        candidates = [(f'gzip-{level}', lambda level=level: GzipStream(level, 100)) for level in (1, 4, 6, 9)]
+        if brotli is not None:
+            candidates += [(f'br-{quality}', lambda quality=quality: BrotliStream(quality)) for quality in (1, 4, 5, 6, 11)]
+
+        self.stdout.write(f'{options["rows"]} rows, {len(payload) / 1024:.0f} KiB uncompressed, best of {repeat}')
+        for name, factory in candidates:
+            def run(data, factory=factory):
+                stream = factory()
+                return stream.compress(data) + stream.finish()
+
+            size = len(run(payload))
+            elapsed = best_of(run, payload, repeat)
+            self.stdout.write(
+                f'{name:>8}: {size / 1024:8.0f} KiB  saved {100 * (1 - size / len(payload)):5.1f}%  '
+                f'+{elapsed:7.2f} ms'
+            )
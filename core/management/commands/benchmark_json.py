@@ -0,0 +1,45 @@
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmarks import best_of, customer_page
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = 'Compare JSONRenderer/JSONParser with the orjson-backed pair on a large customer page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed; FastJSONRenderer falls back to JSONRenderer.')
+
+        data = customer_page(options['rows'])
+        repeat = options['repeat']
+
+        baseline = JSONRenderer().render(data)
+        fast = FastJSONRenderer().render(data)
+        if baseline != fast:
+            raise CommandError('FastJSONRenderer output differs from JSONRenderer.')
+
+        results = [
+            ('render', JSONRenderer().render, FastJSONRenderer().render, data),
+            ('parse', self._parser(JSONParser()), self._parser(FastJSONParser()), baseline),
+        ]
+        self.stdout.write(f'{options["rows"]} rows, {len(baseline) / 1024:.0f} KiB, best of {repeat}')
+        for name, slow, quick, payload in results:
+            slow_ms = best_of(slow, payload, repeat)
+            quick_ms = best_of(quick, payload, repeat)
+            self.stdout.write(
+                f'{name:>6}: stdlib {slow_ms:7.2f} ms  orjson {quick_ms:7.2f} ms  '
+                f'({slow_ms / quick_ms:.1f}x)'
+            )
+
+    def _parser(self, parser):
+        return lambda payload: parser.parse(BytesIO(payload), parser_context={'encoding': 'utf-8'})
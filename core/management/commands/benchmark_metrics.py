@@ -0,0 +1,56 @@
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from core import metrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the per-request cost of MetricsMiddleware around a no-op view and '
+        'fail when it exceeds METRICS_OVERHEAD_BUDGET_US.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50000)
+        parser.add_argument('--budget-us', type=float, default=settings.METRICS_OVERHEAD_BUDGET_US)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        request = RequestFactory().get('/api/auth/users/')
+        response = HttpResponse()
+        bare = lambda request: response  # noqa: E731
+        middleware = metrics.MetricsMiddleware(bare)
+
+        # Keep benchmark samples out of the real registry and METRICS_DIR.
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(metrics, 'registry', metrics.Registry(settings.METRICS_BUCKETS)), \
+                mock.patch.object(metrics, 'exporter', metrics.FileExporter(directory, settings.METRICS_FLUSH_INTERVAL)):
+            baseline = self._time(bare, request, iterations)
+            measured = self._time(middleware, request, iterations)
+            started = time.perf_counter()
+            metrics.exporter.flush()
+            flush_ms = (time.perf_counter() - started) * 1000
+
+        overhead_us = max(measured - baseline, 0.0)
+        self.stdout.write(
+            f'MetricsMiddleware: {overhead_us:.2f} us/request over {iterations} requests; '
+            f'file flush: {flush_ms:.2f} ms, at most every {settings.METRICS_FLUSH_INTERVAL}s'
+        )
+        if overhead_us > options['budget_us']:
+            raise CommandError(
+                f'Metrics overhead of {overhead_us:.2f} us/request exceeds the '
+                f'{options["budget_us"]} us budget.'
+            )
+        self.stdout.write(self.style.SUCCESS('Metrics overhead within budget.'))
+
+    def _time(self, handler, request, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            handler(request)
+        return (time.perf_counter() - started) / iterations * 1e6
@@ -0,0 +1,124 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as day_start, timezone as dt_timezone
+from multiprocessing import get_context
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections
+from django.utils import timezone
+
+from core.synthetic import BLOCK_SIZE, Plan, load_range
+
+
+def _load_chunk(chunk):
+    # Each worker opens its own connections; the forked parent ones are closed.
+    try:
+        return load_range(*chunk)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate realistic users (with email addresses and social accounts) and '
+        'customers for load tests and benchmarks. The same arguments and seed always '
+        'produce the same rows; they are written with COPY on PostgreSQL by parallel '
+        'workers, bypassing save() and signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0, help='Users to create.')
+        parser.add_argument('--customers', type=int, default=0, help='Customers to create.')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the random streams.')
+        parser.add_argument(
+            '--offset', type=int, default=0,
+            help='Number of the first row; use a new offset to add rows to an earlier run.'
+        )
+        parser.add_argument(
+            '--end', type=datetime.fromisoformat, default=None,
+            help='Timestamp of the most recent row (ISO 8601; default: today at midnight UTC).'
+        )
+        parser.add_argument('--days', type=int, default=730, help='Days of history before --end.')
+        parser.add_argument(
+            '--deleted-fraction', type=float, default=0.05,
+            help='Share of soft-deleted rows.'
+        )
+        parser.add_argument(
+            '--social-fraction', type=float, default=0.15,
+            help='Share of active users with a Google or GitHub account.'
+        )
+        parser.add_argument(
+            '--password', default='synthetic-pass-123',
+            help='Password of every user; it is hashed once and the hash shared.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20000,
+            help=f'Rows per transaction (rounded up to a multiple of {BLOCK_SIZE}).'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes (1 runs in this process).'
+        )
+
+    def handle(self, *args, **options):
+        if not options['users'] and not options['customers']:
+            raise CommandError('Pass --users and/or --customers.')
+        if options['customers'] and not apps.is_installed('CLIENTS'):
+            raise CommandError('The CLIENTS app is not installed; customers cannot be generated.')
+
+        end = options['end']
+        if end is None:
+            end = datetime.combine(timezone.now().date(), day_start(), tzinfo=dt_timezone.utc)
+        elif timezone.is_naive(end):
+            end = end.replace(tzinfo=dt_timezone.utc)
+
+        common = {
+            'seed': options['seed'],
+            'offset': options['offset'],
+            'end': end,
+            'days': options['days'],
+            'deleted_fraction': options['deleted_fraction'],
+        }
+        plans = []
+        if options['users']:
+            plans.append(Plan(
+                'users', total=options['users'], social_fraction=options['social_fraction'],
+                password=make_password(options['password']), **common
+            ))
+        if options['customers']:
+            plans.append(Plan('customers', total=options['customers'], **common))
+
+        chunk_size = -(-options['chunk_size'] // BLOCK_SIZE) * BLOCK_SIZE
+        for plan in plans:
+            chunks = [
+                (plan, start, min(start + chunk_size, plan.total))
+                for start in range(0, plan.total, chunk_size)
+            ]
+            started = time.monotonic()
+            try:
+                if options['workers'] > 1:
+                    # Connections must not be shared with forked children.
+                    connections.close_all()
+                    with ProcessPoolExecutor(options['workers'], mp_context=get_context('fork')) as executor:
+                        created = sum(executor.map(_load_chunk, chunks))
+                else:
+                    created = sum(load_range(*chunk) for chunk in chunks)
+            except IntegrityError as exc:
+                raise CommandError(
+                    f'{plan.kind.capitalize()} from an earlier run collide with these; pass a new --offset. ({exc})'
+                )
+            seconds = time.monotonic() - started
+
+            rate = created / seconds if seconds else 0.0
+            self.stdout.write(f'{plan.kind.capitalize()}: {created} row(s) in {seconds:.2f}s ({rate:.0f} rows/s)')
+
+        if options['customers']:
+            # Bulk-loaded rows never went through the signals that keep these current.
+            from CLIENTS import autocomplete
+            from CLIENTS.signals import invalidate_customer_cache
+
+            invalidate_customer_cache()
+            autocomplete.invalidate()
+        self.stdout.write(self.style.SUCCESS('Synthetic data generated.'))
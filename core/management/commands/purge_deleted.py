@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.retention import (
+    purge_counters, purge_profiles, purge_sessions, purge_soft_deleted, purge_tokens, purge_tombstones,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive (or hard delete) rows soft-deleted more than N days ago and prune '
+        'expired sessions, stale auth tokens, old sync tombstones, old request profiles '
+        'and expired counters, in small batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.RETENTION_DAYS,
+            help='Purge rows soft-deleted more than this many days ago.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.RETENTION_BATCH_SIZE,
+            help='Rows locked and removed per transaction.'
+        )
+        parser.add_argument(
+            '--hard-delete', action='store_true',
+            help='Delete rows without copying them to the archive table.'
+        )
+        parser.add_argument(
+            '--token-days', type=int, default=settings.RETENTION_TOKEN_DAYS,
+            help='Also delete auth tokens older than this many days (0 disables).'
+        )
+        parser.add_argument(
+            '--profile-days', type=int, default=settings.PROFILING_RETENTION_DAYS,
+            help='Delete request profiles and their files older than this many days.'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between batches.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['sleep']
+
+        results = purge_soft_deleted(
+            options['days'], batch_size,
+            archive=not options['hard_delete'], pause=pause
+        )
+        results.append(purge_sessions(batch_size, pause=pause))
+        results.append(purge_tokens(batch_size, options['token_days'], pause=pause))
+        results.append(purge_tombstones(options['days'], batch_size, pause=pause))
+        results.append(purge_profiles(options['profile_days'], batch_size, pause=pause))
+        results.append(purge_counters(batch_size, pause=pause))
+
+        for result in results:
+            self.stdout.write(
+                f'{result.label}: {result.rows} row(s) in {result.seconds:.2f}s '
+                f'({result.rows_per_second:.1f} rows/s)'
+            )
+        self.stdout.write(self.style.SUCCESS('Retention run completed.'))
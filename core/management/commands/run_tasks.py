@@ -0,0 +1,36 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background tasks on a thread pool until interrupted. Several '
+        'workers can run side by side; each task is claimed by exactly one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.TASKS_CONCURRENCY,
+            help='Tasks run at the same time by this worker.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.TASKS_POLL_INTERVAL,
+            help='Seconds to wait before looking for new tasks when idle.'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no task is due instead of waiting for more.'
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(options['concurrency'], options['poll_interval'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+
+        self.stdout.write(f'Worker {worker.worker_id} running {options["concurrency"]} task(s) at a time.')
+        worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
@@ -0,0 +1,363 @@
+import bisect
+import fcntl
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route.'),
+    'http_responses_total': ('counter', 'Responses by route and status code.'),
+    'http_requests_in_flight': ('gauge', 'Requests being served.'),
+    'db_queries_total': ('counter', 'Database queries by route.'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in database queries by route.'),
+    'auth_failures_total': ('counter', 'Failed, throttled or shed authentication attempts.'),
+    'cache_requests_total': ('counter', 'Cache reads by namespace and result.'),
+    'cache_hit_ratio': ('gauge', 'Share of cache reads served from either tier.'),
+    'worker_processes': ('gauge', 'Live worker processes reporting metrics.'),
+    'worker_saturation_ratio': ('gauge', 'Requests in flight per available worker thread.'),
+}
+
+AUTH_FAILURE_REASONS = {
+    400: 'rejected',
+    401: 'unauthorized',
+    403: 'forbidden',
+    429: 'throttled',
+    503: 'shed',
+}
+
+
+class Registry:
+    """Per-process metric values, sharded per thread.
+
+    Every thread updates its own dictionaries without taking a lock; a snapshot
+    merges the shards. Gauges that go up and down (requests in flight) are kept
+    as per-thread deltas and summed the same way.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        values = self._shard()[0]
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        row = histograms.get(key)
+        if row is None:
+            # One count per bucket, one for +Inf, then the sum.
+            row = histograms[key] = [0] * (len(self.buckets) + 2)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+        values, histograms = {}, {}
+        for shard_values, shard_histograms in shards:
+            for key, value in shard_values.copy().items():
+                values[key] = values.get(key, 0) + value
+            for key, row in shard_histograms.copy().items():
+                merged = histograms.setdefault(key, [0] * len(row))
+                for index, count in enumerate(list(row)):
+                    merged[index] += count
+        return values, histograms
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+registry = Registry(settings.METRICS_BUCKETS)
+
+
+def observe_request(route, method, status, seconds, queries, query_seconds, is_auth_path):
+    registry.observe('http_request_duration_seconds', (('route', route), ('method', method)), seconds)
+    registry.inc('http_responses_total', (('route', route), ('method', method), ('status', str(status))))
+    if queries:
+        registry.inc('db_queries_total', (('route', route),), queries)
+        registry.inc('db_query_duration_seconds_total', (('route', route),), query_seconds)
+    reason = AUTH_FAILURE_REASONS.get(status)
+    if reason and (is_auth_path or status in (401, 403)):
+        registry.inc('auth_failures_total', (('route', route), ('reason', reason)))
+
+
+def _encode(values, histograms):
+    return {
+        'values': [[name, list(labels), value] for (name, labels), value in values.items()],
+        'histograms': [[name, list(labels), row] for (name, labels), row in histograms.items()],
+    }
+
+
+def _decode(data):
+    values = {(name, tuple(map(tuple, labels))): value for name, labels, value in data['values']}
+    histograms = {(name, tuple(map(tuple, labels))): row for name, labels, row in data['histograms']}
+    return values, histograms
+
+
+def process_snapshot():
+    """This process' metrics, including the cache counters of ``TieredCache``."""
+    values, histograms = registry.snapshot()
+    cache = caches['default']
+    if hasattr(cache, 'stats'):
+        for namespace, counters in cache.stats().items():
+            for counter, value in counters.items():
+                labels = (('namespace', namespace), ('result', counter))
+                values[('cache_requests_total', labels)] = value
+    return values, histograms
+
+
+class FileExporter:
+    """Shares each worker's snapshot through one JSON file per process in ``METRICS_DIR``.
+
+    Workers rewrite their file at most every ``METRICS_FLUSH_INTERVAL`` seconds,
+    checked at the start and end of each request, so a scrape can lag by that
+    interval. Counters of exited workers are kept so totals never go backwards:
+    a scrape folds their files into ``exited.json``, dropping their gauges, and
+    deletes them, so the directory does not grow as workers are recycled.
+    """
+
+    EXITED = 'exited.json'
+
+    def __init__(self, directory, interval):
+        self.directory = str(directory)
+        self.interval = interval
+        self._next_flush = 0.0
+        self._lock = threading.Lock()
+
+    def maybe_flush(self):
+        if time.monotonic() < self._next_flush:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_flush = time.monotonic() + self.interval
+            self.flush()
+        finally:
+            self._lock.release()
+
+    def flush(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            temporary = f'{path}.{threading.get_ident()}.tmp'
+            with open(temporary, 'w') as metrics_file:
+                json.dump(_encode(*process_snapshot()), metrics_file)
+            os.replace(temporary, path)
+        except OSError:
+            logger.exception('Could not write metrics to %s', self.directory)
+
+    def _read(self, file_name):
+        try:
+            with open(os.path.join(self.directory, file_name)) as metrics_file:
+                return _decode(json.load(metrics_file))
+        except (OSError, ValueError):
+            return None
+
+    def _fold_exited(self, file_names):
+        """Merge the snapshots of exited workers into ``exited.json`` and delete their files."""
+        exited = self._read(self.EXITED) or ({}, {})
+        for file_name in file_names:
+            # A leftover temporary file repeats its worker's counters; it is only removed.
+            snapshot = self._read(file_name) if file_name.endswith('.json') else None
+            if snapshot is not None:
+                _merge(exited, snapshot, counters_only=True)
+        try:
+            temporary = os.path.join(self.directory, f'{self.EXITED}.{os.getpid()}.tmp')
+            with open(temporary, 'w') as metrics_file:
+                json.dump(_encode(*exited), metrics_file)
+            os.replace(temporary, os.path.join(self.directory, self.EXITED))
+            for file_name in file_names:
+                os.unlink(os.path.join(self.directory, file_name))
+        except OSError:
+            # The files stay and are folded by a later scrape.
+            logger.exception('Could not fold exited workers into %s', self.directory)
+        return exited
+
+    def collect(self):
+        """Merge the snapshots of every worker; returns values, histograms and live pids."""
+        merged = ({}, {})
+        live = [os.getpid()]
+        _merge(merged, process_snapshot())
+        if not os.path.isdir(self.directory):
+            return (*merged, live)
+
+        # Scrapes can reach any worker; the lock keeps them from folding the same files.
+        with open(os.path.join(self.directory, 'exited.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            exited = []
+            for file_name in os.listdir(self.directory):
+                pid, _, extension = file_name.partition('.')
+                if not pid.isdigit() or int(pid) == os.getpid():
+                    continue
+                if not _is_alive(int(pid)):
+                    # Includes the temporary file of a worker that died while writing.
+                    exited.append(file_name)
+                elif extension == 'json':
+                    snapshot = self._read(file_name)
+                    if snapshot is not None:
+                        live.append(int(pid))
+                        _merge(merged, snapshot)
+            if exited:
+                _merge(merged, self._fold_exited(exited))
+            else:
+                _merge(merged, self._read(self.EXITED) or ({}, {}))
+        return (*merged, live)
+
+
+def _merge(into, snapshot, counters_only=False):
+    values, histograms = into
+    snapshot_values, snapshot_histograms = snapshot
+    for key, value in snapshot_values.items():
+        if counters_only and METRICS[key[0]][0] == 'gauge':
+            continue
+        values[key] = values.get(key, 0) + value
+    for key, row in snapshot_histograms.items():
+        merged = histograms.setdefault(key, [0] * len(row))
+        for index, count in enumerate(row):
+            merged[index] += count
+
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+exporter = FileExporter(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(values, histograms, live):
+    """Prometheus text exposition format for the merged metrics."""
+    in_flight = sum(value for (name, _), value in values.items() if name == 'http_requests_in_flight')
+    values[('worker_processes', ())] = len(live)
+    capacity = len(live) * settings.METRICS_WORKER_THREADS
+    values[('worker_saturation_ratio', ())] = in_flight / capacity if capacity else 0.0
+
+    reads = {}
+    for (name, labels), value in values.items():
+        if name == 'cache_requests_total':
+            labels = dict(labels)
+            hits, total = reads.get(labels['namespace'], (0, 0))
+            hit = value if labels['result'] != 'misses' else 0
+            reads[labels['namespace']] = (hits + hit, total + value)
+    for namespace, (hits, total) in reads.items():
+        values[('cache_hit_ratio', (('namespace', namespace),))] = hits / total if total else 0.0
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        rows = sorted((labels, row) for (metric, labels), row in histograms.items() if metric == name)
+        if not samples and not rows:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+        for labels, row in rows:
+            cumulative = 0
+            for bound, count in zip(registry.buckets + ('+Inf',), row[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(row[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        # Open only in development; production has to set a token.
+        raise Http404
+    if token and not secrets.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(render(*exporter.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """Records latency, status, query and auth-failure metrics for every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        registry.inc('http_requests_in_flight', (), 1)
+        exporter.maybe_flush()
+        timer = QueryTimer()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            registry.inc('http_requests_in_flight', (), -1)
+
+        match = getattr(request, 'resolver_match', None)
+        observe_request(
+            route=(match.view_name if match else None) or 'unresolved',
+            method=request.method,
+            status=response.status_code,
+            seconds=time.perf_counter() - started,
+            queries=timer.count,
+            query_seconds=timer.seconds,
+            is_auth_path=request.path.startswith(tuple(settings.AUTH_SHED_PATHS)),
+        )
+        exporter.maybe_flush()
+        return response
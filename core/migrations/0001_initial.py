@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:21
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(db_index=True, max_length=100)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Record',
+                'verbose_name_plural': 'Archived Records',
+                'ordering': ['-archived_at'],
+                'indexes': [models.Index(fields=['model_label', 'object_pk'], name='core_archiv_model_l_fb7545_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('statement', models.TextField()),
+                ('example_params', models.TextField(blank=True)),
+                ('origin', models.CharField(db_index=True, max_length=200)),
+                ('origins', models.JSONField(blank=True, default=dict)),
+                ('stack', models.TextField(blank=True)),
+                ('plan', models.TextField(blank=True)),
+                ('plan_at', models.DateTimeField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('p50_ms', models.FloatField(default=0)),
+                ('p95_ms', models.FloatField(default=0)),
+                ('p99_ms', models.FloatField(default=0)),
+                ('durations', models.JSONField(blank=True, default=list)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Slow Query',
+                'verbose_name_plural': 'Slow Queries',
+                'ordering': ['-last_seen'],
+            },
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
+from . import signals
+
 
 class BaseQuerySet(models.QuerySet):
     def active(self):
@@ -9,6 +13,44 @@ class BaseQuerySet(models.QuerySet):
     def deleted(self):
         return self.filter(deleted_at__isnull=False)
 
+    def _bulk_update(self, signal, values):
+        # Primary keys are only fetched when someone listens for the bulk signal.
+        pks = None
+        if signal.has_listeners(self.model):
+            pks = list(self.values_list('pk', flat=True))
+            if not pks:
+                return 0
+            queryset = self.model._base_manager.using(self.db).filter(pk__in=pks)
+        else:
+            queryset = self
+        count = queryset.update(updated_at=timezone.now(), **values)
+        if pks is not None:
+            signal.send(sender=self.model, pks=pks)
+        return count
+
+    def soft_delete(self):
+        values = {'deleted_at': timezone.now(), **self.model.SOFT_DELETE_VALUES}
+        return self.active()._bulk_update(signals.bulk_soft_deleted, values)
+
+    def restore(self):
+        values = {'deleted_at': None, **self.model.RESTORE_VALUES}
+        return self.deleted()._bulk_update(signals.bulk_restored, values)
+
+    def hard_delete(self):
+        pks = list(self.values_list('pk', flat=True))
+        with transaction.atomic(using=self.db, savepoint=False):
+            result = super().delete()
+            SyncTombstone.record(self.model, pks, using=self.db)
+        if pks and signals.bulk_hard_deleted.has_listeners(self.model):
+            signals.bulk_hard_deleted.send(sender=self.model, pks=pks)
+        return result
+
+    def delete(self):
+        count = self.soft_delete()
+        return count, {self.model._meta.label: count}
+
+    delete.queryset_only = True
+
 
 class BaseManager(models.Manager):
     def get_queryset(self):
@@ -31,6 +73,10 @@ class BaseModel(models.Model):
 
     objects = BaseManager()
 
+    # Extra column values written together with deleted_at on soft delete/restore
+    SOFT_DELETE_VALUES = {}
+    RESTORE_VALUES = {}
+
     class Meta:
         abstract = True
         ordering = ['-created_at']
@@ -38,8 +84,15 @@ class BaseModel(models.Model):
     def delete(self, hard_delete=False, **kwargs):
         if hard_delete:
             django_delete_kwargs = {k: v for k, v in kwargs.items() if k in ['using']}
-            return super().delete(**django_delete_kwargs)
+            using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+            pk = self.pk
+            with transaction.atomic(using=using, savepoint=False):
+                result = super().delete(**django_delete_kwargs)
+                SyncTombstone.record(type(self), [pk], using=using)
+            return result
         self.deleted_at = timezone.now()
+        for field, value in self.SOFT_DELETE_VALUES.items():
+            setattr(self, field, value)
         self.save()
 
     def hard_delete(self, **kwargs):
@@ -48,6 +101,8 @@ class BaseModel(models.Model):
 
     def restore(self):
         self.deleted_at = None
+        for field, value in self.RESTORE_VALUES.items():
+            setattr(self, field, value)
         self.save()
 
     @property
@@ -56,3 +111,211 @@ class BaseModel(models.Model):
 
     def __str__(self):
         return f"{self.__class__.__name__} {self.id}"
+
+
+class ArchivedRecord(models.Model):
+    model_label = models.CharField(max_length=100, db_index=True)
+    object_pk = models.CharField(max_length=64)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Archived Record"
+        verbose_name_plural = "Archived Records"
+        ordering = ['-archived_at']
+        indexes = [
+            models.Index(fields=['model_label', 'object_pk']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label} {self.object_pk}"
+
+
+class SyncTombstone(models.Model):
+    """A row removed by ``hard_delete``, reported to delta sync clients.
+
+    Rows purged by retention leave none: their soft delete was synced and
+    cursors older than ``RETENTION_DAYS`` get a 410 instead.
+    """
+    model_label = models.CharField(max_length=100)
+    object_pk = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Sync Tombstone"
+        verbose_name_plural = "Sync Tombstones"
+        indexes = [
+            models.Index(fields=['model_label', 'deleted_at', 'object_pk']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label} {self.object_pk}"
+
+    @classmethod
+    def record(cls, model, pks, using=None):
+        now = timezone.now()
+        cls.objects.using(using).bulk_create([
+            cls(model_label=model._meta.label, object_pk=pk, deleted_at=now) for pk in pks
+        ])
+
+
+class AuditLogQuerySet(models.QuerySet):
+    def for_object(self, instance):
+        return self.filter(
+            model_label=instance._meta.label,
+            object_pk=str(instance.pk)
+        )
+
+    def between(self, start=None, end=None):
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lt=end)
+        return queryset
+
+
+class AuditLog(models.Model):
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+        ('restored', 'Restored'),
+        ('role_changed', 'Role Changed'),
+    ]
+
+    model_label = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    changes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='+',
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = AuditLogQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Audit Log"
+        verbose_name_plural = "Audit Logs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['model_label', 'object_pk', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label} {self.object_pk} {self.action}"
+
+
+class RequestProfile(models.Model):
+    TRIGGER_CHOICES = [
+        ('requested', 'Requested'),
+        ('sampled', 'Sampled'),
+    ]
+
+    view_name = models.CharField(max_length=200, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sample_count = models.PositiveIntegerField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    file_name = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='+',
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Request Profile"
+        verbose_name_plural = "Request Profiles"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.view_name} {self.duration_ms:.0f}ms"
+
+
+class SlowQuery(models.Model):
+    fingerprint = models.CharField(max_length=40, unique=True)
+    statement = models.TextField()
+    example_params = models.TextField(blank=True)
+    origin = models.CharField(max_length=200, db_index=True)
+    origins = models.JSONField(default=dict, blank=True)
+    stack = models.TextField(blank=True)
+    plan = models.TextField(blank=True)
+    plan_at = models.DateTimeField(null=True, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    p50_ms = models.FloatField(default=0)
+    p95_ms = models.FloatField(default=0)
+    p99_ms = models.FloatField(default=0)
+    durations = models.JSONField(default=list, blank=True)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Slow Query"
+        verbose_name_plural = "Slow Queries"
+        ordering = ['-last_seen']
+
+    def __str__(self):
+        return f"{self.origin} {self.fingerprint[:12]}"
+
+
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Task"
+        verbose_name_plural = "Tasks"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} {self.status}"
+
+
+class Counter(models.Model):
+    key = models.CharField(max_length=200, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Counter"
+        verbose_name_plural = "Counters"
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
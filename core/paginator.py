@@ -0,0 +1,51 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids exact COUNT(*) on large PostgreSQL tables.
+
+    The table size is read from ``pg_class.reltuples``. Below
+    ``ADMIN_ESTIMATED_COUNT_THRESHOLD`` rows the exact count is used; above it the
+    planner's row estimate for the (possibly filtered) query is returned instead.
+    Other database backends always fall back to the exact count.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self._estimated_count()
+        if estimate is None:
+            return super().count
+        return estimate
+
+    def _estimated_count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None:
+            return None
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        threshold = getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            if not row or row[0] < threshold:
+                return None
+
+            sql, params = query.clone().sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
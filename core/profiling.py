@@ -0,0 +1,163 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import Resolver404, resolve
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from AUTH.permissions import IsAdminOrRoot
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Samples the Python stack of one thread every ``interval`` seconds.
+
+    A helper thread reads the target frame through ``sys._current_frames``, so
+    the profiled code runs unmodified; the cost is one stack walk per sample.
+    Stacks are aggregated in the folded format read by flamegraph.pl,
+    speedscope and similar tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def sample_count(self):
+        return sum(self.stacks.values())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ProfilingMiddleware:
+    """Profiles single requests with ``StackSampler`` and records them as ``RequestProfile``.
+
+    A request is profiled when an admin or root user sends the
+    ``X-Profile: 1`` header or the ``profile=1`` query parameter, or when it is
+    picked by ``PROFILING_SAMPLE_RATES`` (URL name to fraction of traffic,
+    ``'*'`` for every other view). The folded stacks are written to
+    ``PROFILING_DIR`` and the response carries ``X-Profile-Id``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            sampler = stack.enter_context(StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            duration_ms = (time.perf_counter() - started) * 1000
+
+        profile = self._save(request, response, trigger, sampler, counter.count, duration_ms)
+        if profile is not None:
+            response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def _view_name(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return match.view_name or match._func_path
+
+    def _trigger(self, request):
+        flag = request.META.get('HTTP_X_PROFILE') or request.GET.get('profile')
+        if flag == '1' and self._is_admin(request):
+            return 'requested'
+
+        rates = settings.PROFILING_SAMPLE_RATES
+        if rates:
+            view_name = self._view_name(request)
+            rate = rates.get(view_name, rates.get('*', 0)) if view_name else 0
+            if rate and random.random() < rate:
+                return 'sampled'
+        return None
+
+    def _is_admin(self, request):
+        # Token authentication normally runs inside the DRF view, after middleware.
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                result = TokenAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                return False
+            user = result[0] if result else None
+        return IsAdminOrRoot().has_permission(SimpleNamespace(user=user), None)
+
+    def _save(self, request, response, trigger, sampler, query_count, duration_ms):
+        from .models import RequestProfile
+
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        view_name = self._view_name(request) or 'unresolved'
+        file_name = f'{time.strftime("%Y%m%d-%H%M%S")}-{view_name.replace(":", "-")}-{uuid.uuid4().hex[:8]}.folded'
+        with open(os.path.join(settings.PROFILING_DIR, file_name), 'w') as profile_file:
+            profile_file.write(sampler.folded())
+
+        user = getattr(request, 'user', None)
+        try:
+            return RequestProfile.objects.create(
+                view_name=view_name[:200],
+                method=request.method,
+                path=request.path[:500],
+                status_code=response.status_code,
+                duration_ms=duration_ms,
+                query_count=query_count,
+                sample_count=sampler.sample_count,
+                trigger=trigger,
+                file_name=file_name,
+                user=user if user is not None and user.is_authenticated else None,
+            )
+        except DatabaseError:
+            logger.exception('Could not record the profile of %s', request.path)
+            return None
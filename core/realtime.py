@@ -0,0 +1,298 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.cache import SQLiteInvalidationChannel
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """One WebSocket connection: its topics and a bounded queue of encoded events."""
+
+    def __init__(self, user, topics, queue_size):
+        self.user = user
+        self.topics = set(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # Runs on the subscriber's event loop.
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Hub:
+    """Fans events out to the WebSocket subscribers of this process.
+
+    ``dispatch`` may be called from any thread; messages reach each subscriber's
+    event loop through ``call_soon_threadsafe``. Snapshot topics are debounced:
+    an event on one of their source topics only marks them stale, and one task
+    per process recomputes and pushes the snapshot at most every
+    ``REALTIME_SNAPSHOT_INTERVAL`` seconds, and only while someone listens.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._snapshots = {}
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._task = None
+
+    def register_snapshot(self, topic, function, sources):
+        self._snapshots[topic] = (function, frozenset(sources))
+
+    def has_snapshot(self, topic):
+        return topic in self._snapshots
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+        if self._snapshots and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._refresh_snapshots())
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def dispatch(self, topic, message):
+        with self._lock:
+            subscribers = [subscriber for subscriber in self._subscribers if topic in subscriber.topics]
+            for name, (_, sources) in self._snapshots.items():
+                if topic in sources:
+                    self._stale.add(name)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, message)
+            except RuntimeError:
+                # The subscriber's loop is closed; it is about to unsubscribe.
+                pass
+
+    def snapshot(self, topic):
+        function, _ = self._snapshots[topic]
+        close_old_connections()
+        try:
+            return encode(topic, 'snapshot', function())
+        finally:
+            close_old_connections()
+
+    async def _refresh_snapshots(self):
+        while True:
+            await asyncio.sleep(settings.REALTIME_SNAPSHOT_INTERVAL)
+            with self._lock:
+                if not self._subscribers:
+                    self._task = None
+                    return
+                listened = {topic for subscriber in self._subscribers for topic in subscriber.topics}
+                stale, self._stale = self._stale & listened, self._stale - listened
+            for topic in stale:
+                try:
+                    message = await sync_to_async(self.snapshot)(topic)
+                except Exception:
+                    logger.exception('Could not build the %s snapshot', topic)
+                    continue
+                self.dispatch(topic, message)
+
+
+class LocalBroker:
+    """Delivers events to the subscribers of this process only.
+
+    Enough for a single ASGI worker, and the stand-in used in development and
+    tests. A shared broker implements the same ``publish`` and ``start``.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, topic, message):
+        self.hub.dispatch(topic, message)
+
+    def start(self):
+        pass
+
+
+class SQLiteBroker(LocalBroker):
+    """Shares events between the processes of one host through a SQLite log.
+
+    Events are delivered locally right away and appended to the log; a thread,
+    started in each process with subscribers, polls the log every
+    ``poll_interval`` seconds and dispatches events written by other processes.
+    """
+
+    def __init__(self, hub, path=None, poll_interval=0.2, retention=60):
+        super().__init__(hub)
+        self.poll_interval = poll_interval
+        self._log = SQLiteInvalidationChannel(path, poll_interval=0, retention=retention)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, topic, message):
+        super().publish(topic, message)
+        self._log.publish([json.dumps([topic, message])])
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._log.poll()  # Start from the current end of the log.
+            self._thread = threading.Thread(target=self._run, name='realtime-broker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                entries = self._log.poll()
+            except Exception:
+                logger.exception('Could not read the realtime event log')
+                continue
+            for entry in entries:
+                topic, message = json.loads(entry)
+                self.hub.dispatch(topic, message)
+
+
+hub = Hub()
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_class = import_string(settings.REALTIME_BROKER)
+                _broker = broker_class(hub, **settings.REALTIME_BROKER_OPTIONS)
+    return _broker
+
+
+def encode(topic, event, data):
+    return json.dumps({'topic': topic, 'event': event, 'data': data}, cls=DjangoJSONEncoder)
+
+
+def publish(topic, event, data):
+    """Push ``event`` to the subscribers of ``topic`` once the transaction commits."""
+    message = encode(topic, event, data)
+    transaction.on_commit(lambda: get_broker().publish(topic, message))
+
+
+def authenticate(scope):
+    """Return the user for a WebSocket handshake, or None.
+
+    Browsers cannot set headers on a WebSocket, so the DRF token is also
+    accepted as the ``token`` query parameter.
+    """
+    headers = dict(scope.get('headers', []))
+    keyword, _, value = headers.get(b'authorization', b'').decode('latin1').partition(' ')
+    if keyword.lower() == 'token' and value:
+        key = value.strip()
+    else:
+        key = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    if not key:
+        return None
+
+    close_old_connections()
+    try:
+        user, _ = TokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    finally:
+        close_old_connections()
+    return user
+
+
+def allowed_topics(user, requested):
+    topics = set()
+    for topic in requested:
+        roles = settings.REALTIME_TOPICS.get(topic, ())
+        if topic in settings.REALTIME_TOPICS and (not roles or getattr(user, 'role', None) in roles):
+            topics.add(topic)
+    return topics
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for ``REALTIME_PATH``.
+
+    Clients pick topics with ``?topics=customers,statistics`` or by sending
+    ``{"subscribe": [...]}`` / ``{"unsubscribe": [...]}``. Subscribing to a
+    snapshot topic sends the current snapshot at once. When a client falls too
+    far behind its queue is dropped and it receives a ``resync`` event, after
+    which it should reload through the sync endpoints.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'] != settings.REALTIME_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    user = await sync_to_async(authenticate)(scope)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    requested = parse_qs(scope.get('query_string', b'').decode()).get('topics', [''])[0].split(',')
+    subscriber = Subscriber(user, allowed_topics(user, requested), settings.REALTIME_QUEUE_SIZE)
+    await send({'type': 'websocket.accept'})
+
+    get_broker().start()
+    hub.subscribe(subscriber)
+    try:
+        await _send_snapshots(subscriber, subscriber.topics)
+        sender = asyncio.ensure_future(_send_events(subscriber, send))
+        try:
+            await _receive_commands(subscriber, receive)
+        finally:
+            sender.cancel()
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+async def _send_snapshots(subscriber, topics):
+    for topic in topics:
+        if hub.has_snapshot(topic):
+            subscriber.deliver(await sync_to_async(hub.snapshot)(topic))
+
+
+async def _send_events(subscriber, send):
+    while True:
+        message = await subscriber.queue.get()
+        if subscriber.overflowed:
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.overflowed = False
+            message = encode(None, 'resync', None)
+        await send({'type': 'websocket.send', 'text': message})
+
+
+async def _receive_commands(subscriber, receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        if message['type'] != 'websocket.receive' or not message.get('text'):
+            continue
+        try:
+            command = json.loads(message['text'])
+        except ValueError:
+            continue
+        if not isinstance(command, dict):
+            continue
+        added = allowed_topics(subscriber.user, command.get('subscribe') or ()) - subscriber.topics
+        # Replace rather than mutate: other threads read the set while dispatching.
+        subscriber.topics = (subscriber.topics | added) - set(command.get('unsubscribe') or ())
+        await _send_snapshots(subscriber, added)
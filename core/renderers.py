@@ -0,0 +1,81 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson formats datetimes like DRF's encoder once UTC is written as 'Z'; dataclasses,
+# Decimal, lazy strings and everything else unknown go through DRF's encoder.
+ORJSON_OPTIONS = (
+    orjson.OPT_UTC_Z | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+    if orjson is not None else 0
+)
+
+
+# repr() (and so the stdlib encoder) switches to exponent notation outside this
+# range; orjson does not at the low end and writes '1e16' instead of '1e+16'.
+_FIXED_FLOATS = (1e-4, 1e16)
+
+
+def _awkward(value):
+    # math.isfinite is not needed: NaN fails the range test and inf is above it.
+    return value and not _FIXED_FLOATS[0] <= abs(value) < _FIXED_FLOATS[1]
+
+
+def _has_awkward_float(data):
+    """True if ``data`` holds a float orjson would write differently from the stdlib.
+
+    That is a non-zero float outside ``_FIXED_FLOATS`` or one that is not finite
+    (orjson writes NaN and Infinity as null). Scalars are skipped by exact type,
+    which keeps the walk to a fraction of the rendering time.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            value = value.values()
+        elif not isinstance(value, (list, tuple)):
+            if isinstance(value, float) and _awkward(value):
+                return True
+            continue
+        for item in value:
+            kind = type(item)
+            if kind is str or kind is int or kind is bool or item is None:
+                continue
+            if kind is float:
+                if _awkward(item):
+                    return True
+            else:
+                stack.append(item)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that serializes with orjson when it is installed.
+
+    Only compact, non-ASCII-escaped output (DRF's defaults) is handled by orjson;
+    indented output, other settings, values orjson rejects (such as integers
+    wider than 64 bits) and floats it formats differently (very small, very
+    large or not finite) fall back to the stdlib renderer, which also raises
+    ValueError for NaN and Infinity under STRICT_JSON. Floats produced by the
+    encoder's ``default`` (inside dataclasses, for example) are not checked.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if _has_awkward_float(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same JavaScript-safety escaping as JSONRenderer.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
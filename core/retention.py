@@ -0,0 +1,148 @@
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import serializers
+from django.db import router, transaction
+from django.db.models import Q
+from django.db.models.deletion import Collector
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .models import ArchivedRecord, BaseModel, Counter, RequestProfile, SyncTombstone
+
+
+@dataclass
+class PurgeResult:
+    label: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        if not self.seconds:
+            return float(self.rows)
+        return self.rows / self.seconds
+
+
+def soft_delete_models():
+    return [model for model in apps.get_models() if issubclass(model, BaseModel)]
+
+
+def archive_rows(model, rows, using):
+    """Copy ``rows`` (instances or a queryset of ``model``) to ``ArchivedRecord``."""
+    records = [
+        ArchivedRecord(
+            model_label=model._meta.label,
+            object_pk=str(row['pk']),
+            payload=row['fields'],
+            deleted_at=row['fields'].get('deleted_at'),
+        )
+        for row in serializers.serialize('python', rows)
+    ]
+    ArchivedRecord.objects.using(using).bulk_create(records)
+
+
+def archive_collected(collector):
+    """Archive every row ``collector`` is about to delete, cascaded ones included.
+
+    Rows kept by SET_NULL or similar handlers are not deleted and not archived.
+    """
+    for queryset in collector.fast_deletes:
+        archive_rows(queryset.model, queryset, collector.using)
+    for model, instances in collector.data.items():
+        archive_rows(model, instances, collector.using)
+
+
+def purge_in_batches(queryset, batch_size, archive=False, pause=0):
+    """Delete the rows of ``queryset`` in short transactions of ``batch_size`` rows.
+
+    Each batch locks its rows with ``FOR UPDATE SKIP LOCKED`` so rows being edited
+    by a request are left for the next run instead of blocking it. With
+    ``archive`` the rows, and the related rows their deletion cascades to, are
+    copied to ``ArchivedRecord`` first.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    started = time.monotonic()
+    total = 0
+
+    while True:
+        with transaction.atomic(using=using):
+            pks = list(
+                queryset.using(using)
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            # What QuerySet.delete() does, with a look at the collected rows in between.
+            collector = Collector(using=using, origin=queryset)
+            collector.collect(model._base_manager.using(using).filter(pk__in=pks).order_by())
+            if archive:
+                archive_collected(collector)
+            collector.delete()
+
+        total += len(pks)
+        if len(pks) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    return PurgeResult(model._meta.label, total, time.monotonic() - started)
+
+
+def purge_soft_deleted(days, batch_size, archive=True, pause=0):
+    cutoff = timezone.now() - timedelta(days=days)
+    return [
+        purge_in_batches(
+            model._base_manager.filter(deleted_at__lt=cutoff),
+            batch_size, archive=archive, pause=pause
+        )
+        for model in soft_delete_models()
+    ]
+
+
+def purge_sessions(batch_size, pause=0):
+    queryset = Session.objects.filter(expire_date__lt=timezone.now())
+    return purge_in_batches(queryset, batch_size, pause=pause)
+
+
+def purge_tokens(batch_size, max_age_days=0, pause=0):
+    stale = Q(user__deleted_at__isnull=False) | Q(user__is_active=False)
+    if max_age_days:
+        stale |= Q(created__lt=timezone.now() - timedelta(days=max_age_days))
+    return purge_in_batches(Token.objects.filter(stale), batch_size, pause=pause)
+
+
+def purge_tombstones(days, batch_size, pause=0):
+    """Delete sync tombstones older than any cursor a client may still send."""
+    queryset = SyncTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    return purge_in_batches(queryset, batch_size, pause=pause)
+
+
+def purge_profiles(days, batch_size, pause=0):
+    """Delete request profiles older than ``days`` and their folded stack files.
+
+    Files are matched by age rather than by row, so files whose row was never
+    saved are removed too.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    result = purge_in_batches(RequestProfile.objects.filter(created_at__lt=cutoff), batch_size, pause=pause)
+    directory = Path(settings.PROFILING_DIR)
+    if directory.is_dir():
+        for path in directory.glob('*.folded'):
+            if path.stat().st_mtime < cutoff.timestamp():
+                path.unlink(missing_ok=True)
+    return result
+
+
+def purge_counters(batch_size, pause=0):
+    """Delete counters whose timeout has passed."""
+    queryset = Counter.objects.filter(expires_at__lt=timezone.now())
+    return purge_in_batches(queryset, batch_size, pause=pause)
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent once per queryset operation with ``sender`` (the model class) and ``pks``.
+bulk_soft_deleted = Signal()
+bulk_restored = Signal()
+bulk_hard_deleted = Signal()
@@ -0,0 +1,277 @@
+import contextvars
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_recording = contextvars.ContextVar('slow_query_recording', default=False)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"")
+_NUMBER = re.compile(r'\b\d+(\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(%s|\?)(\s*,\s*(%s|\?))+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+def normalize(sql):
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(%s, ...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+@dataclass
+class SlowQueryEntry:
+    fingerprint: str
+    sql: str
+    params: object
+    alias: str
+    duration_ms: float
+    origin: str
+    stack: list
+    seen_at: object = field(default_factory=timezone.now)
+
+
+def capture_stack():
+    """Project frames of the current stack, innermost last."""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+    return [
+        f'{os.path.relpath(frame.filename, base_dir)}:{frame.lineno} in {frame.name}'
+        for frame in frames[-settings.SLOW_QUERY_STACK_DEPTH:]
+    ]
+
+
+def describe_params(params):
+    """The types of ``params``; the values are not stored, as they can be tokens or password hashes."""
+    if params is None:
+        return ''
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+def explain(alias, sql, params):
+    """Return the planner's plan for ``sql`` without executing it, or ''.
+
+    ``params`` is None for ``executemany`` batches, which are not explained.
+    PostgreSQL prints bound values as literals in plans and errors, so string
+    literals are masked before the plan is stored.
+    """
+    if params is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return ''
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE off) '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        return ''
+    try:
+        # A failed EXPLAIN aborts the surrounding PostgreSQL transaction unless
+        # it runs in its own savepoint.
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            plan = '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+            return _STRING.sub("'?'", plan)
+    except DatabaseError as exc:
+        return f'EXPLAIN failed: {_QUOTED.sub("?", str(exc))}'
+
+
+class SlowQueryRecorder:
+    """Keeps recent slow queries in a ring buffer and aggregates them in ``SlowQuery``.
+
+    ``add`` is called from the request thread and only appends to the buffer and
+    a queue. A daemon thread, started per process, drains the queue, runs
+    EXPLAIN on its own connection and updates one row per statement
+    fingerprint. When the queue is full entries are dropped from the table but
+    stay in the buffer: the log must never slow down the queries it watches.
+    """
+
+    def __init__(self, buffer_size, max_queue_size, sample_size):
+        self.sample_size = sample_size
+        self.recent = deque(maxlen=buffer_size)
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def add(self, entry):
+        self.recent.append(entry)
+        if not settings.SLOW_QUERY_ASYNC:
+            self.write([entry])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            logger.warning('Slow query queue full, not recording %s', entry.fingerprint)
+
+    def flush(self):
+        entries = []
+        while True:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if entries:
+            self.write(entries)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='slow-query-recorder', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            entries = [self._queue.get()]
+            while len(entries) < 100:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.write(entries)
+
+    def write(self, entries):
+        token = _recording.set(True)
+        try:
+            for entry in entries:
+                self._store(entry)
+        except DatabaseError:
+            logger.exception('Could not record %d slow queries', len(entries))
+            close_old_connections()
+        finally:
+            _recording.reset(token)
+
+    def _store(self, entry):
+        from .models import SlowQuery
+
+        with transaction.atomic():
+            SlowQuery.objects.get_or_create(
+                fingerprint=entry.fingerprint,
+                defaults={'statement': normalize(entry.sql), 'origin': entry.origin},
+            )
+            row = SlowQuery.objects.select_for_update().get(fingerprint=entry.fingerprint)
+
+            row.count += 1
+            row.total_ms += entry.duration_ms
+            row.max_ms = max(row.max_ms, entry.duration_ms)
+            row.durations = (row.durations + [round(entry.duration_ms, 3)])[-self.sample_size:]
+            durations = sorted(row.durations)
+            row.p50_ms = percentile(durations, 0.50)
+            row.p95_ms = percentile(durations, 0.95)
+            row.p99_ms = percentile(durations, 0.99)
+
+            origins = dict(row.origins, **{entry.origin: row.origins.get(entry.origin, 0) + 1})
+            row.origins = dict(sorted(origins.items(), key=lambda item: -item[1])[:20])
+            row.origin = entry.origin
+            row.stack = '\n'.join(entry.stack)
+            row.example_params = describe_params(entry.params)[:1000]
+            row.last_seen = entry.seen_at
+
+            stale = timezone.now() - timedelta(seconds=settings.SLOW_QUERY_EXPLAIN_INTERVAL)
+            if settings.SLOW_QUERY_EXPLAIN and (row.plan_at is None or row.plan_at < stale):
+                row.plan = explain(entry.alias, entry.sql, entry.params)
+                row.plan_at = timezone.now()
+            row.save()
+
+
+recorder = SlowQueryRecorder(
+    buffer_size=settings.SLOW_QUERY_BUFFER_SIZE,
+    max_queue_size=settings.SLOW_QUERY_QUEUE_SIZE,
+    sample_size=settings.SLOW_QUERY_SAMPLE_SIZE,
+)
+
+
+class SlowQueryWrapper:
+    def __init__(self, alias, origin):
+        self.alias = alias
+        self.origin = origin
+
+    def __call__(self, execute, sql, params, many, context):
+        if _recording.get():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+            recorder.add(SlowQueryEntry(
+                fingerprint=fingerprint(sql),
+                sql=sql,
+                params=None if many else params,
+                alias=self.alias,
+                duration_ms=duration_ms,
+                origin=self.origin(),
+                stack=capture_stack(),
+            ))
+        return result
+
+
+@contextmanager
+def record_slow_queries(origin):
+    """Record queries slower than ``SLOW_QUERY_THRESHOLD_MS`` run inside the block.
+
+    ``origin`` is a callable returning the label stored with each query.
+    """
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(SlowQueryWrapper(alias, origin)))
+        yield
+
+
+def view_origin(request):
+    """``ViewClass.action`` for the view serving ``request``, e.g. ``CustomerViewSet.statistics``."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path[:200]
+    view_class = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    if view_class is None:
+        return match._func_path[:200]
+    method = request.method.lower()
+    action = (getattr(match.func, 'actions', None) or {}).get(method, method)
+    return f'{view_class.__name__}.{action}'[:200]
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_slow_queries(lambda: view_origin(request)):
+            return self.get_response(request)
@@ -0,0 +1,144 @@
+import base64
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import SyncTombstone
+
+
+class SyncCursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The sync cursor is older than the retention period; start a full sync.'
+    default_code = 'sync_cursor_expired'
+
+
+def encode_cursor(updated_at, pk):
+    raw = f'{updated_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        updated_at = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        updated_at = None
+    if updated_at is None:
+        raise ValidationError({'changed_since': 'Invalid sync cursor.'})
+    return updated_at, pk
+
+
+class DeltaSyncMixin:
+    """Adds a ``sync`` action that returns rows changed after a cursor.
+
+    Rows are walked in ``(updated_at, id)`` order, including soft-deleted ones,
+    which are returned as tombstones, through the view's ``get_queryset()``.
+    Hard-deleted rows are merged in from ``SyncTombstone`` by their deletion
+    time. Clients store ``next_cursor`` and send it back as ``changed_since``
+    on their next sync; omitting it starts a full sync.
+
+    ``updated_at`` is stamped before the writing transaction commits, so a row
+    can become visible behind rows a client already received. The cursor
+    therefore never moves past rows younger than ``SYNC_SETTLE_SECONDS``; they
+    are returned and sent again on the next sync, and clients apply rows as
+    upserts. Tombstones are purged after ``RETENTION_DAYS``, so an older cursor
+    gets a 410 response and the client must start over with a full sync.
+    """
+
+    sync_page_size = 500
+    sync_max_page_size = 1000
+
+    def get_queryset(self):
+        if getattr(self, 'action', None) != 'sync':
+            return super().get_queryset()
+        # Views narrow this further in their own get_queryset().
+        return self.queryset.model.objects.all_objects()
+
+    def get_sync_queryset(self):
+        return self.get_queryset()
+
+    def get_sync_tombstones(self):
+        return SyncTombstone.objects.filter(model_label=self.queryset.model._meta.label)
+
+    def get_sync_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', self.sync_page_size))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        return max(1, min(limit, self.sync_max_page_size))
+
+    @extend_schema(
+        summary="Delta sync",
+        parameters=[
+            OpenApiParameter(name='changed_since', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, required=False),
+            OpenApiParameter(name='limit', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, required=False),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=['get'], url_path='sync')
+    def sync(self, request):
+        queryset = self.get_sync_queryset()
+        tombstones = self.get_sync_tombstones()
+        cursor = request.query_params.get('changed_since')
+        now = timezone.now()
+        if cursor:
+            updated_at, pk = decode_cursor(cursor)
+            if updated_at < now - timedelta(days=settings.RETENTION_DAYS):
+                raise SyncCursorExpired()
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk)
+            )
+            tombstones = tombstones.filter(
+                Q(deleted_at__gt=updated_at) | Q(deleted_at=updated_at, object_pk__gt=pk)
+            )
+
+        limit = self.get_sync_limit()
+        entries = sorted(
+            [(row.updated_at, row.pk, row) for row in queryset.order_by('updated_at', 'pk')[:limit + 1]]
+            + [
+                (deleted_at, pk, None)
+                for deleted_at, pk in tombstones.order_by('deleted_at', 'object_pk').values_list(
+                    'deleted_at', 'object_pk'
+                )[:limit + 1]
+            ],
+            key=lambda entry: entry[:2]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        changed = [row for _, _, row in entries if row is not None and row.deleted_at is None]
+        deleted = [
+            {'id': pk, 'deleted_at': timestamp if row is None else row.deleted_at, 'updated_at': timestamp}
+            for timestamp, pk, row in entries if row is None or row.deleted_at is not None
+        ]
+
+        # Entries are in updated_at order, so the settled ones come first.
+        settled_before = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+        settled = [entry for entry in entries if entry[0] <= settled_before]
+        if settled:
+            last = settled[-1]
+        elif has_more:
+            # A whole page written within the settle window: move on rather than repeat it.
+            last = entries[-1]
+        else:
+            last = None
+        next_cursor = encode_cursor(last[0], last[1]) if last else cursor
+
+        return Response({
+            'results': self.get_serializer(changed, many=True).data,
+            'deleted': deleted,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+        })
@@ -0,0 +1,258 @@
+import io
+import math
+import random
+import unicodedata
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from django.apps import apps
+from django.db import connection, transaction
+
+# Rows are drawn from one random stream per block, so the data depends on the
+# seed and the row counts but not on how the work is split between processes.
+BLOCK_SIZE = 1000
+
+FIRST_NAMES = {
+    'male': [
+        'Alejandro', 'Andrés', 'Carlos', 'Daniel', 'David', 'Diego', 'Felipe', 'Jorge',
+        'José', 'Juan', 'Julián', 'Luis', 'Mateo', 'Miguel', 'Nicolás', 'Óscar',
+        'Ricardo', 'Samuel', 'Santiago', 'Sebastián', 'Tomás',
+    ],
+    'female': [
+        'Ana', 'Andrea', 'Camila', 'Carolina', 'Daniela', 'Diana', 'Gabriela', 'Isabella',
+        'Laura', 'Lucía', 'Manuela', 'María', 'Mariana', 'Natalia', 'Paula', 'Sara',
+        'Sofía', 'Valentina', 'Valeria',
+    ],
+}
+ALL_FIRST_NAMES = FIRST_NAMES['male'] + FIRST_NAMES['female']
+LAST_NAMES = [
+    'Álvarez', 'Castro', 'Díaz', 'Fernández', 'García', 'Gómez', 'González', 'Gutiérrez',
+    'Hernández', 'Jiménez', 'López', 'Martínez', 'Moreno', 'Muñoz', 'Ortiz', 'Pérez',
+    'Ramírez', 'Restrepo', 'Rodríguez', 'Rojas', 'Romero', 'Ruiz', 'Sánchez', 'Torres',
+    'Vargas', 'Vásquez', 'Zapata', 'Cardona', 'Osorio', 'Mejía', 'Ospina', 'Quintero',
+]
+PREFERENCES = [
+    'Prefers table 3', 'Prefers a table near the window', 'Plays carom billiards',
+    'Plays pool', 'Plays snooker on weekends', 'Comes with friends', 'Usually plays alone',
+    'Brings own cue', 'Orders coffee', 'Orders soft drinks only', 'Pays by card',
+    'Pays in cash', 'Tournament player', 'Prefers quiet hours', 'Books in advance',
+    'Birthday celebrations', 'Asks for the league schedule',
+]
+EMAIL_DOMAINS = ['example.com', 'example.org', 'example.net']
+
+# Share of each value; None stands for an empty column.
+FRECUENCY_WEIGHTS = {'OCCASIONAL': 60, 'REGULAR': 28, 'FREQUENT': 12}
+GENDER_WEIGHTS = {'male': 47, 'female': 47, 'other': 2, None: 4}
+ADMIN_FRACTION = 0.01
+PHONE_FRACTION = 0.6
+BIRTHDAY_FRACTION = 0.75
+LOGIN_FRACTION = 0.7
+VERIFIED_FRACTION = 0.9
+GOOGLE_FRACTION = 0.7
+NO_PREFERENCES_FRACTION = 0.45
+NEAR_DUPLICATE_FRACTION = 0.03
+TABLE_SUFFIX_FRACTION = 0.2
+
+USER_COLUMNS = (
+    'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name',
+    'is_staff', 'is_active', 'date_joined', 'created_at', 'updated_at', 'deleted_at',
+    'email', 'phone', 'image_profile', 'birthday', 'gender', 'role',
+)
+CUSTOMER_COLUMNS = ('created_at', 'updated_at', 'deleted_at', 'frecuency', 'description', 'preferences')
+
+
+@dataclass(frozen=True)
+class Plan:
+    """What to generate: ``total`` rows of one kind, ending at ``end``."""
+    kind: str
+    seed: int
+    offset: int
+    total: int
+    end: datetime
+    days: int
+    deleted_fraction: float
+    social_fraction: float = 0.0
+    password: str = ''
+
+    def rng(self, block_start):
+        return random.Random(f'{self.seed}:{self.kind}:{block_start // BLOCK_SIZE}')
+
+    def created_at(self, rng, position):
+        # Sign-ups grow over time: the count up to t rises with (t / span) ** 2.
+        span = timedelta(days=self.days)
+        return self.end - span + span * math.sqrt((position + rng.random()) / self.total)
+
+    def blocks(self, start, stop):
+        for block_start in range(start - start % BLOCK_SIZE, stop, BLOCK_SIZE):
+            yield max(block_start, start), min(block_start + BLOCK_SIZE, stop)
+
+
+def _choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _ascii(text):
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode().lower()
+
+
+def _history(plan, rng, position):
+    """``created_at``, ``updated_at`` and ``deleted_at`` of one row."""
+    created = plan.created_at(rng, position)
+    # Most rows are edited soon after creation, if at all.
+    updated = created + (plan.end - created) * rng.random() ** 3
+    deleted = updated if rng.random() < plan.deleted_fraction else None
+    return created, updated, deleted
+
+
+def user_block(plan, start, stop):
+    """Rows for users ``start``..``stop`` (positions in the plan) and, per row,
+    ``(verified, social)`` for its email address and social account."""
+    rng = plan.rng(start)
+    rows, accounts = [], []
+    for position in range(start - start % BLOCK_SIZE, stop):
+        index = plan.offset + position
+        gender = _choice(rng, GENDER_WEIGHTS)
+        first = rng.choice(FIRST_NAMES.get(gender, ALL_FIRST_NAMES))
+        last = rng.choice(LAST_NAMES)
+        username = f'{_ascii(first)}.{_ascii(last)}{index}'
+        created, updated, deleted = _history(plan, rng, position)
+        last_login = None
+        if rng.random() < LOGIN_FRACTION:
+            last_login = plan.end - (plan.end - created) * rng.random() ** 2
+        role = 'admin' if rng.random() < ADMIN_FRACTION else 'client'
+        phone = f'+57 3{index:09d}' if rng.random() < PHONE_FRACTION else None
+        birthday = None
+        if rng.random() < BIRTHDAY_FRACTION:
+            age = int(rng.triangular(18, 75, 30))
+            birthday = date(plan.end.year - age, 1, 1) + timedelta(days=rng.randrange(365))
+        email = f'{username}@{rng.choice(EMAIL_DOMAINS)}'
+        verified = rng.random() < VERIFIED_FRACTION
+
+        social = None
+        if deleted is None and rng.random() < plan.social_fraction:
+            if rng.random() < GOOGLE_FRACTION:
+                uid = str(10 ** 20 + index)
+                social = ('google', uid, {
+                    'sub': uid, 'email': email, 'email_verified': True, 'name': f'{first} {last}',
+                    'given_name': first, 'family_name': last, 'locale': 'es',
+                })
+            else:
+                social = ('github', str(10 ** 6 + index), {
+                    'id': 10 ** 6 + index, 'login': username.replace('.', '-'),
+                    'name': f'{first} {last}', 'email': email,
+                })
+
+        if position < start:
+            continue
+        rows.append((
+            plan.password, last_login, False, username, first, last,
+            role == 'admin', deleted is None, created, created, updated, deleted,
+            email, phone, None, birthday, gender, role,
+        ))
+        accounts.append((verified, social))
+    return rows, accounts
+
+
+def _near_duplicate(rng, description):
+    """``description`` with a typo: a dropped, doubled or swapped letter."""
+    position = rng.randrange(1, len(description) - 1)
+    typo = rng.randrange(3)
+    if typo == 0:
+        return description[:position] + description[position + 1:]
+    if typo == 1:
+        return description[:position] + description[position] + description[position:]
+    return description[:position - 1] + description[position] + description[position - 1] + description[position + 1:]
+
+
+def customer_block(plan, start, stop):
+    """Rows for customers ``start``..``stop`` (positions in the plan)."""
+    rng = plan.rng(start)
+    rows, descriptions = [], []
+    for position in range(start - start % BLOCK_SIZE, stop):
+        created, updated, deleted = _history(plan, rng, position)
+        if descriptions and rng.random() < NEAR_DUPLICATE_FRACTION:
+            description = _near_duplicate(rng, rng.choice(descriptions))
+        else:
+            description = f'{rng.choice(ALL_FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            if rng.random() < TABLE_SUFFIX_FRACTION:
+                description += f' - Mesa {rng.randint(1, 12)}'
+            descriptions.append(description)
+        preferences = None
+        if rng.random() >= NO_PREFERENCES_FRACTION:
+            preferences = '. '.join(rng.sample(PREFERENCES, rng.randint(1, 3))) + '.'
+        frecuency = _choice(rng, FRECUENCY_WEIGHTS)
+
+        if position < start:
+            continue
+        rows.append((created, updated, deleted, frecuency, description, preferences))
+    return rows
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def insert_rows(model, columns, rows):
+    """Insert ``rows`` of values for the ``columns`` fields of ``model``.
+
+    PostgreSQL loads them with ``COPY``; other backends with one ``executemany``.
+    ``save()``, signals and ``auto_now`` are bypassed, so timestamps are kept.
+    """
+    if not rows:
+        return 0
+    fields = [model._meta.get_field(name) for name in columns]
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    prepared = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            data = io.StringIO(''.join('\t'.join(map(_copy_value, row)) + '\n' for row in prepared))
+            cursor.copy_expert(f'COPY {table} ({names}) FROM STDIN', data)
+        else:
+            placeholders = ', '.join(['%s'] * len(fields))
+            cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({placeholders})', prepared)
+    return len(rows)
+
+
+def _load_users(plan, start, stop):
+    from allauth.account.models import EmailAddress
+    from allauth.socialaccount.models import SocialAccount
+    from AUTH.models import UserCustom
+
+    rows, accounts = user_block(plan, start, stop)
+    insert_rows(UserCustom, USER_COLUMNS, rows)
+    usernames = [row[3] for row in rows]
+    pks = dict(UserCustom._base_manager.filter(username__in=usernames).values_list('username', 'pk'))
+
+    emails, socials = [], []
+    for row, (verified, social) in zip(rows, accounts):
+        pk = pks[row[3]]
+        emails.append((pk, row[12], verified, True))
+        if social:
+            provider, uid, extra_data = social
+            socials.append((pk, provider, uid, row[1] or row[8], row[8], extra_data))
+    insert_rows(EmailAddress, ('user', 'email', 'verified', 'primary'), emails)
+    insert_rows(SocialAccount, ('user', 'provider', 'uid', 'last_login', 'date_joined', 'extra_data'), socials)
+    return len(rows)
+
+
+def _load_customers(plan, start, stop):
+    return insert_rows(apps.get_model('CLIENTS', 'Customer'), CUSTOMER_COLUMNS, customer_block(plan, start, stop))
+
+
+def load_range(plan, start, stop):
+    """Generate and insert rows ``start``..``stop`` of ``plan`` in one transaction."""
+    load = _load_users if plan.kind == 'users' else _load_customers
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Losing a generated chunk to a crash is harmless; waiting for the WAL flush is not free.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL synchronous_commit = off')
+        return sum(load(plan, *block) for block in plan.blocks(start, stop))
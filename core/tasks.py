@@ -0,0 +1,251 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class TaskFunction:
+    """A function registered with ``@task``; call ``enqueue`` to run it in a worker."""
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, run_at=None, **kwargs):
+        return enqueue(self.name, *args, run_at=run_at, **kwargs)
+
+
+def task(name=None, max_attempts=None):
+    """Register a function as a background task.
+
+    Arguments must be JSON serializable: pass primary keys, not model instances.
+    Delivery is at least once: a task whose worker dies is run again once its
+    lock expires, so tasks must be safe to repeat.
+    """
+    def decorator(func):
+        registered = TaskFunction(
+            func,
+            name or f'{func.__module__}.{func.__qualname__}',
+            max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        )
+        _registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def get_task(name):
+    if name not in _registry:
+        # Worker processes only import task modules on demand.
+        autodiscover_modules('tasks')
+    return _registry[name]
+
+
+def enqueue(name, *args, run_at=None, **kwargs):
+    """Store a task row; it is visible to workers when the current transaction commits.
+
+    With ``TASKS_ALWAYS_EAGER`` the task runs on commit in this process instead.
+    """
+    registered = get_task(name)
+    if settings.TASKS_ALWAYS_EAGER:
+        transaction.on_commit(lambda: registered(*args, **kwargs))
+        return None
+    return Task.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=registered.max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retry ``attempts + 1``: exponential, with jitter so
+    tasks that failed together do not retry together."""
+    ceiling = min(settings.TASKS_BACKOFF_MAX, settings.TASKS_BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def claim(limit, worker_id):
+    """Lock up to ``limit`` due tasks for this worker and return them.
+
+    Rows are picked with ``FOR UPDATE SKIP LOCKED``, so concurrent workers never
+    wait for each other or take the same task. ``Worker`` refreshes the lock of
+    the tasks it runs; one not refreshed for ``TASKS_LOCK_TIMEOUT`` seconds
+    belongs to a worker that died and is taken over, or marked failed if it has
+    used all its attempts.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    token = f'{worker_id}:{uuid.uuid4().hex[:8]}'
+    abandoned = Task.objects.filter(status='running', locked_at__lt=stale, attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, locked_at=None, locked_by='',
+        last_error='The worker running the last attempt stopped without finishing it.',
+    )
+    if abandoned:
+        logger.error('%d task(s) failed: their last attempt was abandoned', abandoned)
+    with transaction.atomic():
+        pks = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending', run_at__lte=now) | Q(status='running', locked_at__lt=stale))
+            .order_by('run_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not pks:
+            return []
+        # The status condition keeps backends without row locks (SQLite) from
+        # handing one task to two workers.
+        Task.objects.filter(
+            Q(status='pending') | Q(status='running', locked_at__lt=stale), pk__in=pks
+        ).update(status='running', locked_at=now, locked_by=token, attempts=F('attempts') + 1)
+    return list(Task.objects.filter(pk__in=pks, locked_by=token))
+
+
+def execute(task_row):
+    """Run one claimed task and record its outcome; returns True on success."""
+    try:
+        get_task(task_row.name)(*task_row.args, **task_row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if task_row.attempts >= task_row.max_attempts:
+            logger.error('Task %s #%s failed after %d attempts', task_row.name, task_row.pk, task_row.attempts)
+            _finish(task_row, status='failed', last_error=error, finished_at=timezone.now())
+        else:
+            delay = backoff(task_row.attempts)
+            logger.warning('Task %s #%s failed, retrying in %.0fs', task_row.name, task_row.pk, delay)
+            _finish(
+                task_row, status='pending', last_error=error,
+                run_at=timezone.now() + timedelta(seconds=delay), locked_at=None, locked_by='',
+            )
+        return False
+    _finish(task_row, status='succeeded', finished_at=timezone.now(), locked_at=None, locked_by='')
+    return True
+
+
+def _finish(task_row, **values):
+    # Only the worker still holding the lock may record the outcome.
+    Task.objects.filter(pk=task_row.pk, locked_by=task_row.locked_by).update(**values)
+
+
+def run_pending(worker_id='inline', limit=100):
+    """Run every due task in this thread; returns the number run."""
+    count = 0
+    while True:
+        claimed = claim(limit, worker_id)
+        if not claimed:
+            return count
+        for task_row in claimed:
+            execute(task_row)
+            count += 1
+
+
+def purge_finished(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return Task.objects.filter(status='succeeded', finished_at__lt=cutoff).delete()[0]
+
+
+class Worker:
+    """Claims due tasks and runs them on a pool of ``concurrency`` threads.
+
+    Each thread uses its own database connection. While tasks run, the worker
+    refreshes their ``locked_at`` every third of ``TASKS_LOCK_TIMEOUT``, so a
+    long task is not taken over by another worker. ``stop`` lets running tasks
+    finish; unclaimed tasks stay in the table for the next worker.
+    """
+
+    def __init__(self, concurrency, poll_interval):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'[:80]
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def _run_one(self, task_row):
+        close_old_connections()
+        try:
+            return execute(task_row)
+        except Exception:
+            # The row stays locked and is retried once TASKS_LOCK_TIMEOUT expires.
+            logger.exception('Could not record the outcome of task %s #%s', task_row.name, task_row.pk)
+            return False
+        finally:
+            connection.close()
+
+    def heartbeat(self, task_rows):
+        """Move the lock of ``task_rows``, which this worker is running, to now."""
+        try:
+            Task.objects.filter(
+                pk__in=[task_row.pk for task_row in task_rows],
+                locked_by__in={task_row.locked_by for task_row in task_rows},
+                status='running',
+            ).update(locked_at=timezone.now())
+        except DatabaseError:
+            logger.exception('Could not refresh the lock of %d running task(s)', len(task_rows))
+
+    def run(self, burst=False):
+        autodiscover_modules('tasks')
+        running = {}
+        next_purge = timezone.now()
+        next_heartbeat = time.monotonic() + settings.TASKS_LOCK_TIMEOUT / 3
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='task') as executor:
+            while not self._stop.is_set():
+                close_old_connections()
+                running = {future: task_row for future, task_row in running.items() if not future.done()}
+                free = self.concurrency - len(running)
+                claimed = claim(free, self.worker_id) if free else []
+                running.update((executor.submit(self._run_one, task_row), task_row) for task_row in claimed)
+
+                if not running:
+                    if burst:
+                        break
+                    self._stop.wait(self.poll_interval)
+                elif not claimed or len(running) >= self.concurrency:
+                    wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+
+                if running and time.monotonic() >= next_heartbeat:
+                    self.heartbeat(list(running.values()))
+                    next_heartbeat = time.monotonic() + settings.TASKS_LOCK_TIMEOUT / 3
+
+                if settings.TASKS_RETENTION_DAYS and timezone.now() >= next_purge:
+                    purge_finished(settings.TASKS_RETENTION_DAYS)
+                    next_purge = timezone.now() + timedelta(hours=1)
+            wait(running)
+
+
+@task(name='core.send_email')
+def send_email(subject, body, from_email, to, headers=None, alternatives=(), content_subtype='plain'):
+    """Send a message rendered in the request, e.g. by ``AUTH.adapters.CustomAccountAdapter``.
+
+    SMTP has no idempotency key: if the worker dies after sending but before
+    recording the outcome, the message is sent again.
+    """
+    message = EmailMultiAlternatives(subject, body, from_email, to, headers=headers)
+    for content, mimetype in alternatives:
+        message.attach_alternative(content, mimetype)
+    message.content_subtype = content_subtype
+    message.send()
@@ -0,0 +1,1047 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import batch, budgets, counters, db_routers, metrics, realtime, renderers, retention, synthetic, tasks
+from .cache import TieredCache
+from .models import ArchivedRecord, Counter, RequestProfile, SlowQuery, Task
+from .compression import CompressionMiddleware, brotli, negotiate_encoding
+from .paginator import EstimatedCountPaginator
+from .parsers import FastJSONParser
+from .slow_queries import fingerprint
+from .renderers import FastJSONRenderer
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-cache-tests',
+    },
+    'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle'},
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.channel_path = os.path.join(directory.name, 'invalidation.sqlite3')
+        self.worker_a = self._worker()
+        self.worker_b = self._worker()
+        self.addCleanup(self.worker_a.clear)
+
+    def _worker(self):
+        return TieredCache(None, {
+            'OPTIONS': {
+                'SHARED_ALIAS': 'shared',
+                'CHANNEL': 'core.cache.SQLiteInvalidationChannel',
+                'CHANNEL_OPTIONS': {'path': self.channel_path, 'poll_interval': 0},
+                'NAMESPACES': {'customer_list': 'customer_list', 'customer_': 'customer_detail'},
+            },
+        })
+
+    def test_write_in_one_worker_evicts_local_copy_in_another(self):
+        self.worker_a.set('customer_1', 'old')
+        self.assertEqual(self.worker_b.get('customer_1'), 'old')
+
+        self.worker_a.set('customer_1', 'new')
+        self.assertEqual(self.worker_b.get('customer_1'), 'new')
+
+        self.worker_a.delete_many(['customer_1'])
+        self.assertIsNone(self.worker_b.get('customer_1'))
+
+    def test_clear_is_broadcast(self):
+        self.worker_a.set('customer_list', [1, 2])
+        self.assertEqual(self.worker_b.get('customer_list'), [1, 2])
+
+        self.worker_a.clear()
+        self.assertIsNone(self.worker_b.get('customer_list'))
+
+    def test_stats_are_grouped_by_namespace(self):
+        self.worker_a.set('customer_1', 'value')
+        self.worker_a.get('customer_1')
+        self.worker_b.get('customer_1')
+        self.worker_b.get('customer_list')
+        self.worker_b.get('unrelated')
+
+        self.assertEqual(self.worker_a.stats()['customer_detail']['local_hits'], 1)
+        self.assertEqual(self.worker_b.stats(), {
+            'customer_detail': {'local_hits': 0, 'shared_hits': 1, 'misses': 0},
+            'customer_list': {'local_hits': 0, 'shared_hits': 0, 'misses': 1},
+            'other': {'local_hits': 0, 'shared_hits': 0, 'misses': 1},
+        })
+
+    def test_local_copy_expires_with_the_shared_key(self):
+        from django.core.cache import caches
+
+        self.worker_a.set('customer_1', 'short', 5)
+        self.assertEqual(self.worker_b.get('customer_1'), 'short')
+
+        # The shared tier expires the key by itself, without a broadcast.
+        caches['shared'].delete('customer_1')
+        wall, monotonic = time.time(), time.monotonic()
+        later = SimpleNamespace(time=lambda: wall + 6, monotonic=lambda: monotonic + 6)
+        with mock.patch('core.cache.time', later):
+            self.assertIsNone(self.worker_b.get('customer_1'))
+
+    def test_incr_keeps_the_expiry(self):
+        self.worker_a.set('customer_count', 1, 60)
+        self.assertEqual(self.worker_a.incr('customer_count'), 2)
+        self.assertEqual(self.worker_b.get('customer_count'), 2)
+        with self.assertRaises(ValueError):
+            self.worker_a.incr('missing')
+
+    def test_channel_prunes_periodically(self):
+        import sqlite3
+
+        from .cache import SQLiteInvalidationChannel
+
+        channel = SQLiteInvalidationChannel(self.channel_path, retention=0, prune_interval=3600)
+        for key in ('a', 'b', 'c'):
+            channel.publish([key])
+            time.sleep(0.001)
+
+        with sqlite3.connect(self.channel_path) as connection:
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM invalidations').fetchone()[0], 3)
+            indexes = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+        self.assertIn(('invalidations_created',), indexes)
+
+    def test_local_copies_are_isolated_from_caller_mutation(self):
+        value = {'ids': [1]}
+        self.worker_a.set('customer_list', value)
+        value['ids'].append(2)
+
+        self.assertEqual(self.worker_a.get('customer_list'), {'ids': [1]})
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_MAX_LAG_SECONDS=2, CACHES=SHARED_CACHES)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        db_routers.health.reset()
+        self.addCleanup(db_routers.health.reset)
+        self.router = db_routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _read_alias(self, lag=0.0):
+        with mock.patch.object(db_routers, 'replica_lag', return_value=lag):
+            return self.router.db_for_read(None)
+
+    def test_reads_go_to_healthy_replica(self):
+        self.assertEqual(self._read_alias(), 'replica_0')
+        self.assertEqual(self.router.db_for_write(None), 'default')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.assertEqual(self._read_alias(lag=10), 'default')
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch.object(db_routers, 'replica_lag', side_effect=DatabaseError):
+            self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_client_sticks_to_primary_after_write(self):
+        seen = []
+
+        def view(request):
+            seen.append(self._read_alias())
+            return HttpResponse()
+
+        middleware = db_routers.ReplicaRoutingMiddleware(view)
+        headers = {'HTTP_AUTHORIZATION': 'Token abc'}
+
+        middleware(self.factory.get('/', **headers))
+        middleware(self.factory.post('/', **headers))
+        middleware(self.factory.get('/', **headers))
+        middleware(self.factory.get('/', HTTP_AUTHORIZATION='Token other'))
+
+        self.assertEqual(seen, ['replica_0', 'default', 'default', 'replica_0'])
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'id': 1,
+        'uuid': uuid.UUID(int=7),
+        'created_at': datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+        'local_time': datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=-6))),
+        'birthday': date(1990, 5, 17),
+        'balance': Decimal('12.50'),
+        'label': gettext_lazy('Frequent'),
+        'description': 'Juan Pérez \u2028 mesa',
+        'huge': 2 ** 70,
+        'nested': [{'ok': True, 'none': None, 2: 'int key'}],
+    }
+
+    def test_output_is_byte_identical_to_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_floats_match_json_renderer(self):
+        data = {'floats': [0.0, -0.0, 0.5, 1e-4, 1e-05, 2.5e-7, 123456789012345.6, 1e16, -1.5e300]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertIn(b'1e-05', FastJSONRenderer().render(data))
+        self.assertIn(b'1e+16', FastJSONRenderer().render(data))
+
+    def test_non_finite_floats_are_rejected_like_json_renderer(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'value': [value]})
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'value': [value]})
+
+    def test_indented_output_falls_back_to_json_renderer(self):
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type)
+        )
+
+    def test_renderer_works_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_parser_round_trip_and_errors(self):
+        payload = FastJSONRenderer().render({'description': 'Juan Pérez', 'ids': [1, 2]})
+        parsed = FastJSONParser().parse(io.BytesIO(payload))
+        self.assertEqual(parsed, {'description': 'Juan Pérez', 'ids': [1, 2]})
+
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"broken":'))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"results": [' + b','.join(b'{"id": %d, "description": "Customer"}' % i for i in range(200)) + b']}'
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _process(self, response, path='/api/auth/users/', accept='gzip, br'):
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def _json(self, body=None):
+        return HttpResponse(body or self.body, content_type='application/json')
+
+    def test_negotiation_honours_quality_values(self):
+        self.assertEqual(negotiate_encoding('gzip;q=1.0, br;q=0.5'), 'gzip')
+        self.assertEqual(negotiate_encoding('identity'), None)
+        self.assertEqual(negotiate_encoding('*'), 'br' if brotli is not None else 'gzip')
+
+    def test_gzip_response_round_trips(self):
+        response = self._process(self._json(), accept='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_brotli_is_preferred_when_available(self):
+        if brotli is None:
+            self.skipTest('brotli is not installed')
+        response = self._process(self._json())
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_small_and_token_bearing_responses_are_left_alone(self):
+        small = self._process(self._json(b'{"id": 1}'))
+        token = self._process(self._json(), path='/api/auth/login/')
+        batch = self._process(self._json(), path='/api/batch/')
+        cookie = self._json()
+        cookie.set_cookie('sessionid', 'secret')
+        cookie = self._process(cookie)
+        image = self._process(HttpResponse(self.body, content_type='image/png'))
+
+        for response in (small, token, batch, cookie, image):
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response_is_compressed_in_chunks(self):
+        chunks = [self.body[:500], self.body[500:]]
+        response = self._process(
+            StreamingHttpResponse(iter(chunks), content_type='application/json'), accept='gzip'
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+
+@override_settings(REALTIME_BROKER='core.realtime.LocalBroker', REALTIME_BROKER_OPTIONS={}, REALTIME_QUEUE_SIZE=3)
+class RealtimeTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(realtime, '_broker', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _scope(self, query=b'topics=customers,users'):
+        return {'type': 'websocket', 'path': '/ws/events/', 'query_string': query, 'headers': []}
+
+    async def _connect(self, scope, user):
+        incoming = asyncio.Queue()
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await incoming.put({'type': 'websocket.connect'})
+        with mock.patch.object(realtime, 'authenticate', return_value=user):
+            task = asyncio.ensure_future(realtime.websocket_application(scope, incoming.get, send))
+            await self._wait(lambda: sent)
+        return incoming, sent, task
+
+    async def _wait(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.005)
+        self.fail('condition not met')
+
+    def test_events_reach_subscribers_of_allowed_topics(self):
+        async def scenario():
+            incoming, sent, task = await self._connect(self._scope(), SimpleNamespace(role='client'))
+            self.assertEqual(sent[0], {'type': 'websocket.accept'})
+
+            broker = realtime.get_broker()
+            broker.publish('users', realtime.encode('users', 'updated', {'id': 1}))
+            broker.publish('customers', realtime.encode('customers', 'updated', {'id': 7}))
+            await self._wait(lambda: len(sent) > 1)
+
+            await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+            await task
+            return sent
+
+        sent = asyncio.run(scenario())
+
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(json.loads(sent[1]['text']), {'topic': 'customers', 'event': 'updated', 'data': {'id': 7}})
+
+    def test_slow_client_gets_resync_instead_of_backlog(self):
+        async def scenario():
+            incoming, sent, task = await self._connect(self._scope(), SimpleNamespace(role='client'))
+            subscriber = next(iter(realtime.hub._subscribers))
+            for pk in range(10):
+                subscriber.deliver(realtime.encode('customers', 'updated', {'id': pk}))
+            await self._wait(lambda: len(sent) > 1)
+
+            await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+            await task
+            return sent
+
+        sent = asyncio.run(scenario())
+
+        self.assertEqual(json.loads(sent[-1]['text'])['event'], 'resync')
+        self.assertEqual(len(sent), 2)
+
+    def test_connection_without_token_is_rejected(self):
+        async def scenario():
+            sent = []
+
+            async def receive():
+                return {'type': 'websocket.connect'}
+
+            async def send(message):
+                sent.append(message)
+
+            await realtime.websocket_application(self._scope(), receive, send)
+            return sent
+
+        self.assertEqual(asyncio.run(scenario()), [{'type': 'websocket.close', 'code': 4401}])
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class QueryBudgetTests(TestCase):
+    """Holds every API route to the budgets in ``core/query_budgets.json``."""
+
+    modules = ('AUTH.urls', 'CLIENTS.urls')
+
+    @classmethod
+    def setUpTestData(cls):
+        from AUTH.models import UserCustom
+
+        cls.root = UserCustom.objects.create_superuser(
+            username='root', email='root@example.com', password='root-pass-123'
+        )
+
+    def populate(self, size):
+        from allauth.socialaccount.models import SocialAccount
+        from AUTH.models import UserCustom
+
+        for index in range(UserCustom.objects.count() - 1, size):
+            user = UserCustom.objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com', password='x'
+            )
+            SocialAccount.objects.create(user=user, provider='google', uid=str(index))
+
+        if apps.is_installed('CLIENTS'):
+            from CLIENTS.models import Customer
+
+            for index in range(Customer.objects.count(), size):
+                Customer.objects.create(description=f'Customer {index}', preferences='Corner table')
+
+    def test_routes_stay_within_budget(self):
+        recorded = budgets.load_budgets()
+        update = os.environ.get('UPDATE_QUERY_BUDGETS') == '1'
+        endpoints = list(budgets.discover(self.modules))
+        self.assertTrue(endpoints)
+
+        client = APIClient()
+        client.force_authenticate(self.root)
+        failures = []
+        for size in sorted(recorded['sizes']):
+            self.populate(size)
+            for endpoint in endpoints:
+                budget = recorded['endpoints'].get(endpoint.key)
+                if budget is None and not update:
+                    failures.append(f'{endpoint.key} has no budget in {budgets.BUDGET_FILE.name}')
+                    continue
+                measurement = budgets.measure(client, endpoint, budget or {})
+                if update:
+                    budget = recorded['endpoints'].setdefault(endpoint.key, {})
+                    budget['max_queries'] = max(budget.get('max_queries', 0), len(measurement.queries))
+                    budget['sql'] = measurement.queries
+                    budget.setdefault('max_ms', budgets.DEFAULT_MAX_MS)
+                failure = budgets.check(endpoint, budget, size, measurement)
+                if failure:
+                    failures.append(failure)
+
+        if update:
+            budgets.save_budgets(recorded)
+        self.assertFalse(failures, '\n\n'.join(failures))
+
+
+@override_settings(CACHES=SHARED_CACHES, PROFILING_SAMPLE_RATES={})
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from rest_framework.authtoken.models import Token
+        from AUTH.models import UserCustom
+
+        cls.root = UserCustom.objects.create_superuser(
+            username='root', email='root@example.com', password='root-pass-123'
+        )
+        cls.client_user = UserCustom.objects.create_user(
+            username='client', email='client@example.com', password='client-pass-123'
+        )
+        cls.root_token = Token.objects.create(user=cls.root)
+        cls.client_token = Token.objects.create(user=cls.client_user)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.profile_dir = directory.name
+        patcher = override_settings(PROFILING_DIR=self.profile_dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def _get(self, token, **extra):
+        return self.client.get('/api/auth/users/', HTTP_AUTHORIZATION=f'Token {token.key}', **extra)
+
+    def test_admin_can_profile_a_request(self):
+        response = self._get(self.root_token, HTTP_X_PROFILE='1')
+
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.view_name, 'users-list')
+        self.assertEqual(profile.trigger, 'requested')
+        self.assertEqual(profile.user, self.root)
+        self.assertGreaterEqual(profile.query_count, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, profile.file_name)))
+
+    def test_flag_from_non_admin_is_ignored(self):
+        response = self._get(self.client_token, HTTP_X_PROFILE='1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_sample_rate_profiles_matching_views(self):
+        with override_settings(PROFILING_SAMPLE_RATES={'users-list': 1.0}):
+            response = self._get(self.client_token)
+
+        self.assertEqual(RequestProfile.objects.get(pk=response['X-Profile-Id']).trigger, 'sampled')
+
+
+@override_settings(CACHES=SHARED_CACHES, SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_ASYNC=False)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from rest_framework.authtoken.models import Token
+        from AUTH.models import UserCustom
+
+        cls.root = UserCustom.objects.create_superuser(
+            username='root', email='root@example.com', password='root-pass-123'
+        )
+        cls.token = Token.objects.create(user=cls.root)
+
+    def _get(self, path):
+        response = self.client.get(path, HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_fingerprint_ignores_literals_and_list_lengths(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM t  WHERE id IN (%s, %s, %s) LIMIT 5'),
+        )
+
+    def test_repeated_statements_are_aggregated_with_origin_and_plan(self):
+        self._get('/api/auth/users/')
+        self._get('/api/auth/users/')
+
+        query = SlowQuery.objects.get(
+            origin='UserCustomViewSet.list', statement__contains='"AUTH_usercustom"."deleted_at" IS NULL'
+        )
+        self.assertEqual(query.count, 2)
+        self.assertEqual(len(query.durations), 2)
+        self.assertGreaterEqual(query.p95_ms, query.p50_ms)
+        self.assertTrue(query.plan)
+        self.assertEqual(query.origins, {'UserCustomViewSet.list': 2})
+
+    def test_parameter_values_are_not_stored(self):
+        self._get('/api/auth/users/')
+
+        token_query = SlowQuery.objects.get(statement__contains='"authtoken_token"."key" =')
+        self.assertEqual(token_query.example_params, '(str)')
+        for query in SlowQuery.objects.all():
+            self.assertNotIn(self.token.key, query.example_params + query.plan)
+            self.assertNotIn(self.root.password, query.example_params + query.plan)
+
+    def test_failed_explain_is_rolled_back_to_its_savepoint(self):
+        from django.test.utils import CaptureQueriesContext
+
+        from .slow_queries import explain
+
+        with CaptureQueriesContext(connection) as context:
+            plan = explain('default', 'SELECT * FROM "missing" WHERE "id" = %s', [1])
+
+        self.assertTrue(plan.startswith('EXPLAIN failed:'), plan)
+        self.assertTrue(any(query['sql'].startswith('ROLLBACK TO SAVEPOINT') for query in context.captured_queries))
+        self.assertFalse(connection.needs_rollback)
+
+    def test_action_is_used_as_origin(self):
+        self._get('/api/auth/users/by-role/?role=root')
+
+        self.assertTrue(SlowQuery.objects.filter(origin='UserCustomViewSet.users_by_role').exists())
+
+
+@override_settings(CACHES=SHARED_CACHES, METRICS_TOKEN='')
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        for name, value in (
+            ('registry', metrics.Registry((0.1, 1.0))),
+            ('exporter', metrics.FileExporter(self.directory, 0)),
+        ):
+            patcher = mock.patch.object(metrics, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in (0.05, 0.5, 3):
+            metrics.observe_request('users-list', 'GET', 200, seconds, 2, 0.01, is_auth_path=False)
+
+        text = metrics.render(*metrics.exporter.collect())
+
+        self.assertIn('http_request_duration_seconds_bucket{route="users-list",method="GET",le="0.1"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="users-list",method="GET",le="1.0"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="users-list",method="GET",le="+Inf"} 3', text)
+        self.assertIn('http_request_duration_seconds_count{route="users-list",method="GET"} 3', text)
+        self.assertIn('db_queries_total{route="users-list"} 6', text)
+
+    def test_other_workers_are_merged_without_stale_gauges(self):
+        metrics.observe_request('rest_login', 'POST', 429, 0.01, 0, 0, is_auth_path=True)
+        exited_worker = {
+            'values': [
+                ['auth_failures_total', [['route', 'rest_login'], ['reason', 'throttled']], 2],
+                ['http_requests_in_flight', [], 5],
+            ],
+            'histograms': [],
+        }
+        with open(os.path.join(self.directory, '999999999.json'), 'w') as metrics_file:
+            json.dump(exited_worker, metrics_file)
+
+        text = metrics.render(*metrics.exporter.collect())
+
+        self.assertIn('auth_failures_total{route="rest_login",reason="throttled"} 3', text)
+        self.assertNotIn('http_requests_in_flight 5', text)
+        self.assertIn('worker_processes 1', text)
+
+    def test_exited_workers_are_folded_into_one_file(self):
+        for pid, count in (('999999998', 2), ('999999999', 3)):
+            snapshot = {'values': [['db_queries_total', [['route', 'users-list']], count]], 'histograms': []}
+            with open(os.path.join(self.directory, f'{pid}.json'), 'w') as metrics_file:
+                json.dump(snapshot, metrics_file)
+        # Left behind by a worker that died while writing its file.
+        with open(os.path.join(self.directory, '999999999.json.1.tmp'), 'w') as metrics_file:
+            metrics_file.write('{"values": [')
+
+        for _ in range(2):
+            text = metrics.render(*metrics.exporter.collect())
+            self.assertIn('db_queries_total{route="users-list"} 5', text)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['exited.json', 'exited.lock'])
+
+    def test_endpoint_requires_a_token_outside_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(DEBUG=True)
+    def test_endpoint_reports_requests_and_honours_token(self):
+        self.client.get('/api/auth/users/')
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(
+            'auth_failures_total{route="users-list",reason="unauthorized"} 1', response.content.decode()
+        )
+
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, 200)
+
+    def test_collector_overhead_stays_within_budget(self):
+        call_command('benchmark_metrics', iterations=2000, stdout=io.StringIO())
+
+
+class CounterTests(TestCase):
+    def test_increments_accumulate_and_expire(self):
+        self.assertEqual(counters.incr('hits', timeout=60), 1)
+        self.assertEqual(counters.incr('hits', 2, timeout=60), 3)
+        self.assertEqual(counters.value('hits'), 3)
+
+        Counter.objects.filter(key='hits').update(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        self.assertEqual(counters.value('hits'), 0)
+        self.assertEqual(counters.incr('hits', timeout=60), 1)
+
+    def test_counter_without_timeout_never_expires(self):
+        counters.incr('version')
+        counters.incr('version')
+
+        self.assertIsNone(Counter.objects.get(key='version').expires_at)
+        self.assertEqual(counters.incr('version'), 3)
+
+    def test_purge_removes_only_expired_counters(self):
+        counters.incr('live', timeout=60)
+        counters.incr('forever')
+        counters.incr('stale', timeout=60)
+        Counter.objects.filter(key='stale').update(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+
+        self.assertEqual(retention.purge_counters(100).rows, 1)
+        self.assertEqual(sorted(Counter.objects.values_list('key', flat=True)), ['forever', 'live'])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def test_other_backends_use_the_exact_count(self):
+        from django.test.utils import CaptureQueriesContext
+
+        from AUTH.models import UserCustom
+
+        for index in range(3):
+            UserCustom.objects.create_user(username=f'paged{index}', email=f'paged{index}@example.com')
+        paginator = EstimatedCountPaginator(UserCustom.objects.order_by('pk'), 2)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(paginator.count, 3)
+            self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('COUNT(', context.captured_queries[0]['sql'])
+
+    def test_lists_without_a_query_use_len(self):
+        self.assertEqual(EstimatedCountPaginator(list(range(5)), 2).count, 5)
+
+
+class RetentionTests(TestCase):
+    def _deleted_user(self, username, days):
+        from allauth.account.models import EmailAddress
+        from rest_framework.authtoken.models import Token
+
+        from AUTH.models import UserCustom
+
+        user = UserCustom.objects.create_user(username=username, email=f'{username}@example.com')
+        EmailAddress.objects.create(user=user, email=user.email, verified=True, primary=True)
+        Token.objects.create(user=user)
+        UserCustom.objects.all_objects().filter(pk=user.pk).update(
+            deleted_at=datetime.now(timezone.utc) - timedelta(days=days)
+        )
+        return user
+
+    def _users(self):
+        from AUTH.models import UserCustom
+
+        return sorted(UserCustom.objects.all_objects().values_list('username', flat=True))
+
+    def test_archive_keeps_cascaded_rows(self):
+        from rest_framework.authtoken.models import Token
+
+        old = self._deleted_user('old', days=100)
+        self._deleted_user('recent', days=10)
+
+        results = retention.purge_soft_deleted(90, 100)
+
+        self.assertIn(('AUTH.UserCustom', 1), [(result.label, result.rows) for result in results])
+        self.assertEqual(self._users(), ['recent'])
+        archived = {
+            record.model_label: record
+            for record in ArchivedRecord.objects.filter(deleted_at__isnull=True)
+        }
+        self.assertEqual(sorted(archived), ['account.EmailAddress', 'authtoken.Token'])
+        self.assertEqual(archived['account.EmailAddress'].payload['email'], 'old@example.com')
+        self.assertEqual(archived['authtoken.Token'].payload['user'], old.pk)
+        user = ArchivedRecord.objects.get(model_label='AUTH.UserCustom')
+        self.assertEqual((user.object_pk, user.payload['username']), (str(old.pk), 'old'))
+        self.assertIsNotNone(user.deleted_at)
+        self.assertEqual(Token.objects.filter(user_id=old.pk).count(), 0)
+
+    def test_old_profiles_and_their_files_are_purged(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        old_time = (datetime.now(timezone.utc) - timedelta(days=20)).timestamp()
+        for name, age in (('old', 20), ('orphan', 20), ('recent', 1)):
+            path = os.path.join(directory.name, f'{name}.folded')
+            with open(path, 'w') as profile_file:
+                profile_file.write('main 1\n')
+            if age == 20:
+                os.utime(path, (old_time, old_time))
+            if name != 'orphan':
+                RequestProfile.objects.create(
+                    view_name=name, method='GET', path='/', status_code=200, duration_ms=1,
+                    query_count=0, sample_count=1, trigger='sampled', file_name=f'{name}.folded',
+                    created_at=datetime.now(timezone.utc) - timedelta(days=age),
+                )
+
+        with override_settings(PROFILING_DIR=directory.name):
+            result = retention.purge_profiles(14, 100)
+
+        self.assertEqual(result.rows, 1)
+        self.assertEqual(list(RequestProfile.objects.values_list('view_name', flat=True)), ['recent'])
+        self.assertEqual(os.listdir(directory.name), ['recent.folded'])
+
+    def test_hard_delete_archives_nothing(self):
+        self._deleted_user('old', days=100)
+
+        retention.purge_soft_deleted(90, 100, archive=False)
+
+        self.assertEqual(self._users(), [])
+        self.assertFalse(ArchivedRecord.objects.exists())
+
+    def test_rows_are_purged_in_batches(self):
+        for index in range(5):
+            self._deleted_user(f'old{index}', days=100)
+
+        with mock.patch.object(retention, 'Collector', wraps=retention.Collector) as collector:
+            results = retention.purge_soft_deleted(90, 2)
+
+        self.assertIn(('AUTH.UserCustom', 5), [(result.label, result.rows) for result in results])
+        self.assertEqual(collector.call_count, 3)
+        self.assertEqual(self._users(), [])
+        self.assertEqual(ArchivedRecord.objects.filter(model_label='AUTH.UserCustom').count(), 5)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class RetentionLockingTests(TransactionTestCase):
+    def test_locked_rows_are_left_for_the_next_run(self):
+        from AUTH.models import UserCustom
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=100)
+        for username in ('busy', 'idle'):
+            UserCustom.objects.create_user(username=username, email=f'{username}@example.com')
+        UserCustom.objects.all_objects().update(deleted_at=cutoff)
+
+        locked, release = threading.Event(), threading.Event()
+
+        def edit():
+            try:
+                with transaction.atomic():
+                    UserCustom.objects.all_objects().select_for_update().get(username='busy')
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        editor = threading.Thread(target=edit)
+        editor.start()
+        self.addCleanup(editor.join)
+        self.addCleanup(release.set)
+        self.assertTrue(locked.wait(10))
+
+        result = retention.purge_in_batches(UserCustom._base_manager.filter(deleted_at__lte=cutoff), 100)
+
+        self.assertEqual(result.rows, 1)
+        self.assertEqual(list(UserCustom.objects.all_objects().values_list('username', flat=True)), ['busy'])
+
+
+_flaky_calls = []
+
+
+@tasks.task(name='core.tests.flaky', max_attempts=2)
+def flaky(fail_times):
+    _flaky_calls.append(fail_times)
+    if len(_flaky_calls) <= fail_times:
+        raise RuntimeError('temporary failure')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        _flaky_calls.clear()
+
+    def test_failed_task_is_retried_with_backoff_then_given_up(self):
+        row = flaky.enqueue(5)
+
+        self.assertEqual(tasks.run_pending(), 1)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('pending', 1))
+        self.assertGreater(row.run_at, row.created_at)
+        self.assertIn('temporary failure', row.last_error)
+        self.assertEqual(tasks.run_pending(), 0)
+
+        Task.objects.filter(pk=row.pk).update(run_at=row.created_at)
+        tasks.run_pending()
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('failed', 2))
+
+    def test_claimed_task_is_not_handed_out_twice(self):
+        row = flaky.enqueue(0)
+
+        self.assertEqual([claimed.pk for claimed in tasks.claim(10, 'first')], [row.pk])
+        self.assertEqual(tasks.claim(10, 'second'), [])
+
+        with override_settings(TASKS_LOCK_TIMEOUT=0):
+            self.assertEqual([claimed.pk for claimed in tasks.claim(10, 'second')], [row.pk])
+
+    def test_stale_task_is_taken_over_and_finished_by_the_new_holder(self):
+        row = flaky.enqueue(0)
+        (first,) = tasks.claim(10, 'first')
+        with override_settings(TASKS_LOCK_TIMEOUT=0):
+            (second,) = tasks.claim(10, 'second')
+
+        # The first worker finishes late; only the current holder records the outcome.
+        tasks.execute(first)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.locked_by, row.attempts), ('running', second.locked_by, 2))
+
+        tasks.execute(second)
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'succeeded')
+        self.assertEqual(len(_flaky_calls), 2)
+
+    def test_abandoned_last_attempt_fails_the_task(self):
+        row = flaky.enqueue(0)
+        tasks.claim(10, 'first')
+        Task.objects.filter(pk=row.pk).update(attempts=row.max_attempts)
+
+        with override_settings(TASKS_LOCK_TIMEOUT=0):
+            self.assertEqual(tasks.claim(10, 'second'), [])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.locked_by), ('failed', ''))
+        self.assertIn('stopped without finishing', row.last_error)
+        self.assertEqual(_flaky_calls, [])
+
+    def test_heartbeat_keeps_a_long_task_from_being_taken_over(self):
+        row = flaky.enqueue(0)
+        claimed = tasks.claim(10, 'first')
+        Task.objects.filter(pk=row.pk).update(locked_at=row.created_at - timedelta(hours=1))
+
+        tasks.Worker(concurrency=1, poll_interval=0).heartbeat(claimed)
+
+        with override_settings(TASKS_LOCK_TIMEOUT=60):
+            self.assertEqual(tasks.claim(10, 'second'), [])
+
+    @override_settings(ACCOUNT_EMAIL_VERIFICATION='mandatory', CACHES=SHARED_CACHES)
+    def test_registration_queues_the_verification_mail(self):
+        response = APIClient().post('/api/auth/registration/', {
+            'username': 'queued', 'email': 'queued@example.com',
+            'password1': 'Queue-pass-123', 'password2': 'Queue-pass-123',
+            'first_name': 'Queued', 'last_name': 'User',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Task.objects.get().name, 'core.send_email')
+
+        tasks.run_pending()
+        self.assertEqual(mail.outbox[0].to, ['queued@example.com'])
+
+
+class TaskWorkerTests(TransactionTestCase):
+    # Worker threads use their own connections, so the tasks must be committed.
+    def test_worker_runs_tasks_on_its_thread_pool(self):
+        if connection.vendor == 'sqlite':
+            # The shared in-memory test database fails concurrent writers with
+            # "table is locked" instead of waiting for the lock.
+            self.skipTest('needs a database that serializes concurrent writers')
+        _flaky_calls.clear()
+        for _ in range(3):
+            flaky.enqueue(0)
+
+        tasks.Worker(concurrency=2, poll_interval=0.01).run(burst=True)
+
+        self.assertEqual(Task.objects.filter(status='succeeded').count(), 3)
+
+
+def _create_root_with_token():
+    from rest_framework.authtoken.models import Token
+    from AUTH.models import UserCustom
+
+    root = UserCustom.objects.create_superuser(
+        username='root', email='root@example.com', password='root-pass-123'
+    )
+    return root, Token.objects.create(user=root)
+
+
+@override_settings(BATCH_CONCURRENCY=1)
+class BatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root, cls.token = _create_root_with_token()
+
+    def _batch(self, requests, token=None):
+        token = token or self.token
+        return self.client.post(
+            '/api/batch/', {'requests': requests}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+
+    def test_sub_requests_share_one_authentication(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._batch([
+                {'id': 'users', 'path': '/api/auth/users/'},
+                {'id': 'me', 'path': '/api/auth/user/'},
+                {'id': 'admins', 'path': '/api/auth/users/by-role/?role=admin'},
+                {'id': 'missing', 'path': '/api/does-not-exist/'},
+            ])
+
+        self.assertEqual(response.status_code, 200)
+        results = {item['id']: item for item in response.json()['responses']}
+        self.assertEqual([item['id'] for item in response.json()['responses']], ['users', 'me', 'admins', 'missing'])
+        self.assertEqual(results['users']['status'], 200)
+        self.assertEqual(results['me']['body']['username'], 'root')
+        self.assertEqual(results['admins']['status'], 200)
+        self.assertEqual(results['missing']['status'], 404)
+        token_lookups = [q for q in queries.captured_queries if 'authtoken_token' in q['sql']]
+        self.assertEqual(len(token_lookups), 1)
+
+    def test_writes_apply_in_order(self):
+        response = self._batch([
+            {'method': 'PATCH', 'path': '/api/auth/user/', 'body': {'first_name': 'Ada'}},
+            {'path': '/api/auth/user/'},
+        ])
+
+        first, second = response.json()['responses']
+        self.assertEqual(first['status'], 200)
+        self.assertEqual(second['body']['first_name'], 'Ada')
+
+    def test_rejects_foreign_and_nested_paths(self):
+        for path in ('/admin/', '/api/batch/'):
+            response = self._batch([{'path': path}])
+            self.assertEqual(response.status_code, 400, path)
+
+        with override_settings(BATCH_MAX_REQUESTS=1):
+            response = self._batch([{'path': '/api/auth/user/'}] * 2)
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_auth_endpoints(self):
+        paths = (
+            '/api/auth/login/', '/api/auth/registration/', '/api/auth/registration/verify-email/',
+            '/api/auth/social/github/', '/api/auth/password/change/', '/api/auth/logout/',
+        )
+        for path in paths:
+            response = self._batch([{'method': 'POST', 'path': path, 'body': {'username': 'root', 'password': 'x'}}])
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn('Authentication endpoints cannot be batched.', response.content.decode(), path)
+
+    def test_streaming_responses_are_collected(self):
+        from django.http import StreamingHttpResponse
+        from django.urls import ResolverMatch
+
+        def view(request):
+            return StreamingHttpResponse(iter([b'{"rows": ', b'[1, 2]}']), content_type='application/json')
+
+        with mock.patch('core.batch.resolve', return_value=ResolverMatch(view, (), {})):
+            result = batch.dispatch(batch.build_request(mock.Mock(META={}, scheme='http'), {
+                'method': 'GET', 'path': '/api/export/',
+            }))
+
+        self.assertEqual(result, {'status': 200, 'body': {'rows': [1, 2]}})
+
+    def test_requires_authentication(self):
+        response = self.client.post(
+            '/api/batch/', {'requests': [{'path': '/api/auth/user/'}]}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(BATCH_CONCURRENCY=4)
+class BatchConcurrencyTests(TransactionTestCase):
+    # Pool threads use their own connections, so the user must be committed.
+    def test_reads_run_on_the_pool_in_order(self):
+        _, token = _create_root_with_token()
+        paths = ['/api/auth/user/', '/api/auth/users/', '/api/auth/users/by-role/?role=admin']
+
+        with mock.patch('core.batch._dispatch_in_thread', wraps=batch._dispatch_in_thread) as pooled:
+            response = self.client.post(
+                '/api/batch/', {'requests': [{'path': path} for path in paths]},
+                content_type='application/json', HTTP_AUTHORIZATION=f'Token {token.key}',
+            )
+
+        self.assertEqual([item['status'] for item in response.json()['responses']], [200, 200, 200])
+        self.assertEqual(response.json()['responses'][0]['body']['username'], 'root')
+        self.assertEqual(pooled.call_count, 2)
+
+
+class SyntheticDataTests(TestCase):
+    def _plan(self, kind, **extra):
+        end = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        return synthetic.Plan(kind, seed=7, offset=0, total=2500, end=end, days=365, deleted_fraction=0.1, **extra)
+
+    def test_rows_do_not_depend_on_how_work_is_split(self):
+        for kind, block in (('users', lambda *args: synthetic.user_block(*args)[0]), ('customers', synthetic.customer_block)):
+            plan = self._plan(kind)
+            whole = [row for start, stop in plan.blocks(0, 2500) for row in block(plan, start, stop)]
+            split = [row for start, stop in plan.blocks(0, 1700) for row in block(plan, start, stop)]
+            split += [row for start, stop in plan.blocks(1700, 2500) for row in block(plan, start, stop)]
+
+            self.assertEqual(whole, split)
+            created = [row[synthetic.USER_COLUMNS.index('created_at') if kind == 'users' else 0] for row in whole]
+            self.assertEqual(created, sorted(created))
+
+    def test_command_loads_users_with_accounts(self):
+        from allauth.account.models import EmailAddress
+        from allauth.socialaccount.models import SocialAccount
+        from AUTH.models import UserCustom
+
+        out = io.StringIO()
+        call_command('generate_data', users=300, seed=3, social_fraction=0.5, password='load-test-pass', stdout=out)
+
+        users = UserCustom._base_manager.all()
+        self.assertEqual(users.count(), 300)
+        self.assertEqual(EmailAddress.objects.count(), 300)
+        self.assertGreater(SocialAccount.objects.count(), 50)
+        self.assertFalse(SocialAccount.objects.filter(user__deleted_at__isnull=False).exists())
+        self.assertEqual(users.filter(deleted_at__isnull=False).count(), users.filter(is_active=False).count())
+        self.assertTrue(users.filter(is_active=True).first().check_password('load-test-pass'))
+
+        with self.assertRaisesMessage(CommandError, '--offset'):
+            call_command('generate_data', users=10, seed=3, stdout=out)
@@ -0,0 +1,126 @@
+import hashlib
+import math
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class BucketRateThrottle(SimpleRateThrottle):
+    """Rate throttle holding one counter per identity and rate period.
+
+    Each identity gets a bucket of ``num_requests`` tokens that refills at the
+    start of every rate period. Tokens are taken with an atomic cache ``incr``
+    on ``THROTTLE_CACHE_ALIAS``, so concurrent workers cannot both take the
+    last token, and a throttled request never touches the database. Unlike
+    DRF's default throttle, no request history list is stored or rewritten.
+    """
+
+    cache_format = 'throttle_%(scope)s_%(ident)s_%(window)s'
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def get_ident_for(self, request):
+        raise NotImplementedError('.get_ident_for() must be overridden')
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_for(request)
+        if ident is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident, 'window': self.window}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.now = self.timer()
+        self.window = int(self.now // self.duration)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        # The key names the period, so a new period starts from an empty bucket.
+        self.cache.add(self.key, 0, self.duration)
+        try:
+            taken = self.cache.incr(self.key)
+        except ValueError:
+            # The bucket was evicted between add() and incr().
+            self.cache.add(self.key, 1, self.duration)
+            taken = 1
+        return taken <= self.num_requests
+
+    def wait(self):
+        return (self.window + 1) * self.duration - self.now
+
+
+class AuthIPThrottle(BucketRateThrottle):
+    scope = 'auth_ip'
+
+    def get_ident_for(self, request):
+        return self.get_ident(request)
+
+
+class AuthUsernameThrottle(BucketRateThrottle):
+    scope = 'auth_username'
+
+    def get_ident_for(self, request):
+        data = getattr(request, 'data', None) or {}
+        username = data.get('username') or data.get('email')
+        if not username or not isinstance(username, str):
+            return None
+        return hashlib.sha256(username.strip().lower().encode()).hexdigest()
+
+
+class AuthLoadSheddingMiddleware:
+    """Caps concurrent POSTs to the auth endpoints.
+
+    ``AUTH_CONCURRENCY_LIMIT`` slots are leased with an atomic ``add`` on
+    ``THROTTLE_CACHE_ALIAS``. All slots are read with one ``get_many`` first,
+    so a request that finds every slot taken is answered with 503 and
+    ``Retry-After`` after a single cache round trip, before it reaches the
+    database, password hashing or an OAuth call. Leases expire after
+    ``AUTH_CONCURRENCY_LEASE`` seconds, so a crashed worker cannot hold a slot
+    forever.
+    """
+
+    slot_format = 'auth_slot_%d'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method != 'POST' or not request.path.startswith(tuple(settings.AUTH_SHED_PATHS)):
+            return self.get_response(request)
+
+        cache = caches[settings.THROTTLE_CACHE_ALIAS]
+        slot = self._acquire(cache)
+        if slot is None:
+            response = JsonResponse(
+                {'detail': 'Authentication service is busy, please retry shortly.'},
+                status=503
+            )
+            response['Retry-After'] = str(math.ceil(settings.AUTH_SHED_RETRY_AFTER))
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(cache, *slot)
+
+    def _acquire(self, cache):
+        keys = [self.slot_format % index for index in range(settings.AUTH_CONCURRENCY_LIMIT)]
+        taken = cache.get_many(keys)
+        token = secrets.token_hex(8)
+        for key in keys:
+            if key not in taken and cache.add(key, token, settings.AUTH_CONCURRENCY_LEASE):
+                return key, token
+        return None
+
+    def _release(self, cache, key, token):
+        # A lease that expired may have been taken by another request since.
+        if cache.get(key) == token:
+            cache.delete(key)